@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Routing cost per metric of MultiGraphiteHandler with mode = consistent_hash
+
+Measures a lookup on the hash ring, and the handler's routing with a cold
+and with a warm route cache (metric paths repeat every collector run).
+
+    ./benchmarks/bench_hashring.py [--destinations 4,16] [--count N]
+"""
+
+import time
+import optparse
+
+import harness
+harness  # workaround for pyflakes issue #13, it sets up sys.path
+
+from diamond.handler.multigraphite import MultiGraphiteHandler
+from diamond.handler.null import NullHandler
+from diamond.metric import Metric
+
+
+class RoutingHandler(MultiGraphiteHandler):
+    """
+    MultiGraphiteHandler that routes to NullHandlers
+    """
+    handler_class = NullHandler
+
+
+def run(destinations, replication, metrics):
+    handler = RoutingHandler({
+        'host': ['carbon%d:2003:%d' % (i / 2, i % 2)
+                 for i in xrange(destinations)],
+        'mode': 'consistent_hash',
+        'replication_factor': replication,
+    })
+    count = len(metrics)
+    name = 'hashring.%d_destinations.%d_replicas' % (
+        destinations, replication)
+
+    start = time.time()
+    for metric in metrics:
+        handler.ring.get_nodes(metric.path, replication)
+    ring = time.time() - start
+
+    start = time.time()
+    for metric in metrics:
+        handler.get_handlers(metric)
+    cold = time.time() - start
+
+    start = time.time()
+    for metric in metrics:
+        handler.get_handlers(metric)
+    warm = time.time() - start
+
+    # Share of metrics per destination
+    shares = {}
+    for metric in metrics:
+        for h in handler.get_handlers(metric):
+            shares[id(h)] = shares.get(id(h), 0) + 1
+
+    return {
+        'name': name,
+        'metrics': count,
+        'seconds': cold,
+        'metrics_per_sec': count / cold,
+        'ring_us': ring / count * 1e6,
+        'cold_us': cold / count * 1e6,
+        'warm_us': warm / count * 1e6,
+        'max_share': max(shares.values()) / float(count),
+        'min_share': min(shares.values()) / float(count),
+    }
+
+
+def add_options(parser):
+    parser.add_option("--destinations", dest="destinations", default="4,16",
+                      help="comma separated number of carbon destinations")
+    parser.add_option("--replication", dest="replication", default="1,2",
+                      help="comma separated replication factors")
+    parser.add_option("--routes", dest="routes", type="int", default=100000,
+                      help="distinct metric paths to route")
+
+
+def run_suite(options):
+    metrics = [Metric('servers.host%d.cpu.cpu%d.user' % (i / 100, i % 100),
+                      i, timestamp=1234567890)
+               for i in xrange(options.routes)]
+    for destinations in options.destinations.split(','):
+        for replication in options.replication.split(','):
+            yield run(int(destinations), int(replication), metrics)
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_options(parser)
+    (options, args) = parser.parse_args()
+
+    print "%-40s %9s %9s %9s %7s %7s" % ('', 'ring us', 'cold us', 'warm us',
+                                         'min', 'max')
+    for result in run_suite(options):
+        print "%-40s %9.2f %9.2f %9.2f %6.1f%% %6.1f%%" % (
+            result['name'], result['ring_us'], result['cold_us'],
+            result['warm_us'], result['min_share'] * 100,
+            result['max_share'] * 100)
+
+if __name__ == "__main__":
+    main()
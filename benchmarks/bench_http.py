@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Throughput of HttpPostHandler against a local stub HTTP server
+
+Compares posting every batch on a new urllib2 connection, as the handler
+used to, with the persistent connection of the background poster, plain and
+compressed. Each run processes the metrics, flushes and waits until every
+batch has been posted.
+
+    ./benchmarks/bench_http.py [--http-metrics N] [--http-batch 100,1000]
+"""
+
+import time
+import urllib2
+import optparse
+
+import harness
+
+from diamond.handler.httpHandler import HttpPostHandler
+from diamond.metric import Metric
+
+MODES = ['urlopen', 'keepalive', 'gzip', 'deflate']
+
+# Metrics per process_batch call
+CHUNK = 100
+
+
+class UrlopenHandler(HttpPostHandler):
+    """
+    Posts synchronously with a new connection per batch
+    """
+
+    def post(self):
+        if not self.metrics:
+            return
+        req = urllib2.Request(self.url, ''.join(self.metrics))
+        urllib2.urlopen(req).read()
+        self.metrics = []
+        self.metrics_size = 0
+
+
+def run(sink, mode, batch, metrics):
+    config = {'url': sink.url, 'batch': batch, 'max_queue': len(metrics)}
+    if mode in ('gzip', 'deflate'):
+        config['compression'] = mode
+    if mode == 'urlopen':
+        handler = UrlopenHandler(config)
+    else:
+        handler = HttpPostHandler(config)
+
+    requests = sink.requests
+    received = sink.received
+    connections = sink.connections
+    start = time.time()
+    for offset in xrange(0, len(metrics), CHUNK):
+        handler.process_batch(metrics[offset:offset + CHUNK])
+    handler.flush()
+    handler.stop()
+    elapsed = time.time() - start
+
+    count = len(metrics)
+    return {
+        'name': 'http.%s.batch_%d' % (mode, batch),
+        'metrics': count,
+        'seconds': elapsed,
+        'metrics_per_sec': count / elapsed,
+        'requests': sink.requests - requests,
+        'connections': sink.connections - connections,
+        'bytes_sent': sink.received - received,
+    }
+
+
+def add_options(parser):
+    parser.add_option("--http-metrics", dest="http_metrics", type="int",
+                      default=100000, help="metrics to post per run")
+    parser.add_option("--http-batch", dest="http_batch", default="100,1000",
+                      help="comma separated metrics per post")
+    parser.add_option("--http-modes", dest="http_modes",
+                      default=','.join(MODES),
+                      help="comma separated, from: %s" % ', '.join(MODES))
+
+
+def run_suite(options):
+    metrics = [Metric('servers.host%d.cpu.cpu%d.user' % (i / 100, i % 100),
+                      i, timestamp=1234567890)
+               for i in xrange(options.http_metrics)]
+    sink = harness.HttpSink()
+    try:
+        for mode in options.http_modes.split(','):
+            for batch in options.http_batch.split(','):
+                yield run(sink, mode.strip(), int(batch), metrics)
+    finally:
+        sink.close()
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_options(parser)
+    (options, args) = parser.parse_args()
+
+    print "%-30s %12s %9s %12s" % ('', 'metrics/s', 'requests', 'bytes')
+    for result in run_suite(options):
+        print "%-30s %12d %9d %12d" % (
+            result['name'], result['metrics_per_sec'], result['requests'],
+            result['bytes_sent'])
+
+if __name__ == "__main__":
+    main()
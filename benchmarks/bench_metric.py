@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Microbenchmark for diamond.metric.Metric
+
+Compares the current Metric against a copy of the previous dict based
+implementation: construction cost, per instance memory and the cost of
+rendering the line once per handler.
+
+    ./benchmarks/bench_metric.py [--count N] [--renders N]
+"""
+
+import sys
+import time
+import optparse
+
+import harness
+harness  # workaround for pyflakes issue #13, it sets up sys.path
+
+from diamond.metric import Metric
+
+
+class LegacyMetric(object):
+    """
+    The Metric as it was before __slots__ and cached rendering
+    """
+
+    def __init__(self, path, value, raw_value=None, timestamp=None,
+                 precision=0, host=None, metric_type='COUNTER'):
+        if timestamp is None:
+            timestamp = int(time.time())
+        self.path = path
+        self.value = value
+        self.raw_value = raw_value
+        self.timestamp = timestamp
+        self.precision = precision
+        self.host = host
+        self.metric_type = metric_type
+
+    def __repr__(self):
+        fstring = "%%s %%0.%if %%i\n" % self.precision
+        return fstring % (self.path, self.value, self.timestamp)
+
+
+def instance_size(obj):
+    """
+    Size of an instance including its __dict__, if it has one
+    """
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(cls, count, renders):
+    paths = ['servers.host.cpu.cpu%d.user' % i for i in xrange(count)]
+
+    start = time.time()
+    metrics = [cls(path, 1.5, timestamp=1234567890, precision=2,
+                   host='host', metric_type='GAUGE') for path in paths]
+    construct = time.time() - start
+
+    start = time.time()
+    for i in xrange(renders):
+        for metric in metrics:
+            str(metric)
+    render = time.time() - start
+
+    return construct, render, instance_size(metrics[0])
+
+
+def add_options(parser):
+    parser.add_option("-n", "--count", dest="count", type="int",
+                      default=200000, help="metrics per run")
+    parser.add_option("--renders", dest="renders", type="int",
+                      default=3, help="times each metric is rendered")
+
+
+def run_suite(options):
+    """
+    Run the benchmark for both Metric implementations
+    """
+    for cls in (LegacyMetric, Metric):
+        construct, render, size = run(cls, options.count, options.renders)
+        yield {
+            'name': 'metric.%s' % cls.__name__,
+            'metrics': options.count,
+            'seconds': construct + render,
+            'metrics_per_sec': options.count / (construct + render),
+            'construct_ms': construct * 1000,
+            'render_ms': render * 1000,
+            'bytes': size,
+        }
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_options(parser)
+    (options, args) = parser.parse_args()
+
+    print "%d metrics, each rendered %d times" % (options.count,
+                                                  options.renders)
+    print "%-20s %12s %12s %10s" % ('', 'construct', 'render', 'bytes')
+    results = {}
+    for result in run_suite(options):
+        results[result['name']] = result
+        print "%-20s %10.1fms %10.1fms %10d" % (
+            result['name'], result['construct_ms'], result['render_ms'],
+            result['bytes'])
+
+    legacy = results['metric.LegacyMetric']
+    current = results['metric.Metric']
+    print "render speedup: %.2fx, memory per metric: %.2fx smaller" % (
+        legacy['render_ms'] / current['render_ms'],
+        float(legacy['bytes']) / current['bytes'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Benchmark of the collect to handler hot path
+
+A synthetic collector publishes a configurable number of metrics per cycle,
+either one at a time through Collector.publish or in chunks through
+Collector.publish_many, into a single handler. Socket handlers send to local
+stub listeners, so no network or backend is needed.
+
+    ./benchmarks/bench_pipeline.py [--cardinality 1000,100000]
+                                   [--handlers null,graphite] [--cycles N]
+"""
+
+import gc
+import os
+import time
+import shutil
+import logging
+import optparse
+import tempfile
+
+import harness
+
+import configobj
+
+from diamond.collector import Collector
+from diamond.handler.archive import ArchiveHandler
+from diamond.handler.graphite import GraphiteHandler
+from diamond.handler.graphitepickle import GraphitePickleHandler
+from diamond.handler.null import NullHandler
+
+HANDLERS = ['null', 'graphite', 'graphite_udp', 'graphitepickle', 'archive']
+MODES = ['publish', 'publish_many']
+
+# Metrics per publish_many call, and per latency sample in that mode
+CHUNK = 1000
+
+
+class SyntheticCollector(Collector):
+    """
+    Publishes cardinality gauges per run
+    """
+
+    def __init__(self, config, handlers, cardinality, mode):
+        Collector.__init__(self, config, handlers)
+        self.names = ['group%d.metric%d' % (i / 100, i)
+                      for i in xrange(cardinality)]
+        self.mode = mode
+        self.latencies = []
+
+    def collect(self):
+        latencies = self.latencies
+        timer = time.time
+        if self.mode == 'publish':
+            for i, name in enumerate(self.names):
+                start = timer()
+                self.publish(name, i)
+                latencies.append(timer() - start)
+        else:
+            for offset in xrange(0, len(self.names), CHUNK):
+                chunk = [(name, i) for i, name in enumerate(
+                    self.names[offset:offset + CHUNK], offset)]
+                start = timer()
+                self.publish_many(chunk)
+                latencies.append((timer() - start) / len(chunk))
+
+
+def get_collector_config():
+    config = configobj.ConfigObj()
+    config['server'] = {}
+    config['server']['collectors_config_path'] = ''
+    config['collectors'] = {}
+    config['collectors']['default'] = {'hostname': 'bench'}
+    config['collectors']['SyntheticCollector'] = {'path': 'synthetic'}
+    return config
+
+
+def make_handler(name, sinks, tmpdir):
+    """
+    Create a handler pointed at the stub listeners
+    """
+    if name == 'null':
+        return NullHandler({})
+    elif name == 'graphite':
+        return GraphiteHandler({'host': '127.0.0.1',
+                                'port': sinks['tcp'].port,
+                                'batch': 500})
+    elif name == 'graphite_udp':
+        return GraphiteHandler({'host': '127.0.0.1',
+                                'port': sinks['udp'].port,
+                                'proto': 'udp'})
+    elif name == 'graphitepickle':
+        return GraphitePickleHandler({'host': '127.0.0.1',
+                                      'port': sinks['tcp'].port,
+                                      'batch': 500})
+    elif name == 'archive':
+        return ArchiveHandler({'log_file': os.path.join(tmpdir,
+                                                        'archive.log')})
+    raise ValueError("Unknown handler: %s" % name)
+
+
+def run(name, handler, cardinality, mode, cycles):
+    """
+    Run cycles collector runs and return the result record
+    """
+    collector = SyntheticCollector(get_collector_config(), [handler],
+                                   cardinality, mode)
+    meter = harness.AllocationMeter()
+
+    gc.collect()
+    meter.start()
+    start = time.time()
+    for i in xrange(cycles):
+        collector.collect()
+        handler._flush()
+    elapsed = time.time() - start
+    allocations = meter.stop()
+
+    latencies = sorted(collector.latencies)
+    total = cardinality * cycles
+    result = {
+        'name': 'pipeline.%s.%s.%d' % (name, mode, cardinality),
+        'metrics': total,
+        'seconds': elapsed,
+        'metrics_per_sec': total / elapsed,
+        'p50_us': harness.percentile(latencies, 50) * 1e6,
+        'p99_us': harness.percentile(latencies, 99) * 1e6,
+        'peak_rss_kb': harness.peak_rss(),
+    }
+    for key, value in allocations.items():
+        result[key] = value / cycles
+    return result
+
+
+def add_options(parser):
+    parser.add_option("--cardinality", dest="cardinality",
+                      default="1000,10000,100000",
+                      help="comma separated metrics per cycle")
+    parser.add_option("--handlers", dest="handlers",
+                      default=','.join(HANDLERS),
+                      help="comma separated, from: %s" % ', '.join(HANDLERS))
+    parser.add_option("--modes", dest="modes", default=','.join(MODES),
+                      help="comma separated publish modes")
+    parser.add_option("--cycles", dest="cycles", type="int", default=3,
+                      help="collector runs per benchmark")
+
+
+def run_suite(options):
+    """
+    Run every handler, mode and cardinality combination
+    """
+    # Keep the NullHandler off the console
+    logging.getLogger('diamond').setLevel(logging.CRITICAL)
+
+    sinks = {'tcp': harness.Sink('tcp'), 'udp': harness.Sink('udp')}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for name in options.handlers.split(','):
+            name = name.strip()
+            handler = make_handler(name, sinks, tmpdir)
+            for mode in options.modes.split(','):
+                for cardinality in options.cardinality.split(','):
+                    yield run(name, handler, int(cardinality), mode.strip(),
+                              options.cycles)
+    finally:
+        for sink in sinks.values():
+            sink.close()
+        shutil.rmtree(tmpdir, True)
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_options(parser)
+    (options, args) = parser.parse_args()
+
+    print "%-50s %12s %9s %9s" % ('', 'metrics/s', 'p50 us', 'p99 us')
+    for result in run_suite(options):
+        print "%-50s %12d %9.2f %9.2f" % (
+            result['name'], result['metrics_per_sec'], result['p50_us'],
+            result['p99_us'])
+
+if __name__ == "__main__":
+    main()
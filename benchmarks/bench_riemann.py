@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Throughput of RiemannHandler against a local stub Riemann server
+
+Compares sending every event in its own message (batch 1, as the handler
+used to) with batching many events per message. Each run processes the
+metrics and flushes. Needs bernhard.
+
+    ./benchmarks/bench_riemann.py [--riemann-metrics N]
+                                  [--riemann-batch 1,100,1000]
+"""
+
+import time
+import optparse
+
+import harness
+
+from diamond.handler.riemann import RiemannHandler
+from diamond.metric import Metric
+
+# Metrics per process_batch call
+CHUNK = 100
+
+
+def run(sink, batch, metrics):
+    handler = RiemannHandler({'host': '127.0.0.1', 'port': sink.port,
+                              'batch': batch})
+
+    messages = sink.messages
+    start = time.time()
+    for offset in xrange(0, len(metrics), CHUNK):
+        handler.process_batch(metrics[offset:offset + CHUNK])
+    handler.flush()
+    elapsed = time.time() - start
+    handler._close()
+
+    count = len(metrics)
+    return {
+        'name': 'riemann.batch_%d' % batch,
+        'metrics': count,
+        'seconds': elapsed,
+        'metrics_per_sec': count / elapsed,
+        'messages': sink.messages - messages,
+    }
+
+
+def add_options(parser):
+    parser.add_option("--riemann-metrics", dest="riemann_metrics",
+                      type="int", default=20000,
+                      help="metrics to send per run")
+    parser.add_option("--riemann-batch", dest="riemann_batch",
+                      default="1,100,1000",
+                      help="comma separated events per message")
+
+
+def run_suite(options):
+    metrics = [Metric('servers.host%d.cpu.cpu%d.user' % (i / 100, i % 100),
+                      i, timestamp=1234567890, host='host%d' % (i / 100),
+                      interval=10)
+               for i in xrange(options.riemann_metrics)]
+    sink = harness.RiemannSink()
+    try:
+        for batch in options.riemann_batch.split(','):
+            yield run(sink, int(batch), metrics)
+    finally:
+        sink.close()
+
+
+def main():
+    parser = optparse.OptionParser()
+    add_options(parser)
+    (options, args) = parser.parse_args()
+
+    print "%-30s %12s %9s" % ('', 'metrics/s', 'messages')
+    for result in run_suite(options):
+        print "%-30s %12d %9d" % (
+            result['name'], result['metrics_per_sec'], result['messages'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# coding=utf-8
+
+"""
+Shared helpers for the benchmarks: stub listeners for the socket, HTTP and
+Riemann handlers, latency percentiles, memory measurements and the JSON results
+format used to compare runs between commits.
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import platform
+import resource
+import threading
+import subprocess
+import BaseHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                             '..', 'src')))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class Sink(object):
+    """
+    Local listener that accepts and discards whatever is sent to it, so
+    socket handlers can be benchmarked offline
+    """
+
+    def __init__(self, proto='tcp'):
+        self.proto = proto
+        self.received = 0
+        if proto == 'udp':
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('127.0.0.1', 0))
+        self.port = self.socket.getsockname()[1]
+        if proto != 'udp':
+            self.socket.listen(16)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _serve(self):
+        if self.proto == 'udp':
+            self._drain(self.socket)
+            return
+        while self.running:
+            try:
+                conn, addr = self.socket.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self._drain, args=(conn,))
+            thread.setDaemon(True)
+            thread.start()
+
+    def _drain(self, conn):
+        while self.running:
+            try:
+                data = conn.recv(65536)
+            except socket.error:
+                return
+            if not data and self.proto != 'udp':
+                return
+            self.received += len(data)
+
+    def close(self):
+        self.running = False
+        try:
+            self.socket.close()
+        except socket.error:
+            pass
+
+
+class RiemannSink(Sink):
+    """
+    Local listener speaking the Riemann TCP protocol: every length prefixed
+    message is answered with an ok Msg
+    """
+
+    # Msg with ok = true (field 2, varint 1)
+    RESPONSE = struct.pack('!I', 2) + '\x10\x01'
+
+    def __init__(self):
+        self.messages = 0
+        Sink.__init__(self, 'tcp')
+
+    def _drain(self, conn):
+        f = conn.makefile('rb')
+        while self.running:
+            try:
+                header = f.read(4)
+                if len(header) < 4:
+                    return
+                data = f.read(struct.unpack('!I', header)[0])
+                conn.sendall(self.RESPONSE)
+            except socket.error:
+                return
+            self.received += len(data)
+            self.messages += 1
+
+
+class HttpSink(object):
+    """
+    Local HTTP/1.1 server that accepts and discards POSTed bodies, keeping
+    connections alive
+    """
+
+    def __init__(self):
+        sink = self
+        self.received = 0
+        self.requests = 0
+        self.connections = 0
+
+        class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Write the response in one go, small writes stall on Nagle
+            # and delayed ACKs
+            wbufsize = -1
+
+            def setup(self):
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+                sink.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.getheader('Content-Length', 0))
+                sink.received += len(self.rfile.read(length))
+                sink.requests += 1
+                self.send_response(204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        class Server(BaseHTTPServer.HTTPServer):
+            # A thread per connection, as keep-alive holds on to it
+            def process_request(self, request, client_address):
+                thread = threading.Thread(
+                    target=self.finish_and_close,
+                    args=(request, client_address))
+                thread.setDaemon(True)
+                thread.start()
+
+            def finish_and_close(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except socket.error:
+                    pass
+                self.shutdown_request(request)
+
+        self.server = Server(('127.0.0.1', 0), RequestHandler)
+        self.port = self.server.server_address[1]
+        self.url = 'http://127.0.0.1:%d/metrics' % self.port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values, pct):
+    """
+    Nearest rank percentile of a sorted list
+    """
+    if not values:
+        return 0.0
+    index = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in kB
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes
+        usage /= 1024
+    return usage
+
+
+class AllocationMeter(object):
+    """
+    Measures allocations made between start and stop. Uses tracemalloc
+    (peak bytes) where available, otherwise counts the gc tracked objects
+    that were created and still alive when stop is called.
+    """
+
+    def start(self):
+        if tracemalloc is not None:
+            tracemalloc.start()
+        else:
+            gc.collect()
+            self.objects = len(gc.get_objects())
+
+    def stop(self):
+        if tracemalloc is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return {'alloc_peak_bytes': peak}
+        return {'alloc_objects': len(gc.get_objects()) - self.objects}
+
+
+def environment():
+    """
+    Describe the machine and commit a result was taken on
+    """
+    try:
+        commit = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE).communicate()[0]
+        commit = commit.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': int(time.time()),
+    }
+
+
+def save(results, path):
+    """
+    Write results as JSON
+    """
+    f = open(path, 'w')
+    try:
+        json.dump(results, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+
+def load(path):
+    f = open(path)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+
+def compare(baseline, results):
+    """
+    Return (name, field, baseline, current, change %) for the throughput and
+    latency figures of every benchmark in both result sets
+    """
+    rows = []
+    old = dict((r['name'], r) for r in baseline['benchmarks'])
+    for result in results['benchmarks']:
+        base = old.get(result['name'])
+        if base is None:
+            continue
+        for field in ('metrics_per_sec', 'p50_us', 'p99_us'):
+            if field not in result or not base.get(field):
+                continue
+            change = (result[field] - base[field]) / float(base[field]) * 100
+            rows.append((result['name'], field, base[field], result[field],
+                         change))
+    return rows
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Run the benchmark suites and save the results as JSON, optionally comparing
+them with the results of an earlier run:
+
+    ./benchmarks/run.py --output before.json
+    (change something)
+    ./benchmarks/run.py --output after.json --compare before.json
+
+Suites: metric (Metric construction and rendering), pipeline (collector to
+handler, see bench_pipeline.py), hashring (consistent hash routing of
+MultiGraphiteHandler), http (HttpPostHandler posting) and riemann
+(RiemannHandler batching, needs bernhard so it is not run by default).
+Everything runs offline against local stub listeners.
+"""
+
+import sys
+import optparse
+
+import harness
+import bench_hashring
+import bench_http
+import bench_metric
+import bench_pipeline
+import bench_riemann
+
+SUITES = {
+    'hashring': bench_hashring,
+    'http': bench_http,
+    'metric': bench_metric,
+    'pipeline': bench_pipeline,
+    'riemann': bench_riemann,
+}
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("-s", "--suites", dest="suites",
+                      default="metric,pipeline,hashring,http",
+                      help="comma separated suites to run")
+    parser.add_option("-o", "--output", dest="output",
+                      help="write the results as JSON to this file")
+    parser.add_option("-c", "--compare", dest="compare",
+                      help="JSON results of an earlier run to compare with")
+    parser.add_option("--threshold", dest="threshold", type="float",
+                      default=10.0,
+                      help="flag changes larger than this many percent")
+    for suite in SUITES.values():
+        suite.add_options(parser)
+    (options, args) = parser.parse_args()
+
+    results = {
+        'environment': harness.environment(),
+        'benchmarks': [],
+    }
+    for name in options.suites.split(','):
+        suite = SUITES[name.strip()]
+        for result in suite.run_suite(options):
+            results['benchmarks'].append(result)
+            print "%-50s %12d metrics/s" % (result['name'],
+                                            result['metrics_per_sec'])
+            sys.stdout.flush()
+
+    if options.output:
+        harness.save(results, options.output)
+
+    if options.compare:
+        print
+        print "Compared with %s" % options.compare
+        regressions = 0
+        for name, field, old, new, change in harness.compare(
+                harness.load(options.compare), results):
+            # Throughput should go up, latencies down
+            if field == 'metrics_per_sec':
+                worse = change < -options.threshold
+            else:
+                worse = change > options.threshold
+            if worse:
+                regressions += 1
+            print "%-50s %-16s %12.2f %12.2f %+7.1f%%%s" % (
+                name, field, old, new, change, worse and ' <-' or '')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -124,7 +124,7 @@ setup(
     description='Smart data producer for graphite graphing package',
     package_dir={'': 'src'},
     packages=['diamond', 'diamond.handler'],
-    scripts=['bin/diamond', 'bin/diamond-setup'],
+    scripts=['bin/diamond', 'bin/diamond-setup', 'bin/diamond-replay'],
     data_files=data_files,
     install_requires=install_requires,
     #test_suite='test.main',
@@ -171,9 +171,7 @@ class CPUCollector(diamond.collector.Collector):
                     self.config['xenfix'] = False
 
             # Publish Metric Derivative
-            for metric_name in metrics.keys():
-                self.publish(metric_name,
-                             metrics[metric_name])
+            self.publish_many(metrics.items())
             return True
 
         else:
@@ -184,44 +182,22 @@ class CPUCollector(diamond.collector.Collector):
 
             cpu_time = psutil.cpu_times(True)
             total_time = psutil.cpu_times()
-            for i in range(0, len(cpu_time)):
-                metric_name = 'cpu' + str(i)
-                self.publish(metric_name + '.user',
-                             self.derivative(metric_name + '.user',
-                                             cpu_time[i].user,
-                                             self.MAX_VALUES['user']))
-                if hasattr(cpu_time[i], 'nice'):
-                    self.publish(metric_name + '.nice',
-                                 self.derivative(metric_name + '.nice',
-                                                 cpu_time[i].nice,
-                                                 self.MAX_VALUES['nice']))
-                self.publish(metric_name + '.system',
-                             self.derivative(metric_name + '.system',
-                                             cpu_time[i].system,
-                                             self.MAX_VALUES['system']))
-                self.publish(metric_name + '.idle',
-                             self.derivative(metric_name + '.idle',
-                                             cpu_time[i].idle,
-                                             self.MAX_VALUES['idle']))
-
-            metric_name = 'total'
-            self.publish(metric_name + '.user',
-                         self.derivative(metric_name + '.user',
-                                         total_time.user,
-                                         self.MAX_VALUES['user']))
-            if hasattr(total_time, 'nice'):
-                self.publish(metric_name + '.nice',
-                             self.derivative(metric_name + '.nice',
-                                             total_time.nice,
-                                             self.MAX_VALUES['nice']))
-            self.publish(metric_name + '.system',
-                         self.derivative(metric_name + '.system',
-                                         total_time.system,
-                                         self.MAX_VALUES['system']))
-            self.publish(metric_name + '.idle',
-                         self.derivative(metric_name + '.idle',
-                                         total_time.idle,
-                                         self.MAX_VALUES['idle']))
+            times = [('cpu' + str(i), cpu_time[i])
+                     for i in range(0, len(cpu_time))]
+            times.append(('total', total_time))
+
+            metrics = []
+            for cpu, cpu_times in times:
+                for s in ('user', 'nice', 'system', 'idle'):
+                    if not hasattr(cpu_times, s):
+                        continue
+                    metric_name = '.'.join([cpu, s])
+                    metrics.append((metric_name,
+                                    self.derivative(metric_name,
+                                                    getattr(cpu_times, s),
+                                                    self.MAX_VALUES[s])))
+
+            self.publish_many(metrics)
 
             return True
 
@@ -33,13 +33,13 @@ class TestCPUCollector(CollectorTestCase):
 
     @patch('__builtin__.open')
     @patch('os.access', Mock(return_value=True))
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_open_proc_stat(self, publish_mock, open_mock):
         open_mock.return_value = StringIO('')
         self.collector.collect()
         open_mock.assert_called_once_with('/proc/stat')
 
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_work_with_synthetic_data(self, publish_mock):
         patch_open = patch('__builtin__.open', Mock(return_value=StringIO(
             'cpu 100 200 300 400 500 0 0 0 0 0')))
@@ -65,7 +65,7 @@ class TestCPUCollector(CollectorTestCase):
             'total.user': 1.0
         })
 
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_work_with_real_data(self, publish_mock):
         CPUCollector.PROC = self.getFixturePath('proc_stat_1')
         self.collector.collect()
@@ -88,7 +88,7 @@ class TestCPUCollector(CollectorTestCase):
                            defaultpath=self.collector.config['path'])
         self.assertPublishedMany(publish_mock, metrics)
 
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_work_with_ec2_data(self, publish_mock):
         self.collector.config['interval'] = 30
         patch_open = patch('os.path.isdir', Mock(return_value=True))
@@ -275,7 +275,6 @@ class DiskUsageCollector(diamond.collector.Collector):
                                                  / 1000.0)
 
                 # Only publish when we have io figures
-                for key in metrics:
-                    metric_name = '.'.join([info['device'],
-                                            key]).replace('/', '_')
-                    self.publish(metric_name, metrics[key])
+                self.publish_many([('.'.join([info['device'],
+                                              key]).replace('/', '_'),
+                                    metrics[key]) for key in metrics])
@@ -78,8 +78,10 @@ class MemoryCgroupCollector(diamond.collector.Collector):
                     break
 
         # create metrics from collected utimes and stimes for cgroups
+        metrics = []
         for parent, cpuacct in results.iteritems():
             for key, value in cpuacct.iteritems():
                 metric_name = '.'.join([parent, key])
-                self.publish(metric_name, value, metric_type='GAUGE')
+                metrics.append((metric_name, value, 'GAUGE'))
+        self.publish_many(metrics)
         return True
@@ -38,7 +38,7 @@ class TestMemoryCgroupCollector(CollectorTestCase):
 
     @patch('__builtin__.open')
     @patch('os.walk', Mock(return_value=iter(fixtures)))
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_open_all_cpuacct_stat(self, publish_mock, open_mock):
         open_mock.side_effect = lambda x: StringIO('')
         self.collector.collect()
@@ -47,7 +47,7 @@ class TestMemoryCgroupCollector(CollectorTestCase):
         open_mock.assert_any_call(fixtures_path + 'lxc/memory.stat')
         open_mock.assert_any_call(fixtures_path + 'memory.stat')
 
-    @patch.object(Collector, 'publish')
+    @patch.object(Collector, 'publish_many')
     def test_should_work_with_real_data(self, publish_mock):
         MemoryCgroupCollector.MEMORY_PATH = fixtures_path
         self.collector.collect()
@@ -106,6 +106,7 @@ class NetworkCollector(diamond.collector.Collector):
                 results[device]['rx_packets'] = network_stat.packets_recv
                 results[device]['tx_packets'] = network_stat.packets_sent
 
+        metrics = []
         for device in results:
             stats = results[device]
             for s, v in stats.items():
@@ -123,10 +124,12 @@ class NetworkCollector(diamond.collector.Collector):
 
                     for u in self.config['byte_unit']:
                         # Public Converted Metric
-                        self.publish(metric_name.replace('bytes', u),
-                                     convertor.get(unit=u), 2)
+                        metrics.append((metric_name.replace('bytes', u),
+                                        convertor.get(unit=u), 'GAUGE', 2))
                 else:
                     # Publish Metric Derivative
-                    self.publish(metric_name, metric_value)
+                    metrics.append((metric_name, metric_value))
+
+        self.publish_many(metrics)
 
         return None
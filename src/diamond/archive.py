@@ -0,0 +1,340 @@
+# coding=utf-8
+
+"""
+Archive files of published metrics, written by the ArchiveHandler and read
+back by diamond-replay.
+
+Metrics are buffered in memory and written once buffer_size bytes are
+buffered or on flush. The file is rotated at midnight and/or once it is
+larger than max_bytes. Rotated files are named after the time the file was
+started, compressed in the background (gzip or bz2) and only the newest
+backup_count of them are kept.
+
+Two formats are supported. Text is one graphite line per metric. Binary
+starts with MAGIC, followed by records: a path definition ('P', id, length,
+path) before the first value of a path in the file, and fixed width value
+records ('V', id, timestamp, precision, value as a double).
+"""
+
+import os
+import bz2
+import gzip
+import time
+import struct
+import logging
+import datetime
+import threading
+
+from metric import Metric
+
+MAGIC = 'DIAMARC1'
+PATH_RECORD = struct.Struct('!cIH')
+VALUE_RECORD = struct.Struct('!cIIBd')
+
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.GzipFile),
+    'bz2': ('.bz2', bz2.BZ2File),
+}
+
+
+class ArchiveWriter(object):
+
+    def __init__(self, path, binary=False, buffer_size=65536,
+                 rotate='midnight', max_bytes=0, backup_count=7,
+                 compression='gzip'):
+        """
+        Create a new instance of the ArchiveWriter class
+        """
+        # Initialize Log
+        self.log = logging.getLogger('diamond')
+
+        # Initialize Options
+        self.path = path
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self.rotate_midnight = rotate == 'midnight'
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        if compression and compression not in COMPRESSORS:
+            raise ValueError("Unknown archive compression: %s" % compression)
+        self.compression = compression
+
+        # Initialize Data
+        self.file = None
+        self.buffer = []
+        self.buffered = 0
+        self.paths = {}
+        self.compressors = []
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self._open()
+
+    def _open(self):
+        """
+        Open the archive file for appending. A file left in the other format
+        is rotated first.
+        """
+        if os.path.exists(self.path) and os.path.getsize(self.path):
+            f = open(self.path, 'rb')
+            try:
+                is_binary = f.read(len(MAGIC)) == MAGIC
+            finally:
+                f.close()
+            # Binary files can't be continued, the path ids are gone
+            if self.binary or is_binary:
+                self.file = None
+                self._rename(os.path.getmtime(self.path))
+
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+        self.paths = {}
+        self.header_size = 0
+        if self.binary:
+            self.file.write(MAGIC)
+            self.size += len(MAGIC)
+            self.header_size = len(MAGIC)
+
+        self.opened_at = time.time()
+        self.rollover_at = None
+        if self.rotate_midnight:
+            tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+            self.rollover_at = time.mktime(tomorrow.timetuple())
+
+    def write(self, metric):
+        """
+        Buffer a metric
+        """
+        self.write_many([metric])
+
+    def write_many(self, metrics):
+        """
+        Buffer a list of metrics
+        """
+        if self.binary:
+            # Encoded on flush, the path ids depend on the file written to
+            self.buffer.extend(metrics)
+            self.buffered += VALUE_RECORD.size * len(metrics)
+        else:
+            for metric in metrics:
+                line = str(metric)
+                self.buffer.append(line)
+                self.buffered += len(line)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def _encode_binary(self, metric):
+        path_id = self.paths.get(metric.path)
+        definition = ''
+        if path_id is None:
+            path_id = self.paths[metric.path] = len(self.paths)
+            definition = PATH_RECORD.pack('P', path_id,
+                                          len(metric.path)) + metric.path
+        return definition + VALUE_RECORD.pack('V', path_id,
+                                              int(metric.timestamp),
+                                              metric.precision,
+                                              float(metric.value))
+
+    def flush(self):
+        """
+        Write the buffer to the archive file, rotating it first if due
+        """
+        if not self.buffer:
+            return
+        if self._should_rotate():
+            self.rotate()
+        if self.binary:
+            data = ''.join([self._encode_binary(metric)
+                            for metric in self.buffer])
+        else:
+            data = ''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def _should_rotate(self):
+        if self.size <= self.header_size:
+            # Nothing written to this file yet
+            return False
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return self.max_bytes > 0 and self.size >= self.max_bytes
+
+    def rotate(self):
+        """
+        Close the archive file, compress it in the background and start a
+        new one
+        """
+        self.file.close()
+        self.file = None
+        self._rename(self.opened_at)
+        self._open()
+
+    def _rename(self, started):
+        name = '%s.%s' % (self.path, time.strftime('%Y-%m-%d_%H-%M-%S',
+                                                   time.localtime(started)))
+        dest = name
+        count = 1
+        while self._exists(dest):
+            dest = '%s.%d' % (name, count)
+            count += 1
+        os.rename(self.path, dest)
+
+        if self.compression:
+            thread = threading.Thread(target=self._compress, args=(dest,),
+                                      name='ArchiveCompress')
+            thread.setDaemon(True)
+            thread.start()
+            self.compressors = [t for t in self.compressors if t.isAlive()]
+            self.compressors.append(thread)
+        self._cleanup()
+
+    def _exists(self, name):
+        if os.path.exists(name):
+            return True
+        for suffix, cls in COMPRESSORS.values():
+            if os.path.exists(name + suffix):
+                return True
+        return False
+
+    def _compress(self, name):
+        suffix, cls = COMPRESSORS[self.compression]
+        try:
+            src = open(name, 'rb')
+            try:
+                dst = cls(name + suffix + '.tmp', 'wb')
+                try:
+                    while True:
+                        chunk = src.read(1048576)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+            os.rename(name + suffix + '.tmp', name + suffix)
+            os.unlink(name)
+        except (IOError, OSError), e:
+            self.log.error("ArchiveWriter: Failed compressing %s. %s", name, e)
+
+    def _cleanup(self):
+        """
+        Remove all but the newest backup_count rotated files
+        """
+        if self.backup_count <= 0:
+            return
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + '.'
+        rotated = sorted([name for name in os.listdir(dirname)
+                          if name.startswith(prefix)
+                          and not name.endswith('.tmp')])
+        for name in rotated[:-self.backup_count]:
+            try:
+                os.unlink(os.path.join(dirname, name))
+            except OSError:
+                # Still being compressed
+                pass
+
+    def wait(self):
+        """
+        Wait for background compression to finish
+        """
+        for thread in self.compressors:
+            thread.join()
+        self.compressors = []
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def open_archive(path):
+    """
+    Open an archive file, compressed or not
+    """
+    for suffix, cls in COMPRESSORS.values():
+        if path.endswith(suffix):
+            return cls(path, 'rb')
+    return open(path, 'rb')
+
+
+def read_archive(path):
+    """
+    Generate the Metrics in an archive file
+    """
+    f = open_archive(path)
+    try:
+        header = f.read(len(MAGIC))
+        if header == MAGIC:
+            for metric in _read_binary(f):
+                yield metric
+            return
+
+        # Text, put back what was read of the first line
+        pending = header
+        while True:
+            chunk = f.read(1048576)
+            if not chunk:
+                break
+            lines = (pending + chunk).split('\n')
+            pending = lines.pop()
+            for line in lines:
+                metric = _parse_line(line)
+                if metric is not None:
+                    yield metric
+        metric = _parse_line(pending)
+        if metric is not None:
+            yield metric
+    finally:
+        f.close()
+
+
+def _parse_line(line):
+    parts = line.split()
+    if len(parts) != 3:
+        return None
+    path, value, timestamp = parts
+    if '.' in value:
+        precision = len(value) - value.index('.') - 1
+    else:
+        precision = 0
+    return Metric(path, float(value), timestamp=int(float(timestamp)),
+                  precision=precision)
+
+
+def _read_binary(f):
+    paths = {}
+    data = ''
+    while True:
+        chunk = f.read(1048576)
+        if not chunk:
+            break
+        data += chunk
+        offset = 0
+        while True:
+            if len(data) - offset < 1:
+                break
+            if data[offset] == 'P':
+                if len(data) - offset < PATH_RECORD.size:
+                    break
+                kind, path_id, length = PATH_RECORD.unpack_from(data, offset)
+                end = offset + PATH_RECORD.size + length
+                if len(data) < end:
+                    break
+                paths[path_id] = data[offset + PATH_RECORD.size:end]
+                offset = end
+            else:
+                if len(data) - offset < VALUE_RECORD.size:
+                    break
+                kind, path_id, timestamp, precision, value = (
+                    VALUE_RECORD.unpack_from(data, offset))
+                offset += VALUE_RECORD.size
+                yield Metric(paths[path_id], value, timestamp=timestamp,
+                             precision=precision)
+        data = data[offset:]
@@ -13,6 +13,8 @@ import traceback
 import time
 
 from diamond.metric import Metric
+from diamond.error import DiamondException
+from diamond.stats import registry
 
 # Detect the architecture of the system and set the counters for MAX_VALUES
 # appropriately. Otherwise, rolling over counters will cause incorrect or
@@ -135,6 +137,8 @@ class Collector(object):
         self.name = self.__class__.__name__
         self.handlers = handlers
         self.last_values = {}
+        # Metrics published during the current run
+        self.published = 0
 
         # Get Collector class
         cls = self.__class__
@@ -172,6 +176,11 @@ class Collector(object):
             self.config['measure_collector_time'])
 
         self.collect_running = False
+        # Runs dropped because the previous one was still going
+        self.skipped_runs = 0
+
+        # Shared parts of the metric path, resolved once per collector
+        self._path_template = None
 
     def get_default_config_help(self):
         """
@@ -181,6 +190,11 @@ class Collector(object):
             'enabled': 'Enable collecting these metrics',
             'byte_unit': 'Default numeric output(s)',
             'measure_collector_time': 'Collect the collector run time in ms',
+            'align': 'Run on wall-clock multiples of the interval',
+            'overrun_policy': 'What to do when a run takes longer than the'
+                              + ' interval: skip, late or backoff',
+            'overrun_backoff_max': 'Longest interval in seconds to back off'
+                                   + ' to with overrun_policy = backoff',
         }
 
     def get_default_config(self):
@@ -225,6 +239,18 @@ class Collector(object):
             # Default collector threading model
             'method': 'Sequential',
 
+            # Runs that may be queued or running at once with method Pooled
+            'max_concurrency': 1,
+
+            # Run on wall-clock multiples of the interval instead of after
+            # the splay, so all hosts sample at the same time
+            'align': False,
+
+            # When a run takes longer than the interval: skip the missed
+            # runs, run again right away (late) or back off exponentially
+            'overrun_policy': 'skip',
+            'overrun_backoff_max': 3600,
+
             # Default numeric output
             'byte_unit': 'byte',
 
@@ -266,12 +292,12 @@ class Collector(object):
             virtual machine and should have a different
             root prefix.
         """
-        if 'path' in self.config:
-            path = self.config['path']
-        else:
-            path = self.__class__.__name__
-
         if instance is not None:
+            if 'path' in self.config:
+                path = self.config['path']
+            else:
+                path = self.__class__.__name__
+
             if 'instance_prefix' in self.config:
                 prefix = self.config['instance_prefix']
             else:
@@ -281,6 +307,37 @@ class Collector(object):
             else:
                 return '.'.join([prefix, instance, path, name])
 
+        return '.'.join([self.get_path_template()[0], name])
+
+    def get_metric_prefix(self):
+        """
+        Get the part of the metric path that is shared by all metrics of
+        this collector: prefix, hostname, suffix and collector path.
+        """
+        return self.get_path_template()[0]
+
+    def get_path_template(self):
+        """
+        Return what is shared by all metrics of this collector as a (base,
+        path_prefix, hostname, collector_path, metric_base, interval) tuple.
+        base is the dotted path the metric name is appended to. The path
+        components are split as Metric would split the path, with
+        metric_base the part of the metric path ahead of the name. They are
+        None when they depend on the name, Metric then parses the path.
+
+        The template is built once per collector. Reloading the config
+        creates new collectors, and with them new templates.
+        """
+        if self._path_template is None:
+            self._path_template = self._build_path_template()
+        return self._path_template
+
+    def _build_path_template(self):
+        if 'path' in self.config:
+            path = self.config['path']
+        else:
+            path = self.__class__.__name__
+
         if 'path_prefix' in self.config:
             prefix = self.config['path_prefix']
         else:
@@ -303,9 +360,25 @@ class Collector(object):
             prefix = '.'.join((prefix, suffix))
 
         if path == '.':
-            return '.'.join([prefix, name])
+            base = prefix
         else:
-            return '.'.join([prefix, path, name])
+            base = '.'.join([prefix, path])
+        interval = int(self.config['interval'])
+
+        # Split as Metric.getPathPrefix, getCollectorPath and getMetricPath
+        # do: the collector path is the first part after the host
+        path_prefix = collector_path = metric_base = None
+        if hostname:
+            offset = base.find(hostname)
+            start = offset + len(hostname) + 1
+            end = (base + '.').find('.', start)
+            if offset > 0 and end != -1:
+                path_prefix = base[0:offset - 1]
+                collector_path = base[start:end]
+                metric_base = (base + '.')[end + 1:]
+
+        return (base, path_prefix, hostname, collector_path, metric_base,
+                interval)
 
     def get_hostname(self):
         return get_hostname(self.config)
@@ -321,25 +394,89 @@ class Collector(object):
         """
         Publish a metric with the given name
         """
-        # Get metric Path
-        path = self.get_metric_path(name, instance=instance)
-
         # Create Metric
-        metric = Metric(path, value, raw_value=raw_value, timestamp=None,
-                        precision=precision, host=self.get_hostname(),
-                        metric_type=metric_type)
+        metric = self._make_metric(name, value, raw_value, precision,
+                                   metric_type, instance)
 
         # Publish Metric
         self.publish_metric(metric)
 
+    def _make_metric(self, name, value, raw_value, precision, metric_type,
+                     instance=None):
+        """
+        Create a Metric for the given name, filling in the path components
+        from the path template so handlers don't have to parse the path
+        """
+        (base, path_prefix, hostname, collector_path, metric_base,
+         interval) = self.get_path_template()
+        if instance is not None:
+            path = self.get_metric_path(name, instance=instance)
+            return Metric(path, value, raw_value=raw_value, timestamp=None,
+                          precision=precision, host=self.get_hostname(),
+                          metric_type=metric_type, interval=interval)
+
+        if metric_base is None:
+            metric_path = None
+        else:
+            metric_path = metric_base + name
+        return Metric('.'.join([base, name]), value, raw_value=raw_value,
+                      timestamp=None, precision=precision, host=hostname,
+                      metric_type=metric_type, path_prefix=path_prefix,
+                      collector_path=collector_path, metric_path=metric_path,
+                      interval=interval)
+
     def publish_metric(self, metric):
         """
         Publish a Metric object
         """
+        self.published += 1
         # Process Metric
         for handler in self.handlers:
             handler._process(metric)
 
+    def publish_many(self, metrics):
+        """
+        Publish a batch of metrics given as (name, value[, metric_type[,
+        precision]]) tuples. metric_type defaults to GAUGE and precision to
+        0. COUNTER values are turned into their derivative, like
+        publish_counter does.
+        """
+        batch = []
+        for item in metrics:
+            name, value = item[0], item[1]
+            metric_type = 'GAUGE'
+            precision = 0
+            if len(item) > 2:
+                metric_type = item[2]
+            if len(item) > 3:
+                precision = item[3]
+
+            raw_value = None
+            if metric_type == 'COUNTER':
+                raw_value = value
+                value = self.derivative(name, value)
+
+            try:
+                batch.append(self._make_metric(name, value, raw_value,
+                                               precision, metric_type))
+            except DiamondException, e:
+                self.log.error("%s: Skipped metric %s. %s",
+                               self.__class__.__name__, name, e)
+
+        # Publish Metrics
+        self.publish_metrics(batch)
+
+    def publish_metrics(self, metrics):
+        """
+        Publish a list of Metric objects
+        """
+        if not metrics:
+            return
+        self.published += len(metrics)
+        # Process Metrics
+        for handler in self.handlers:
+            handler._process_batch(metrics)
+
     def publish_gauge(self, name, value, precision=0, instance=None):
         return self.publish(name, value, precision=precision,
                             metric_type='GAUGE', instance=instance)
@@ -400,6 +537,10 @@ class Collector(object):
         Run the collector unless it's already running
         """
         if self.collect_running:
+            self.skipped_runs += 1
+            registry.incr('collectors.%s.skipped' % self.name)
+            self.log.warn("Collector %s is still running, skipping this run.",
+                          self.__class__.__name__)
             return
         # Log
         self.log.debug("Collecting data from: %s" % self.__class__.__name__)
@@ -412,6 +553,8 @@ class Collector(object):
                 self.collect()
 
                 end_time = time.time()
+                registry.timing('collectors.%s.duration' % self.name,
+                                end_time - start_time)
 
                 if 'measure_collector_time' in self.config:
                     if self.config['measure_collector_time']:
@@ -422,9 +565,15 @@ class Collector(object):
             except Exception:
                 # Log Error
                 self.log.error(traceback.format_exc())
+                registry.incr('collectors.%s.errors' % self.name)
         finally:
             self.collect_running = False
             # After collector run, invoke a flush
             # method on each handler.
             for handler in self.handlers:
                 handler._flush()
+            # Count the metrics published once per run, not per metric
+            if self.published:
+                registry.incr('collectors.%s.metrics' % self.name,
+                              self.published)
+                self.published = 0
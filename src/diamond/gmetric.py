@@ -39,6 +39,8 @@
 
 from xdrlib import Packer, Unpacker
 import socket
+import struct
+import time
 
 slope_str2int = {'zero': 0,
                  'positive': 1,
@@ -59,13 +61,18 @@ class Gmetric:
     Class to send gmetric/gmond 2.X packets
 
     Thread safe
+
+    The metadata packet of a metric only changes with its type, units, slope,
+    tmax, dmax or group, so it is packed once and only sent again every TMAX
+    seconds or when one of them changes. The data packet is built from a
+    prefix packed once per metric and the value.
     """
 
     type = ('', 'string', 'uint16', 'int16', 'uint32', 'int32', 'float',
             'double', 'timestamp')
     protocol = ('udp', 'multicast')
 
-    def __init__(self, host, port, protocol):
+    def __init__(self, host, port, protocol, hostname=None, spoof=0):
         if protocol not in self.protocol:
             raise ValueError("Protocol must be one of: " + str(self.protocol))
 
@@ -75,37 +82,54 @@ class Gmetric:
                                    socket.IP_MULTICAST_TTL, 20)
         self.hostport = (host, int(port))
         #self.socket.connect(self.hostport)
+        self.hostname = hostname or socket.gethostname()
+        self.spoof = spoof
+        # NAME: [(TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP), meta_msg,
+        #        data prefix, last time the metadata was sent]
+        self.metadata = {}
 
     def send(self, NAME, VAL, TYPE='', UNITS='', SLOPE='both',
              TMAX=60, DMAX=0, GROUP=""):
-        if SLOPE not in slope_str2int:
-            raise ValueError("Slope must be one of: " + str(self.slope.keys()))
-        if TYPE not in self.type:
-            raise ValueError("Type must be one of: " + str(self.type))
-        if len(NAME) == 0:
-            raise ValueError("Name must be non-empty")
-
-        (meta_msg, data_msg) = gmetric_write(NAME,
-                                             VAL,
-                                             TYPE,
-                                             UNITS,
-                                             SLOPE,
-                                             TMAX,
-                                             DMAX,
-                                             GROUP)
-        # print msg
-
-        self.socket.sendto(meta_msg, self.hostport)
-        self.socket.sendto(data_msg, self.hostport)
-
-
-def gmetric_write(NAME, VAL, TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP):
+        key = (TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP)
+        entry = self.metadata.get(NAME)
+        if entry is None or entry[0] != key:
+            if SLOPE not in slope_str2int:
+                raise ValueError("Slope must be one of: "
+                                 + str(slope_str2int.keys()))
+            if TYPE not in self.type:
+                raise ValueError("Type must be one of: " + str(self.type))
+            if len(NAME) == 0:
+                raise ValueError("Name must be non-empty")
+
+            entry = [key,
+                     gmetric_write_meta(NAME, TYPE, UNITS, SLOPE, TMAX, DMAX,
+                                        GROUP, self.hostname, self.spoof),
+                     gmetric_write_data_prefix(NAME, self.hostname,
+                                               self.spoof),
+                     None]
+            self.metadata[NAME] = entry
+
+        now = time.time()
+        if entry[3] is None or now - entry[3] >= int(TMAX):
+            self.socket.sendto(entry[1], self.hostport)
+            entry[3] = now
+        self.socket.sendto(entry[2] + pack_string(str(VAL)), self.hostport)
+
+
+def pack_string(value):
     """
-    Arguments are in all upper-case to match XML
+    XDR string: length, then the bytes padded to a multiple of 4
+    """
+    length = len(value)
+    return struct.pack('>L', length) + value + '\0' * ((4 - length % 4) % 4)
+
+
+def gmetric_write_meta(NAME, TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP,
+                       HOSTNAME="test", SPOOF=0):
+    """
+    Metadata packet. Arguments are in all upper-case to match XML
     """
     packer = Packer()
-    HOSTNAME = "test"
-    SPOOF = 0
     # Meta data about a metric
     packer.pack_int(128)
     packer.pack_string(HOSTNAME)
@@ -124,17 +148,31 @@ def gmetric_write(NAME, VAL, TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP):
         packer.pack_int(1)
         packer.pack_string("GROUP")
         packer.pack_string(GROUP)
+    return packer.get_buffer()
+
 
-    # Actual data sent in a separate packet
+def gmetric_write_data_prefix(NAME, HOSTNAME="test", SPOOF=0):
+    """
+    Data packet up to the value, which follows as an XDR string
+    """
     data = Packer()
     data.pack_int(128 + 5)
     data.pack_string(HOSTNAME)
     data.pack_string(NAME)
     data.pack_int(SPOOF)
     data.pack_string("%s")
-    data.pack_string(str(VAL))
+    return data.get_buffer()
+
 
-    return packer.get_buffer(),  data.get_buffer()
+def gmetric_write(NAME, VAL, TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP,
+                  HOSTNAME="test", SPOOF=0):
+    """
+    Arguments are in all upper-case to match XML
+    """
+    return (gmetric_write_meta(NAME, TYPE, UNITS, SLOPE, TMAX, DMAX, GROUP,
+                               HOSTNAME, SPOOF),
+            gmetric_write_data_prefix(NAME, HOSTNAME, SPOOF)
+            + pack_string(str(VAL)))
 
 
 def gmetric_read(msg):
@@ -2,13 +2,23 @@
 
 import logging
 import threading
+import time
 import traceback
 
+from diamond.stats import registry
+
 
 class Handler(object):
     """
     Handlers process metrics that are collected by Collectors.
     """
+
+    # Statistics gathered under the handler lock and handed to the stats
+    # registry once per flush, to keep it off the per metric path
+    _stats_metrics = 0
+    _stats_process = 0.0
+    _stats_lock_wait = 0.0
+
     def __init__(self, config=None):
         """
         Create a new instance of the Handler class
@@ -27,9 +37,11 @@ class Handler(object):
         try:
             try:
                 self.lock.acquire()
+                self._stats_metrics += 1
                 self.process(metric)
             except Exception:
                 self.log.error(traceback.format_exc())
+                self._record_error()
         finally:
             if self.lock.locked():
                 self.lock.release()
@@ -42,19 +54,65 @@ class Handler(object):
         """
         raise NotImplementedError
 
+    def _process_batch(self, metrics):
+        """
+        Decorator for processing a list of metrics with a lock, catching
+        exceptions
+        """
+        start_time = time.time()
+        try:
+            try:
+                self.lock.acquire()
+                locked_time = time.time()
+                self._stats_metrics += len(metrics)
+                self._stats_lock_wait += locked_time - start_time
+                try:
+                    self.process_batch(metrics)
+                finally:
+                    self._stats_process += time.time() - locked_time
+            except Exception:
+                self.log.error(traceback.format_exc())
+                self._record_error()
+        finally:
+            if self.lock.locked():
+                self.lock.release()
+
+    def process_batch(self, metrics):
+        """
+        Process a list of metrics
+
+        Optional: Can be overridden in subclasses that can handle many
+        metrics at once
+        """
+        for metric in metrics:
+            self.process(metric)
+
     def _flush(self):
         """
         Decorator for flushing handlers with an lock, catching exceptions
         """
+        start_time = time.time()
+        locked_time = None
         try:
             try:
                 self.lock.acquire()
+                locked_time = time.time()
                 self.flush()
             except Exception:
                 self.log.error(traceback.format_exc())
+                self._record_error()
         finally:
+            stats = None
             if self.lock.locked():
+                stats = (self._stats_metrics, self._stats_process,
+                         self._stats_lock_wait + locked_time - start_time,
+                         time.time() - locked_time)
+                self._stats_metrics = 0
+                self._stats_process = 0.0
+                self._stats_lock_wait = 0.0
                 self.lock.release()
+            if stats is not None:
+                self._record_stats(*stats)
 
     def flush(self):
         """
@@ -63,3 +121,20 @@ class Handler(object):
         Optional: Should be overridden in subclasses
         """
         pass
+
+    def _record_error(self):
+        registry.incr('handlers.%s.errors' % self.__class__.__name__)
+
+    def _record_stats(self, metrics, process, lock_wait, flush):
+        """
+        Record the metrics processed since the last flush, the time spent
+        processing batches of them and waiting for the lock, and the time
+        the flush took
+        """
+        prefix = 'handlers.%s.' % self.__class__.__name__
+        if metrics:
+            registry.incr(prefix + 'metrics', metrics)
+        if process:
+            registry.timing(prefix + 'process', process)
+        registry.timing(prefix + 'lock_wait', lock_wait)
+        registry.timing(prefix + 'flush', flush)
@@ -1,13 +1,30 @@
 # coding=utf-8
 
 """
-Write the collected stats to a locally stored log file. Rotate the log file
-every night and remove after 7 days.
+Write the collected stats to a locally stored archive file. Metrics are
+buffered and written once `buffer_size` bytes are buffered or at the end of
+every collector run. The file is rotated every night (`rotate = midnight`)
+and/or once it is larger than `max_bytes`, rotated files are compressed in
+the background and removed after `days` rotations.
+
+#### Configuration
+
+ * `log_file` - The archive file.
+ * `days` - Rotated files to keep. (default: `7`)
+ * `format` - `text` for graphite lines, or `binary` for fixed width
+   records. (default: `text`)
+ * `buffer_size` - Bytes buffered between writes. (default: `65536`)
+ * `rotate` - `midnight`, or `none` to rotate on size only.
+   (default: `midnight`)
+ * `max_bytes` - Rotate once the file is this large, `0` to disable.
+   (default: `0`)
+ * `compression` - `gzip`, `bz2` or `none`. (default: `gzip`)
+
+Archives can be replayed into any handler with `diamond-replay`.
 """
 
 from Handler import Handler
-import logging
-import logging.handlers
+from diamond.archive import ArchiveWriter
 
 
 class ArchiveHandler(Handler):
@@ -21,26 +38,40 @@ class ArchiveHandler(Handler):
         # Initialize Handler
         Handler.__init__(self, config)
 
-        # Create Archive Logger
-        self.archive = logging.getLogger('archive')
-        self.archive.setLevel(logging.DEBUG)
-        # Create Archive Log Formatter
-        formatter = logging.Formatter('%(message)s')
-        # Create Archive Log Handler
-        handler = logging.handlers.TimedRotatingFileHandler(
-            filename=self.config['log_file'],
-            when='midnight',
-            interval=1,
-            backupCount=int(self.config.get('days', 7)),
-            encoding=self.config.get('encoding', None)
-            )
-        handler.setFormatter(formatter)
-        handler.setLevel(logging.DEBUG)
-        self.archive.addHandler(handler)
+        # Initialize Options
+        self.format = self.config.get('format', 'text')
+        if self.format not in ('text', 'binary'):
+            raise ValueError("ArchiveHandler: Unknown format %r" % self.format)
+        compression = self.config.get('compression', 'gzip')
+        if compression == 'none':
+            compression = None
+
+        # Create Archive Writer
+        self.archive = ArchiveWriter(
+            self.config['log_file'],
+            binary=self.format == 'binary',
+            buffer_size=int(self.config.get('buffer_size', 65536)),
+            rotate=self.config.get('rotate', 'midnight'),
+            max_bytes=int(self.config.get('max_bytes', 0)),
+            backup_count=int(self.config.get('days', 7)),
+            compression=compression)
 
     def process(self, metric):
         """
         Send a Metric to the Archive.
         """
         # Archive Metric
-        self.archive.info(str(metric).strip())
+        self.archive.write(metric)
+
+    def process_batch(self, metrics):
+        """
+        Send a list of Metrics to the Archive.
+        """
+        self.archive.write_many(metrics)
+
+    def flush(self):
+        """Write the buffered metrics"""
+        self.archive.flush()
+
+    def __del__(self):
+        self.archive.close()
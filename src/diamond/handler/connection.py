@@ -0,0 +1,185 @@
+# coding=utf-8
+
+"""
+Socket connection for handlers that talk to a backend over TCP or UDP.
+
+Connecting is done by a background thread, so a handler asking for the
+socket never blocks on an unreachable backend while holding its lock. Failed
+attempts are retried with exponential backoff and jitter, from
+reconnect_backoff_min up to reconnect_backoff_max seconds.
+
+The connection state is published as self-metrics:
+handlers.<name>.connected, handlers.<name>.reconnect_backoff and
+handlers.<name>.reconnect_failures.
+"""
+
+import time
+import random
+import socket
+import logging
+import threading
+
+from diamond.stats import registry
+
+
+class Connection(object):
+
+    # States
+    DISCONNECTED = 'disconnected'
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+
+    def __init__(self, name, host, port, proto='tcp', timeout=15,
+                 backoff_min=1, backoff_max=60, jitter=0.2):
+        """
+        Create a new instance of the Connection class
+        """
+        # Initialize Log
+        self.log = logging.getLogger('diamond')
+
+        # Initialize Options
+        self.name = name
+        self.host = host
+        self.port = port
+        self.proto = proto
+        self.timeout = timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = max(backoff_max, backoff_min)
+        self.jitter = jitter
+
+        # Initialize Data
+        self.lock = threading.Lock()
+        self.socket = None
+        self.state = self.DISCONNECTED
+        self.backoff = 0
+        self.failures = 0
+        self.closed = False
+        self.thread = None
+        self._record_state()
+
+    def get_socket(self):
+        """
+        Return the socket if connected. Otherwise make sure a reconnect is
+        under way and return None, without waiting for it.
+        """
+        self.lock.acquire()
+        try:
+            if self.state == self.DISCONNECTED and not self.closed:
+                self.state = self.CONNECTING
+                self.thread = threading.Thread(
+                    target=self._reconnect,
+                    name='Connection-%s' % self.name)
+                self.thread.setDaemon(True)
+                self.thread.start()
+            return self.socket
+        finally:
+            self.lock.release()
+
+    def is_failing(self):
+        """
+        Whether connecting failed since the socket was last connected.
+        Until then the backend is not known to be down, and handlers keep
+        their data for when the pending connect completes.
+        """
+        return self.failures > 0
+
+    def reset(self):
+        """
+        Drop the socket after a failed send. The next get_socket starts
+        reconnecting.
+        """
+        self.lock.acquire()
+        try:
+            self._close_socket()
+            if self.state == self.CONNECTED:
+                self.state = self.DISCONNECTED
+        finally:
+            self.lock.release()
+        self._record_state()
+
+    def close(self):
+        """
+        Close the socket for good
+        """
+        self.lock.acquire()
+        try:
+            self.closed = True
+            self._close_socket()
+            self.state = self.DISCONNECTED
+        finally:
+            self.lock.release()
+
+    def _close_socket(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+        self.socket = None
+
+    def _open(self):
+        """
+        Open a connected socket to the backend, this may block for timeout
+        """
+        if self.proto == 'udp':
+            stream = socket.SOCK_DGRAM
+        else:
+            stream = socket.SOCK_STREAM
+        sock = socket.socket(socket.AF_INET, stream)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect((self.host, self.port))
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def get_delay(self):
+        """
+        Seconds to wait before the next attempt
+        """
+        if not self.failures:
+            return 0
+        self.backoff = min(self.backoff_min * 2 ** (self.failures - 1),
+                           self.backoff_max)
+        return self.backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _reconnect(self):
+        """
+        Reconnect thread, tries until connected or closed
+        """
+        while not self.closed:
+            delay = self.get_delay()
+            self._record_state()
+            if delay:
+                time.sleep(delay)
+            try:
+                sock = self._open()
+            except Exception, ex:
+                self.failures += 1
+                registry.incr('handlers.%s.reconnect_failures' % self.name)
+                self.log.error("%s: Failed to connect to %s:%i. %s.",
+                               self.name, self.host, self.port, ex)
+                continue
+
+            self.lock.acquire()
+            try:
+                if self.closed:
+                    sock.close()
+                    return
+                self.socket = sock
+                self.state = self.CONNECTED
+                self.failures = 0
+                self.backoff = 0
+            finally:
+                self.lock.release()
+            self.log.debug("%s: Established connection to %s:%d.",
+                           self.name, self.host, self.port)
+            self._record_state()
+            return
+
+    def _record_state(self):
+        prefix = 'handlers.%s.' % self.name
+        registry.gauge(prefix + 'connected',
+                       int(self.state == self.CONNECTED))
+        registry.gauge(prefix + 'reconnect_backoff', self.backoff)
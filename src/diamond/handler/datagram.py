@@ -0,0 +1,93 @@
+# coding=utf-8
+
+"""
+Packs metric lines into UDP datagrams for the handlers that send over UDP.
+
+Lines are appended to a datagram until the next one would take it past
+max_payload bytes, so a line is never split over two datagrams. The default
+of 1432 bytes fits an ethernet MTU of 1500 with the IP and UDP headers and
+some room for tunnels. A single line larger than max_payload can not be sent
+and is dropped.
+
+Counted as self-metrics: handlers.<name>.packets, handlers.<name>.oversized
+and the handlers.<name>.packets_per_cycle gauge, the number of datagrams
+sent between two calls to cycle().
+"""
+
+import logging
+
+from diamond.stats import registry
+
+
+class DatagramPacker(object):
+
+    def __init__(self, name, max_payload=1432):
+        """
+        Create a new instance of the DatagramPacker class
+        """
+        # Initialize Log
+        self.log = logging.getLogger('diamond')
+
+        # Initialize Options
+        self.name = name
+        self.max_payload = max_payload
+
+        # Initialize Data
+        self.packets = 0
+        self.cycle_packets = 0
+        self.oversized = 0
+
+    def pack(self, lines):
+        """
+        Return the list of datagrams holding lines, each at most max_payload
+        bytes. Lines must already end with their separator.
+        """
+        datagrams = []
+        current = []
+        size = 0
+        for line in lines:
+            length = len(line)
+            if length > self.max_payload:
+                self.oversized += 1
+                registry.incr('handlers.%s.oversized' % self.name)
+                self.log.warn("%s: Dropping a %d byte line, larger than the "
+                              "%d byte datagram payload.", self.name, length,
+                              self.max_payload)
+                continue
+            if size + length > self.max_payload:
+                datagrams.append(''.join(current))
+                current = []
+                size = 0
+            current.append(line)
+            size += length
+        if current:
+            datagrams.append(''.join(current))
+        return datagrams
+
+    def send(self, sock, lines, address=None):
+        """
+        Pack lines and send the datagrams on sock, or to address if the
+        socket is not connected. This is still one system call per datagram,
+        the socket module has no way to send several at once (sendmmsg).
+        """
+        datagrams = self.pack(lines)
+        if address is None:
+            write = sock.send
+            for datagram in datagrams:
+                write(datagram)
+        else:
+            write = sock.sendto
+            for datagram in datagrams:
+                write(datagram, address)
+        self.packets += len(datagrams)
+        self.cycle_packets += len(datagrams)
+        registry.incr('handlers.%s.packets' % self.name, len(datagrams))
+        return len(datagrams)
+
+    def cycle(self):
+        """
+        Publish the number of datagrams sent since the last cycle
+        """
+        registry.gauge('handlers.%s.packets_per_cycle' % self.name,
+                       self.cycle_packets)
+        self.cycle_packets = 0
@@ -0,0 +1,271 @@
+# coding=utf-8
+
+"""
+Decouple collectors from handlers by placing a bounded queue in front of a
+handler. The queue is drained by a dedicated worker thread, so a slow or hung
+backend only ever stalls its own worker and never the collector threads.
+
+Enable it for a handler (or for all handlers via `[[default]]`) by setting a
+queue size in the handler's config section:
+
+        [[GraphiteHandler]]
+        queue_size = 10000
+        # drop_oldest, drop_newest or block (default: drop_oldest)
+        queue_overflow = drop_oldest
+        # seconds to wait for the queue to drain on shutdown (default: 30)
+        queue_stop_timeout = 30
+
+Flushes are never dropped, whatever the policy. In a forked collector
+process, which has no worker thread, metrics go straight to the handler.
+
+"""
+
+import logging
+import os
+import threading
+import time
+import traceback
+import Queue
+
+
+class Dispatcher(object):
+    """
+    Wraps a Handler and hands metrics to it from a worker thread
+    """
+
+    # Overflow policies
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    BLOCK = 'block'
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+    # Queue item kinds
+    _METRIC = 0
+    _BATCH = 1
+    _FLUSH = 2
+    _STOP = 3
+
+    def __init__(self, handler, size, policy=DROP_OLDEST, stop_timeout=30):
+        """
+        Create a new instance of the Dispatcher class
+        """
+        # Initialize Log
+        self.log = logging.getLogger('diamond')
+
+        policy = policy.lower().strip()
+        if policy not in self.POLICIES:
+            raise ValueError("Invalid queue_overflow policy: %s" % policy)
+        if size < 1:
+            raise ValueError("Queue size must be >0")
+
+        # Initialize Data
+        self.handler = handler
+        self.name = handler.__class__.__name__
+        self.size = size
+        self.policy = policy
+        self.stop_timeout = stop_timeout
+        self.queue = Queue.Queue(size)
+        self.pid = os.getpid()
+
+        # Initialize Counters
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.drop_events = 0
+        self.latency_last = 0.0
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.latency_samples = 0
+
+        # Start Worker
+        self.thread = threading.Thread(target=self._drain,
+                                       name='Dispatcher-%s' % self.name)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _process(self, metric):
+        """
+        Queue a metric for the handler
+        """
+        self._put((self._METRIC, metric, time.time()))
+
+    def _process_batch(self, metrics):
+        """
+        Queue a list of metrics for the handler as a single item
+        """
+        self._put((self._BATCH, metrics, time.time()))
+
+    def _flush(self):
+        """
+        Queue a flush for the handler, keeping it ordered with the metrics
+        """
+        self._put((self._FLUSH, None, time.time()))
+
+    def stop(self):
+        """
+        Stop the worker once the queue has been drained, giving up after
+        stop_timeout seconds so a hung backend can't block shutdown
+        """
+        if not self.thread.isAlive():
+            return
+        self._put_marker((self._STOP, None, time.time()))
+        self.thread.join(self.stop_timeout)
+        if self.thread.isAlive():
+            self.queue.mutex.acquire()
+            try:
+                left = sum(self._count(item) for item in self.queue.queue)
+            finally:
+                self.queue.mutex.release()
+            self.log.error("Dispatcher: %s did not drain within %ss, %d "
+                           "queued metrics left.", self.name,
+                           self.stop_timeout, left)
+
+    def get_stats(self):
+        """
+        Return a dict of the dispatcher counters. The latency figures cover
+        the metrics processed since the last call.
+        """
+        if self.latency_samples:
+            latency_avg = self.latency_total / self.latency_samples
+        else:
+            latency_avg = 0.0
+        stats = {
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.size,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'latency_last': self.latency_last,
+            'latency_max': self.latency_max,
+            'latency_avg': latency_avg,
+        }
+        self.latency_max = 0.0
+        self.latency_total = 0.0
+        self.latency_samples = 0
+        return stats
+
+    def _put(self, item):
+        """
+        Put an item on the queue honouring the overflow policy
+        """
+        if os.getpid() != self.pid:
+            # Forked, the worker thread was left behind in the parent
+            self._handle(item)
+            return
+
+        if item[0] == self._FLUSH:
+            self._put_marker(item)
+            return
+
+        if self.policy == self.BLOCK:
+            self.queue.put(item)
+            self._count_enqueued(item)
+            return
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                self._count_enqueued(item)
+                return
+            except Queue.Full:
+                if self.policy == self.DROP_NEWEST:
+                    self._count_dropped(item)
+                    return
+            # Drop the oldest metrics and try again
+            oldest = self._evict_oldest()
+            if oldest is None:
+                # Nothing but flushes queued
+                self._count_dropped(item)
+                return
+            self._count_dropped(oldest)
+
+    def _put_marker(self, item):
+        """
+        Queue a flush or stop, even if the queue is full. A flush right
+        behind another one is left out.
+        """
+        queue = self.queue
+        queue.mutex.acquire()
+        try:
+            if (item[0] == self._FLUSH and queue.queue
+                    and queue.queue[-1][0] == self._FLUSH):
+                return
+            queue._put(item)
+            queue.unfinished_tasks += 1
+            queue.not_empty.notify()
+        finally:
+            queue.mutex.release()
+
+    def _evict_oldest(self):
+        """
+        Remove and return the oldest queued metric or batch, None if only
+        flushes are queued
+        """
+        queue = self.queue
+        queue.mutex.acquire()
+        try:
+            for i, queued in enumerate(queue.queue):
+                if queued[0] == self._METRIC or queued[0] == self._BATCH:
+                    del queue.queue[i]
+                    queue.not_full.notify()
+                    return queued
+            return None
+        finally:
+            queue.mutex.release()
+
+    def _count(self, item):
+        """
+        Number of metrics in a queue item
+        """
+        if item[0] == self._METRIC:
+            return 1
+        elif item[0] == self._BATCH:
+            return len(item[1])
+        return 0
+
+    def _count_enqueued(self, item):
+        self.enqueued += self._count(item)
+
+    def _count_dropped(self, item):
+        count = self._count(item)
+        if count:
+            self.dropped += count
+            self.drop_events += 1
+            if self.drop_events % self.size == 1:
+                self.log.warn("Dispatcher: %s queue is full, dropped %d "
+                              "metrics so far.", self.name, self.dropped)
+
+    def _drain(self):
+        """
+        Worker loop handing queued items to the handler
+        """
+        while True:
+            item = self.queue.get()
+            if item[0] == self._STOP:
+                return
+            try:
+                self._handle(item)
+            except Exception:
+                self.log.error(traceback.format_exc())
+
+    def _handle(self, item):
+        """
+        Hand a queue item to the handler
+        """
+        kind, payload, queued_at = item
+        if kind == self._FLUSH:
+            self.handler._flush()
+        elif kind == self._BATCH:
+            self.handler._process_batch(payload)
+            self._record_latency(time.time() - queued_at, len(payload))
+        else:
+            self.handler._process(payload)
+            self._record_latency(time.time() - queued_at)
+
+    def _record_latency(self, latency, count=1):
+        self.processed += count
+        self.latency_samples += 1
+        self.latency_last = latency
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
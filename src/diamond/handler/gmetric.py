@@ -3,10 +3,31 @@
 """
 Emulate a gmetric client for usage with
 [Ganglia Monitoring System](http://ganglia.sourceforge.net/)
+
+Metrics are named `<collector>.<metric path>` and grouped by collector. The
+metadata of each metric is sent once and then only every `tmax` seconds.
+
+#### Configuration
+
+        [[GmetricHandler]]
+        host = gmond.example.com
+        port = 8649
+        protocol = udp
+        # Hostname reported to gmond, defaults to the local hostname
+        # hostname =
+        # Set to 1 to report metrics for hostname instead of this host
+        # spoof = 0
+        # Metadata of the metrics
+        # metric_type = double
+        # units =
+        # slope = both
+        # tmax = 60
+        # dmax = 0
+
 """
 
 from Handler import Handler
-import gmetric
+from diamond import gmetric
 
 
 class GmetricHandler(Handler):
@@ -31,9 +52,16 @@ class GmetricHandler(Handler):
         self.protocol = self.config['protocol']
         if not self.protocol:
             self.protocol = 'udp'
+        self.metric_type = self.config.get('metric_type', 'double')
+        self.units = self.config.get('units', '')
+        self.slope = self.config.get('slope', 'both')
+        self.tmax = int(self.config.get('tmax', 60))
+        self.dmax = int(self.config.get('dmax', 0))
 
         # Initialize
-        self.gmetric = gmetric.Gmetric(self.host, self.port, self.protocol)
+        self.gmetric = gmetric.Gmetric(self.host, self.port, self.protocol,
+                                       self.config.get('hostname'),
+                                       int(self.config.get('spoof', 0)))
 
     def __del__(self):
         """
@@ -52,21 +80,20 @@ class GmetricHandler(Handler):
         """
         Send data to gmond.
         """
-        metric_name = self.get_name_from_path(metric.path)
-        tmax = "60"
-        dmax = "0"
-        slope = "both"
-        # FIXME: Badness, shouldn't *assume* double type
-        metric_type = "double"
-        units = ""
-        group = ""
+        try:
+            group = metric.getCollectorPath()
+            metric_name = '%s.%s' % (group, metric.getMetricPath())
+        except (ValueError, IndexError):
+            # Not a servers.<host>.<collector> path
+            group = ""
+            metric_name = metric.path
         self.gmetric.send(metric_name,
                           metric.value,
-                          metric_type,
-                          units,
-                          slope,
-                          tmax,
-                          dmax,
+                          self.metric_type,
+                          self.units,
+                          self.slope,
+                          self.tmax,
+                          self.dmax,
                           group)
 
     def _close(self):
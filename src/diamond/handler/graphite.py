@@ -14,10 +14,29 @@ the e-commerce monitoring system. Today many
 [large companies](http://graphite.readthedocs.org/en/latest/who-is-using.html)
 use it.
 
+While the connection is being set up, metrics are kept in memory. Once
+graphite can't be reached, they are kept up to `batch * max_backlog_multiplier`,
+after which the oldest are trimmed. To keep them instead, give the handler a
+spool directory. Unsent metrics then spill
+to disk and are replayed at `spool_replay_rate` bytes per second once the
+connection is back:
+
+        [[GraphiteHandler]]
+        spool_dir = /var/spool/diamond/graphite
+        spool_max_bytes = 1073741824
+
+With `proto = udp` metrics are packed into datagrams of at most
+`udp_payload_size` bytes (1432 by default), without splitting a metric.
+
 """
 
 from Handler import Handler
-import socket
+from connection import Connection
+from datagram import DatagramPacker
+from spool import Spool
+from diamond.stats import registry
+import os
+import time
 
 
 class GraphiteHandler(Handler):
@@ -47,6 +66,33 @@ class GraphiteHandler(Handler):
             self.config.get('trim_backlog_multiplier', 4))
         self.metrics = []
 
+        # Initialize Connection
+        self.connection = Connection(
+            self.__class__.__name__, self.host, self.port, self.proto,
+            self.timeout,
+            float(self.config.get('reconnect_backoff_min', 1)),
+            float(self.config.get('reconnect_backoff_max', 60)))
+
+        # Initialize Datagram Packer
+        self.packer = None
+        if self.proto == 'udp':
+            self.packer = DatagramPacker(
+                self.__class__.__name__,
+                int(self.config.get('udp_payload_size', 1432)))
+
+        # Initialize Spool
+        self.spool = None
+        if self.config.get('spool_dir'):
+            self.spool = Spool(
+                os.path.join(self.config['spool_dir'],
+                             '%s_%d' % (self.host, self.port)),
+                int(self.config.get('spool_max_bytes', 1073741824)),
+                int(self.config.get('spool_segment_bytes', 16777216)),
+                float(self.config.get('spool_fsync_interval', 1)))
+            self.spool_replay_rate = int(
+                self.config.get('spool_replay_rate', 1048576))
+            self.spool_last_replay = time.time()
+
         # Connect
         self._connect()
 
@@ -54,7 +100,10 @@ class GraphiteHandler(Handler):
         """
         Destroy instance of the GraphiteHandler class
         """
-        self._close()
+        if getattr(self, 'connection', None) is not None:
+            self.connection.close()
+        if getattr(self, 'spool', None) is not None:
+            self.spool.close()
 
     def process(self, metric):
         """
@@ -65,9 +114,19 @@ class GraphiteHandler(Handler):
         if len(self.metrics) >= self.batch_size:
             self._send()
 
+    def process_batch(self, metrics):
+        """
+        Process a list of metrics, sending them to graphite in one write
+        """
+        self.metrics.extend([str(metric) for metric in metrics])
+        if len(self.metrics) >= self.batch_size:
+            self._send()
+
     def flush(self):
         """Flush metrics in queue"""
         self._send()
+        if self.packer is not None:
+            self.packer.cycle()
 
     def _send_data(self, data):
         """
@@ -75,6 +134,15 @@ class GraphiteHandler(Handler):
         """
         self.socket.sendall(data)
 
+    def _write(self, lines):
+        """
+        Send lines in one write over TCP, or packed in datagrams over UDP
+        """
+        if self.packer is not None:
+            self.packer.send(self.socket, lines)
+        else:
+            self._send_data(''.join(lines))
+
     def _send(self):
         """
         Send data to graphite. Data that can not be sent will be queued.
@@ -83,22 +151,26 @@ class GraphiteHandler(Handler):
         try:
             try:
                 if self.socket is None:
-                    self.log.debug("GraphiteHandler: Socket is not connected. "
-                                   "Reconnecting.")
                     self._connect()
                 if self.socket is None:
-                    self.log.debug("GraphiteHandler: Reconnect failed.")
+                    self.log.debug("GraphiteHandler: Socket is not "
+                                   "connected yet.")
                 else:
                     # Send data to socket
-                    self._send_data(''.join(self.metrics))
-                    self.metrics = []
+                    if self.metrics:
+                        self._write(self.metrics)
+                        self.metrics = []
+                    if self.spool is not None:
+                        self._replay()
             except Exception:
                 self._close()
                 self.log.error("GraphiteHandler: Error sending metrics.")
                 raise
         finally:
-            if len(self.metrics) >= (
-                self.batch_size * self.max_backlog_multiplier):
+            if self.spool is not None:
+                self._spill()
+            elif self.connection.is_failing() and len(self.metrics) >= (
+                    self.batch_size * self.max_backlog_multiplier):
                 trim_offset = (self.batch_size
                                * self.trim_backlog_multiplier * -1)
                 self.log.warn('GraphiteHandler: Trimming backlog. Removing'
@@ -107,44 +179,51 @@ class GraphiteHandler(Handler):
                               abs(trim_offset))
                 self.metrics = self.metrics[trim_offset:]
 
-    def _connect(self):
+    def _spill(self):
         """
-        Connect to the graphite server
+        Move the backlog to the spool when graphite is unreachable or the
+        backlog has grown too large
         """
-        if (self.proto == 'udp'):
-            stream = socket.SOCK_DGRAM
-        else:
-            stream = socket.SOCK_STREAM
-
-        # Create socket
-        self.socket = socket.socket(socket.AF_INET, stream)
-        if socket is None:
-            # Log Error
-            self.log.error("GraphiteHandler: Unable to create socket.")
-            # Close Socket
-            self._close()
+        if self.metrics and (self.socket is None or len(self.metrics) >= (
+                self.batch_size * self.max_backlog_multiplier)):
+            self.log.debug("GraphiteHandler: Spooling %d metrics.",
+                           len(self.metrics))
+            self.spool.append(self.metrics)
+            self.metrics = []
+        registry.gauge('handlers.%s.spool_bytes' % self.__class__.__name__,
+                       self.spool.pending())
+
+    def _replay(self):
+        """
+        Send spooled metrics, no faster than spool_replay_rate bytes per
+        second on average
+        """
+        now = time.time()
+        if not self.spool.pending():
+            self.spool_last_replay = now
             return
-        # Set socket timeout
-        self.socket.settimeout(self.timeout)
-        # Connect to graphite server
-        try:
-            self.socket.connect((self.host, self.port))
-            # Log
-            self.log.debug("GraphiteHandler: Established connection to "
-                           "graphite server %s:%d.",
-                           self.host, self.port)
-        except Exception, ex:
-            # Log Error
-            self.log.error("GraphiteHandler: Failed to connect to %s:%i. %s.",
-                           self.host, self.port, ex)
-            # Close Socket
-            self._close()
+        # Allow for up to a minute of built up rate
+        elapsed = min(now - self.spool_last_replay, 60)
+        allowance = int(elapsed * self.spool_replay_rate)
+        if allowance <= 0:
             return
+        entries, position = self.spool.read(allowance)
+        if entries:
+            self._write(entries)
+            self.spool.commit(position)
+        self.spool_last_replay = now
+
+    def _connect(self):
+        """
+        Pick up the socket of the connection to the graphite server. It
+        connects in the background, so this never blocks.
+        """
+        self.socket = self.connection.get_socket()
 
     def _close(self):
         """
-        Close the socket
+        Drop the socket, the connection will reconnect
         """
         if self.socket is not None:
-            self.socket.close()
+            self.connection.reset()
         self.socket = None
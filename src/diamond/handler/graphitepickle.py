@@ -14,6 +14,11 @@ the e-commerce monitoring system. Today many
 [large companies](http://graphite.readthedocs.org/en/latest/who-is-using.html)
 use it.
 
+Metrics are pickled with protocol 2, the highest carbon reads, into chunks
+of at most `max_payload` bytes. carbon drops messages over 1MB. Each chunk
+is pickled once and sent as one length prefixed message, `batch` metrics at
+a time and at the end of every collector run.
+
 - enable it in `diamond.conf` :
 
 `    handlers = diamond.handler.graphitepickle.GraphitePickleHandler
@@ -37,6 +42,15 @@ class GraphitePickleHandler(GraphiteHandler):
     Overrides the GraphiteHandler class
     Sending data to graphite using batched pickle format
     """
+
+    # Highest protocol the carbon pickle receiver unpickles
+    PROTOCOL = 2
+
+    # Upper bound of the pickled size of a point, besides its path
+    POINT_OVERHEAD = 48
+    # Upper bound of the pickled size of the list holding the points
+    CHUNK_OVERHEAD = 16
+
     def __init__(self, config=None):
         """
         Create a new instance of the GraphitePickleHandler
@@ -44,36 +58,66 @@ class GraphitePickleHandler(GraphiteHandler):
         # Initialize GraphiteHandler
         GraphiteHandler.__init__(self, config)
         # Initialize Data
-        self.batch = []
+        self.points = []
         # Initialize Options
         self.batch_size = int(self.config.get('batch', 100))
+        self.max_payload = int(self.config.get('max_payload', 262144))
 
     def process(self, metric):
-        # Convert metric to pickle format
-        m = (metric.path, (metric.timestamp, metric.value))
-        # Add the metric to the match
-        self.batch.append(m)
-        # If there are sufficient metrics, then pickle and send
-        if len(self.batch) >= self.batch_size:
-            # Log
-            self.log.debug("GraphitePickleHandler: Sending batch size: %d",
-                           self.batch_size)
-            # Pickle the batch of metrics
-            self.metrics = [self._pickle_batch()]
-            # Send pickled batch
+        """
+        Queue a metric, sending once batch metrics are queued
+        """
+        self.points.append((metric.path, (metric.timestamp, metric.value)))
+        if len(self.points) >= self.batch_size:
+            self._send()
+
+    def process_batch(self, metrics):
+        """
+        Queue a list of metrics, sending once batch metrics are queued
+        """
+        self.points.extend([(metric.path, (metric.timestamp, metric.value))
+                            for metric in metrics])
+        if len(self.points) >= self.batch_size:
             self._send()
-            # Flush the metric pack down the wire
-            self.flush()
-            # Clear Batch
-            self.batch = []
 
-    def _pickle_batch(self):
+    def _send(self):
+        """
+        Pickle the queued points onto the backlog and send it
+        """
+        if self.points:
+            messages = self._pickle_points(self.points)
+            self.points = []
+            self.log.debug("GraphitePickleHandler: Sending %d messages",
+                           len(messages))
+            self.metrics.extend(messages)
+        GraphiteHandler._send(self)
+
+    def _pickle_points(self, points):
+        """
+        Split points into chunks that pickle to at most max_payload bytes
+        and pickle each of them. A point too large for a chunk of its own
+        is still sent, alone.
+        """
+        messages = []
+        start = 0
+        size = self.CHUNK_OVERHEAD
+        for i, point in enumerate(points):
+            point_size = len(point[0]) + self.POINT_OVERHEAD
+            if size + point_size > self.max_payload and i > start:
+                messages.append(self._pickle_batch(points[start:i]))
+                start = i
+                size = self.CHUNK_OVERHEAD
+            size += point_size
+        messages.append(self._pickle_batch(points[start:]))
+        return messages
+
+    def _pickle_batch(self, batch):
         """
         Pickle the metrics into a form that can be understood
         by the graphite pickle connector.
         """
         # Pickle
-        payload = pickle.dumps(self.batch)
+        payload = pickle.dumps(batch, self.PROTOCOL)
 
         # Pack Message
         header = struct.pack("!L", len(payload))
@@ -0,0 +1,81 @@
+# coding=utf-8
+
+"""
+The consistent hash ring of carbon-relay (carbon.hashing.ConsistentHashRing),
+so that Diamond routes every metric to the same carbon destination a
+carbon-relay with `RELAY_METHOD = consistent-hashing` would.
+
+Nodes are (server, instance) tuples, as in carbon, so the instance names in
+the destination list must match the relay's DESTINATIONS for the routing to
+agree.
+"""
+
+import bisect
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+
+class ConsistentHashRing(object):
+
+    def __init__(self, nodes=(), replica_count=100):
+        self.ring = []
+        self.positions = set()
+        self.nodes = set()
+        self.replica_count = replica_count
+        for node in nodes:
+            self.add_node(node)
+
+    def compute_ring_position(self, key):
+        big_hash = md5(str(key)).hexdigest()
+        small_hash = int(big_hash[:4], 16)
+        return small_hash
+
+    def add_node(self, node):
+        self.nodes.add(node)
+        for i in range(self.replica_count):
+            replica_key = "%s:%d" % (node, i)
+            position = self.compute_ring_position(replica_key)
+            while position in self.positions:
+                position = position + 1
+            self.positions.add(position)
+            bisect.insort(self.ring, (position, node))
+
+    def get_node(self, key):
+        position = self.compute_ring_position(key)
+        index = bisect.bisect_left(self.ring, (position, None)) % len(self.ring)
+        return self.ring[index][1]
+
+    def get_nodes(self, key, count=None):
+        """
+        Return up to count distinct nodes for key, in ring order
+        """
+        if count is None or count > len(self.nodes):
+            count = len(self.nodes)
+        nodes = []
+        position = self.compute_ring_position(key)
+        index = bisect.bisect_left(self.ring, (position, None)) % len(self.ring)
+        last_index = (index - 1) % len(self.ring)
+        while len(nodes) < count and index != last_index:
+            node = self.ring[index][1]
+            if node not in nodes:
+                nodes.append(node)
+            index = (index + 1) % len(self.ring)
+        return nodes
+
+
+def parse_destination(destination, default_port):
+    """
+    Split a host[:port[:instance]] destination into (host, port, instance)
+    """
+    parts = destination.strip().split(':')
+    host = parts[0]
+    port = default_port
+    instance = None
+    if len(parts) > 1 and parts[1]:
+        port = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        instance = parts[2]
+    return host, port, instance
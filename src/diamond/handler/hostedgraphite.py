@@ -47,6 +47,13 @@ class HostedGraphiteHandler(Handler):
         metric = self.key + '.' + str(metric)
         self.graphite._process(metric)
 
+    def _process_batch(self, metrics):
+        """
+        Process a list of metrics by sending them to graphite
+        """
+        self.graphite._process_batch([self.key + '.' + str(metric)
+                                      for metric in metrics])
+
     def _flush(self):
         self.graphite._flush()
 
@@ -4,9 +4,18 @@
 """
 Send metrics to a http endpoint via POST
 
+Metrics are gathered into batches, which are posted by a background thread
+over a persistent HTTP/1.1 connection, so a slow endpoint never holds up the
+collectors. A batch is closed once it holds `batch` metrics or `batch_bytes`
+bytes, or on a collector flush once it is `flush_interval` seconds old.
+A batch that fails on a reused connection is retried at once on a fresh
+one; batches that fail with a connection error or a 5xx response are then
+retried every `retry_interval` seconds. At most `max_queue` batches wait to be
+posted; the oldest are dropped beyond that.
+
 #### Dependencies
 
- * urllib2
+ * httplib
 
 
 #### Configuration
@@ -16,10 +25,22 @@ Enable this handler
 
  * url = http://www.example.com/endpoint
 
+ * compression = gzip (or deflate, default none)
+
 """
 
 from Handler import Handler
-import urllib2
+from diamond.stats import registry
+from StringIO import StringIO
+import collections
+import gzip
+import httplib
+import socket
+import threading
+import time
+import traceback
+import urlparse
+import zlib
 
 
 class HttpPostHandler(Handler):
@@ -28,21 +49,198 @@ class HttpPostHandler(Handler):
     def __init__(self, config=None):
         Handler.__init__(self, config)
         self.metrics = []
+        self.metrics_size = 0
         self.batch_size = int(self.config.get('batch', 100))
+        self.batch_bytes = int(self.config.get('batch_bytes', 1048576))
+        self.flush_interval = float(self.config.get('flush_interval', 0))
+        self.compression = self.config.get('compression', '')
+        self.timeout = float(self.config.get('timeout', 15))
+        self.max_queue = int(self.config.get('max_queue', 100))
+        self.retry_interval = float(self.config.get('retry_interval', 5))
         self.url = self.config.get('url')
 
+        # Split the url for httplib
+        url = urlparse.urlsplit(self.url)
+        if url.scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        else:
+            self.connection_class = httplib.HTTPConnection
+        self.netloc = url.netloc
+        self.path = url.path or '/'
+        if url.query:
+            self.path += '?' + url.query
+
+        # Start the poster thread
+        self.name = self.__class__.__name__
+        self.connection = None
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.batch_started = time.time()
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run,
+                                       name='%s-poster' % self.name)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
     # Join batched metrics and push to url mentioned in config
     def process(self, metric):
-        self.metrics.append(str(metric))
-        if len(self.metrics) >= self.batch_size:
+        self._add(str(metric))
+        if (len(self.metrics) >= self.batch_size
+                or self.metrics_size >= self.batch_bytes):
             self.post()
 
+    # Join a list of metrics and push them to url in a single POST
+    def process_batch(self, metrics):
+        for metric in metrics:
+            self._add(str(metric))
+        if (len(self.metrics) >= self.batch_size
+                or self.metrics_size >= self.batch_bytes):
+            self.post()
+
+    def _add(self, line):
+        if not self.metrics:
+            self.batch_started = time.time()
+        self.metrics.append(line)
+        self.metrics_size += len(line)
+
     #Overriding flush to post metrics for every collector.
     def flush(self):
         """Flush metrics in queue"""
-        self.post()
+        if time.time() - self.batch_started >= self.flush_interval:
+            self.post()
 
+    # Hand the current batch to the poster thread
     def post(self):
-        req = urllib2.Request(self.url, "\n".join(self.metrics))
-        urllib2.urlopen(req)
+        if not self.metrics:
+            return
+        item = [''.join(self.metrics), len(self.metrics), None]
         self.metrics = []
+        self.metrics_size = 0
+
+        self.condition.acquire()
+        try:
+            if len(self.queue) >= self.max_queue:
+                dropped = self.queue.popleft()
+                self.dropped += dropped[1]
+                registry.incr('handlers.%s.dropped' % self.name, dropped[1])
+                self.log.warn("%s: Post queue is full, dropped %d metrics.",
+                              self.name, dropped[1])
+            self.queue.append(item)
+            registry.gauge('handlers.%s.queue_depth' % self.name,
+                           len(self.queue))
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+    # Stop the poster thread after one more attempt at the queued batches,
+    # including the one being gathered
+    def stop(self):
+        if not self.thread.isAlive():
+            return
+        self.lock.acquire()
+        try:
+            self.post()
+        finally:
+            self.lock.release()
+        self.condition.acquire()
+        try:
+            self.running = False
+            self.condition.notify()
+        finally:
+            self.condition.release()
+        self.thread.join()
+
+    # Poster thread, posts the oldest batch until it is accepted
+    def _run(self):
+        while True:
+            self.condition.acquire()
+            try:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                item = self.queue[0]
+            finally:
+                self.condition.release()
+
+            try:
+                if item[2] is None:
+                    item[2] = self._encode(item[0])
+                done = self._post(item[2])
+            except Exception:
+                # Retrying will not help, keep the thread alive
+                self.log.error("%s: Failed posting metrics, dropping them. "
+                               "%s", self.name, traceback.format_exc())
+                registry.incr('handlers.%s.errors' % self.name)
+                self.dropped += item[1]
+                registry.incr('handlers.%s.dropped' % self.name, item[1])
+                done = True
+
+            self.condition.acquire()
+            try:
+                if (done or not self.running) and self.queue and (
+                        self.queue[0] is item):
+                    self.queue.popleft()
+                registry.gauge('handlers.%s.queue_depth' % self.name,
+                               len(self.queue))
+            finally:
+                self.condition.release()
+            if not done and self.running:
+                time.sleep(self.retry_interval)
+
+    # Compress a body as configured, returns (body, headers)
+    def _encode(self, body):
+        # As urllib2 posted it
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if self.compression == 'gzip':
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            headers['Content-Encoding'] = 'gzip'
+        elif self.compression == 'deflate':
+            body = zlib.compress(body)
+            headers['Content-Encoding'] = 'deflate'
+        return body, headers
+
+    # POST over the persistent connection, False if it should be retried
+    def _post(self, request):
+        body, headers = request
+        # A reused connection may have been closed by the server while idle,
+        # so give a fresh one a go straight away before backing off
+        for attempt in (1, 2):
+            reused = self.connection is not None
+            try:
+                if self.connection is None:
+                    self.connection = self.connection_class(
+                        self.netloc, timeout=self.timeout)
+                self.connection.request('POST', self.path, body, headers)
+                response = self.connection.getresponse()
+                response.read()
+                break
+            except (httplib.HTTPException, socket.error), e:
+                if self.connection is not None:
+                    self.connection.close()
+                self.connection = None
+                if reused:
+                    self.log.debug("%s: Reconnecting after %s.", self.name,
+                                   e)
+                    continue
+                self.log.error("%s: Failed posting metrics. %s.", self.name,
+                               e)
+                registry.incr('handlers.%s.errors' % self.name)
+                return False
+
+        if response.status >= 500:
+            self.log.error("%s: Failed posting metrics. HTTP %d.", self.name,
+                           response.status)
+            registry.incr('handlers.%s.errors' % self.name)
+            return False
+        elif response.status >= 400:
+            # Retrying will not help
+            self.log.error("%s: Metrics rejected, dropping them. HTTP %d.",
+                           self.name, response.status)
+            registry.incr('handlers.%s.errors' % self.name)
+        return True
@@ -0,0 +1,62 @@
+# coding=utf-8
+
+"""
+Bounded cache for per metric path lookups that are costly to repeat, such as
+rule matching or building topic names. Only the most recently used keys are
+kept, so the memory used stays bounded however many paths go by.
+"""
+
+
+class LRUCache(object):
+    """
+    Dict like cache that keeps the most recently used keys
+    """
+
+    def __init__(self, size):
+        """
+        @type size: int
+        @param size: maximal number of keys
+        """
+        self.size = size
+        self.data = {}
+        # circular doubly linked list of [prev, next, key, value], the root
+        # sits between the most and the least recently used links
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key):
+        """
+        @rtype the cached value or None
+        """
+        link = self.data.get(key)
+        if link is None:
+            return None
+        # move to the most recently used end
+        link_prev, link_next = link[0], link[1]
+        link_prev[1] = link_next
+        link_next[0] = link_prev
+        last = self.root[0]
+        last[1] = self.root[0] = link
+        link[0] = last
+        link[1] = self.root
+        return link[3]
+
+    def set(self, key, value):
+        """
+        cache a value, evicting the least recently used key if full
+        """
+        if key in self.data:
+            self.get(key)
+            self.data[key][3] = value
+            return
+        if len(self.data) >= self.size:
+            oldest = self.root[1]
+            self.root[1] = oldest[1]
+            oldest[1][0] = self.root
+            del self.data[oldest[2]]
+        last = self.root[0]
+        link = [last, self.root, key, value]
+        last[1] = self.root[0] = self.data[key] = link
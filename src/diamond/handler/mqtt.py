@@ -37,6 +37,21 @@ a `diamond.conf` containing something along these lines:
         certfile =      /path/to/certificate.pem
         keyfile =       /path/to/key.pem
 
+        # Topics kept in the metric path to topic cache
+        topic_cache_size = 10000    (default: 10000)
+
+        # With qos 1 or 2, messages waiting for the broker to acknowledge
+        # them. Once reached, publishing waits for room, up to
+        # inflight_timeout seconds per collector run in all. Past that,
+        # messages are dropped until the run is flushed.
+        max_inflight = 1000         (default: 1000)
+        inflight_timeout = 1        (default: 1)
+
+        # topic publishes every metric to its own topic, json publishes
+        # one JSON document per collector run to the collector's topic
+        # (e.g. servers/host/cpu), mapping metric names to values
+        mode = topic        (default: topic)
+
 Test by launching an MQTT subscribe, e.g.:
 
         mosquitto_sub  -v -t 'servers/#'
@@ -54,8 +69,11 @@ which subscribes to an MQTT broker and sends metrics off to Graphite.
 
 * This handler sets a last will and testament, so that the broker
   publishes its death at a topic called clients/diamond/<hostname>
-* Support for reconnecting to a broker is implemented and ought to
-  work.
+* The network loop runs in a background thread, which also reconnects
+  to the broker once the connection is lost.
+* Messages dropped for a full in-flight window are counted in the
+  handlers.MQTTHandler.dropped self-metric, the window itself in the
+  handlers.MQTTHandler.inflight gauge.
 
 """
 
@@ -63,9 +81,18 @@ __author__ = 'Jan-Piet Mens'
 __email__ = 'jpmens@gmail.com'
 
 from Handler import Handler
+from lrucache import LRUCache
 import mosquitto
 from diamond.collector import get_hostname
+from diamond.stats import registry
 import os
+import threading
+import time
+try:
+    import json
+    json  # workaround for pyflakes issue #13
+except ImportError:
+    import simplejson as json
 HAVE_SSL = True
 try:
     import ssl
@@ -77,6 +104,10 @@ class MQTTHandler(Handler):
     """
     """
 
+    # Modes
+    TOPIC = 'topic'
+    JSON = 'json'
+
     def __init__(self, config=None):
         """
         Create a new instance of the MQTTHandler class
@@ -88,6 +119,11 @@ class MQTTHandler(Handler):
         self.mqttc = None
         self.hostname = get_hostname(self.config)
         self.client_id = "%s_%s" % (self.hostname, os.getpid())
+        self.inflight = 0
+        self.condition = threading.Condition()
+        self.documents = {}
+        self.dropped = 0
+        self.deadline = None
 
         # Initialize Options
         self.host = self.config.get('host', 'localhost')
@@ -104,6 +140,16 @@ class MQTTHandler(Handler):
                 self.timestamp = 0
         except:
             self.timestamp = 1
+        self.mode = self.config.get('mode', self.TOPIC)
+        self.max_inflight = int(self.config.get('max_inflight', 1000))
+        self.inflight_timeout = float(self.config.get('inflight_timeout', 1))
+        self.reconnect_delay = float(self.config.get('reconnect_delay', 5))
+        self.topics = LRUCache(int(self.config.get('topic_cache_size',
+                                                   10000)))
+        self.name = self.__class__.__name__
+
+        if self.mode not in (self.TOPIC, self.JSON):
+            raise ValueError("MQTTHandler: Unknown mode %r" % self.mode)
 
         # Initialize
         self.mqttc = mosquitto.Mosquitto(self.client_id, clean_session=True)
@@ -139,29 +185,180 @@ class MQTTHandler(Handler):
 
         self.mqttc.will_set("clients/diamond/%s" % (self.hostname),
                 payload="Adios!", qos=0, retain=False)
-        self.mqttc.connect(self.host, self.port, 60)
-
         self.mqttc.on_disconnect = self._disconnect
+        self.mqttc.on_connect = self._connect
+        self.mqttc.on_publish = self._published
+        try:
+            self.mqttc.connect(self.host, self.port, 60)
+        except Exception, e:
+            # The network loop keeps trying
+            self.log.error("MQTTHandler: Failed connecting to %s:%d. %s",
+                           self.host, self.port, e)
+
+        # Start the network loop
+        self.running = True
+        self.thread = threading.Thread(target=self._loop,
+                                       name='%s-loop' % self.name)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _loop(self):
+        """
+        Network loop, sends and receives in the background and reconnects
+        once the connection is lost
+        """
+        while self.running:
+            try:
+                rc = self.mqttc.loop(1.0)
+            except Exception, e:
+                self.log.error("MQTTHandler: Network loop error. %s", e)
+                rc = -1
+            if rc != 0 and self.running:
+                time.sleep(self.reconnect_delay)
+                self.log.debug("MQTTHandler: reconnecting to broker...")
+                try:
+                    self.mqttc.reconnect()
+                except Exception, e:
+                    self.log.error("MQTTHandler: Failed reconnecting to "
+                                   "%s:%d. %s", self.host, self.port, e)
+
+    def stop(self):
+        """
+        Stop the network loop and disconnect
+        """
+        self.running = False
+        try:
+            self.mqttc.disconnect()
+        except Exception:
+            pass
+        self.thread.join()
+
+    def _topic(self, path):
+        """
+        MQTT topic for a metric path
+        """
+        topic = self.topics.get(path)
+        if topic is None:
+            if len(self.prefix):
+                topic = "%s/%s" % (self.prefix, path)
+            else:
+                topic = path
+            topic = topic.replace('.', '/')
+            # Topic must not contain wildcards
+            topic = topic.replace('#', '&')
+            self.topics.set(path, topic)
+        return topic
 
     def process(self, metric):
         """
         Process a metric by converting metric name to MQTT topic name;
         the payload is metric and timestamp.
         """
+        if self.mode == self.JSON:
+            self._add(metric)
+            return
 
+        # The rendered line is "path value timestamp\n"
         line = str(metric)
-        topic, value, timestamp = line.split()
-        if len(self.prefix):
-            topic = "%s/%s" % (self.prefix, topic)
-        topic = topic.replace('.', '/')
-        topic = topic.replace('#', '&')     # Topic must not contain wildcards
-
-        if self.timestamp == 0:
-            self.mqttc.publish(topic, "%s" % (value), self.qos)
+        if self.timestamp:
+            payload = line[len(metric.path) + 1:-1]
         else:
-            self.mqttc.publish(topic, "%s %s" % (value, timestamp), self.qos)
+            payload = line[len(metric.path) + 1:line.rindex(' ')]
+        self._publish(self._topic(metric.path), payload)
 
-    def _disconnect(self, mosq, obj, rc):
+    def _add(self, metric):
+        """
+        Add a metric to the JSON document of its collector
+        """
+        try:
+            metric_path = metric.getMetricPath()
+        except (ValueError, IndexError):
+            metric_path = ''
+        if metric_path and metric.path.endswith('.' + metric_path):
+            collector_path = metric.path[:-len(metric_path) - 1]
+        else:
+            # Not laid out as prefix.host.collector.metric, go by the full
+            # path instead
+            collector_path, _, metric_path = metric.path.rpartition('.')
+        document = self.documents.get(collector_path)
+        if document is None:
+            document = self.documents[collector_path] = {'metrics': {}}
+        document['metrics'][metric_path] = metric.value
+        if self.timestamp:
+            document['timestamp'] = max(document.get('timestamp', 0),
+                                        metric.timestamp)
+
+    def flush(self):
+        """
+        Publish the JSON documents of the collectors run since the last
+        flush
+        """
+        documents = self.documents
+        self.documents = {}
+        for collector_path, document in documents.iteritems():
+            self._publish(self._topic(collector_path), json.dumps(document))
+        # Next run, wait for the in-flight window again
+        self.deadline = None
+        registry.gauge('handlers.%s.inflight' % self.name,
+                       self.inflight)
+
+    def _publish(self, topic, payload):
+        """
+        Publish a message, waiting for room in the in-flight window first
+        with qos 1 or 2. The wait is bounded by one deadline per flush, so
+        the handler lock is held for at most inflight_timeout.
+        """
+        if self.qos == 0:
+            self.mqttc.publish(topic, payload, self.qos)
+            return
+
+        # Take a slot, the lock is not held while publishing as the
+        # network loop takes it to acknowledge messages
+        self.condition.acquire()
+        try:
+            if self.inflight >= self.max_inflight:
+                if self.deadline is None:
+                    self.deadline = time.time() + self.inflight_timeout
+                while self.inflight >= self.max_inflight:
+                    remaining = self.deadline - time.time()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        registry.incr('handlers.%s.dropped' % self.name)
+                        return
+                    self.condition.wait(remaining)
+            self.inflight += 1
+        finally:
+            self.condition.release()
+
+        rc, mid = self.mqttc.publish(topic, payload, self.qos)
+        if rc != 0:
+            self._release(1)
+
+    def _release(self, count):
+        """
+        Free slots in the in-flight window
+        """
+        self.condition.acquire()
+        try:
+            self.inflight = max(self.inflight - count, 0)
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+    def _published(self, mosq, obj, mid):
+        """
+        The broker acknowledged a message
+        """
+        self._release(1)
 
-        self.log.debug("MQTTHandler: reconnecting to broker...")
-        mosq.reconnect()
+    def _connect(self, mosq, obj, rc):
+        """
+        Messages in flight on an earlier connection are not acknowledged
+        anymore
+        """
+        if rc == 0:
+            self._release(self.max_inflight)
+
+    def _disconnect(self, mosq, obj, rc):
+        if self.running:
+            self.log.debug("MQTTHandler: disconnected from broker (%s)", rc)
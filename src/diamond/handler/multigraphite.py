@@ -4,10 +4,24 @@
 Send metrics to a [graphite](http://graphite.wikidot.com/) using the default
 interface. Unlike GraphiteHandler, this one supports multiple graphite servers.
 Specify them as a list of hosts divided by comma.
+
+By default every metric is sent to every server. With
+`mode = consistent_hash` each metric goes to `replication_factor` servers
+only, picked with the same hash ring carbon-relay uses for
+`RELAY_METHOD = consistent-hashing`. Servers can then be given as
+host:port:instance, matching the relay's DESTINATIONS:
+
+        [[MultiGraphiteHandler]]
+        host = carbon1:2003:a, carbon1:2103:b, carbon2:2003:a
+        mode = consistent_hash
+        replication_factor = 1
+
 """
 
 from Handler import Handler
 from graphite import GraphiteHandler
+from hashring import ConsistentHashRing
+from hashring import parse_destination
 from copy import deepcopy
 
 
@@ -17,6 +31,17 @@ class MultiGraphiteHandler(Handler):
     graphite servers by using two instances of GraphiteHandler
     """
 
+    # Handler used for every server
+    handler_class = GraphiteHandler
+
+    # Routing modes
+    ALL = 'all'
+    CONSISTENT_HASH = 'consistent_hash'
+    MODES = (ALL, CONSISTENT_HASH)
+
+    # Routes kept for metric paths seen before
+    ROUTE_CACHE_SIZE = 100000
+
     def __init__(self, config=None):
         """
         Create a new instance of the MultiGraphiteHandler class
@@ -27,20 +52,79 @@ class MultiGraphiteHandler(Handler):
         self.handlers = []
 
         # Initialize Options
+        self.mode = self.config.get('mode', self.ALL).lower().strip()
+        if self.mode not in self.MODES:
+            raise ValueError("Invalid mode: %s" % self.mode)
+        self.replication_factor = int(
+            self.config.get('replication_factor', 1))
+        self.ring = ConsistentHashRing(
+            replica_count=int(self.config.get('hash_replicas', 100)))
+        self.destinations = {}
+        self.routes = {}
+
         hosts = self.config['host']
-        for host in hosts:
+        if isinstance(hosts, basestring):
+            hosts = [hosts]
+        default_port = self.config.get('port')
+        for destination in hosts:
+            host, port, instance = parse_destination(destination,
+                                                     default_port)
+            # Only the ring needs each (host, instance) to be unique
+            if (self.mode == self.CONSISTENT_HASH
+                    and (host, instance) in self.destinations):
+                raise ValueError("Duplicate destination: %s" % destination)
             config = deepcopy(self.config)
             config['host'] = host
-            self.handlers.append(GraphiteHandler(config))
+            if port is not None:
+                config['port'] = port
+            handler = self.handler_class(config)
+            self.handlers.append(handler)
+            if self.mode == self.CONSISTENT_HASH:
+                self.destinations[(host, instance)] = handler
+                self.ring.add_node((host, instance))
+
+    def get_handlers(self, metric):
+        """
+        Return the handlers a metric should be sent to
+        """
+        if self.mode == self.ALL:
+            return self.handlers
+        try:
+            return self.routes[metric.path]
+        except KeyError:
+            handlers = [self.destinations[node] for node in
+                        self.ring.get_nodes(metric.path,
+                                            self.replication_factor)]
+            if len(self.routes) >= self.ROUTE_CACHE_SIZE:
+                self.routes.clear()
+            self.routes[metric.path] = handlers
+            return handlers
 
     def process(self, metric):
         """
         Process a metric by passing it to GraphiteHandler
         instances
         """
-        for handler in self.handlers:
+        for handler in self.get_handlers(metric):
             handler.process(metric)
 
+    def process_batch(self, metrics):
+        """
+        Process a list of metrics, handing each server its share in one
+        batch
+        """
+        if self.mode == self.ALL:
+            for handler in self.handlers:
+                handler.process_batch(metrics)
+            return
+
+        batches = {}
+        for metric in metrics:
+            for handler in self.get_handlers(metric):
+                batches.setdefault(handler, []).append(metric)
+        for handler, batch in batches.items():
+            handler.process_batch(batch)
+
     def flush(self):
         """Flush metrics in queue"""
         for handler in self.handlers:
@@ -2,9 +2,13 @@
 
 """
 Insert the collected values into a mysql table
+
+Rows are buffered and inserted `batch` at a time, and at the end of every
+collector run, with one multi-row INSERT and a single commit. While MySQL
+can't be reached up to `max_backlog` rows are kept for the next attempt.
 """
 
-from handler import Handler
+from Handler import Handler
 import MySQLdb
 
 
@@ -21,6 +25,9 @@ class MySQLHandler(Handler):
         # Initialize Handler
         Handler.__init__(self, config)
 
+        # Initialize Data
+        self.rows = []
+
         # Initialize Options
         self.hostname = self.config['hostname']
         self.port = int(self.config['port'])
@@ -31,6 +38,11 @@ class MySQLHandler(Handler):
         self.col_time = self.config['col_time']
         self.col_metric = self.config['col_metric']
         self.col_value = self.config['col_value']
+        self.batch_size = int(self.config.get('batch', 100))
+        self.max_backlog = int(self.config.get('max_backlog', 10000))
+        self.query = ("INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)"
+                      % (self.table, self.col_metric, self.col_time,
+                         self.col_value))
 
         # Connect
         self._connect()
@@ -39,53 +51,99 @@ class MySQLHandler(Handler):
         """
         Destroy instance of the MySQLHandler class
         """
+        if self.rows:
+            self._send()
         self._close()
 
     def process(self, metric):
         """
-        Process a metric
+        Process a metric by queueing its row
         """
-        # Just send the data
-        self._send(str(metric))
+        data = str(metric).split()
+        self.rows.append((data[0], data[2], data[1]))
+        if len(self.rows) >= self.batch_size:
+            self._send()
 
-    def _send(self, data):
+    def process_batch(self, metrics):
         """
-        Insert the data
+        Process a list of metrics, queueing their rows
         """
-        data = data.strip().split(' ')
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO %s (%s, %s, %s) VALUES(%%s, %%s, %%s)"
-                           % (self.table, self.col_metric,
-                              self.col_time, self.col_value),
-                           (data[0], data[2], data[1]))
-            cursor.close()
-            self.conn.commit()
-            # Insert data
-            pass
-            #self.socket.sendall(data)
-            # Done
-        except BaseException, e:
-            # Log Error
-            self.log.error("MySQLHandler: Failed sending data. %s.", e)
-            # Attempt to restablish connection
+        for metric in metrics:
+            data = str(metric).split()
+            self.rows.append((data[0], data[2], data[1]))
+        if len(self.rows) >= self.batch_size:
+            self._send()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        self._send()
+
+    def _send(self):
+        """
+        Insert the queued rows in one transaction. Rows are kept for the
+        next attempt if MySQL can't be reached.
+        """
+        if not self.rows:
+            return
+        if self.conn is None:
             self._connect()
+        if self.conn is not None:
+            try:
+                cursor = self.conn.cursor()
+                try:
+                    # MySQLdb turns this into a multi-row INSERT
+                    cursor.executemany(self.query, self.rows)
+                finally:
+                    cursor.close()
+                self.conn.commit()
+                self.rows = []
+            except (MySQLdb.OperationalError, MySQLdb.InterfaceError), e:
+                # Log Error
+                self.log.error("MySQLHandler: Failed sending data. %s.", e)
+                # Reconnect on the next attempt
+                self._close()
+            except MySQLdb.Error, e:
+                # Retrying will not help, drop the rows
+                self.log.error("MySQLHandler: Failed inserting %d rows, "
+                               "dropping them. %s.", len(self.rows), e)
+                self._rollback()
+                self.rows = []
+
+        if len(self.rows) > self.max_backlog:
+            self.log.warn("MySQLHandler: Trimming backlog. Removing oldest %d "
+                          "and keeping newest %d rows",
+                          len(self.rows) - self.max_backlog, self.max_backlog)
+            self.rows = self.rows[-self.max_backlog:]
 
     def _connect(self):
         """
         Connect to the MySQL server
         """
         self._close()
-        self.conn = MySQLdb.Connect(host=self.hostname,
-                                    port=self.port,
-                                    user=self.username,
-                                    passwd=self.password,
-                                    db=self.database)
+        try:
+            self.conn = MySQLdb.Connect(host=self.hostname,
+                                        port=self.port,
+                                        user=self.username,
+                                        passwd=self.password,
+                                        db=self.database)
+        except MySQLdb.Error, e:
+            self.log.error("MySQLHandler: Failed to connect to %s:%i. %s.",
+                           self.hostname, self.port, e)
+            self.conn = None
+
+    def _rollback(self):
+        try:
+            self.conn.rollback()
+        except MySQLdb.Error:
+            self._close()
 
     def _close(self):
         """
         Close the connection
         """
         if self.conn:
-            self.conn.commit()
-            self.conn.close()
+            try:
+                self.conn.close()
+            except MySQLdb.Error:
+                pass
+        self.conn = None
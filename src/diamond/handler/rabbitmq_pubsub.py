@@ -2,10 +2,56 @@
 
 """
 Output the collected values to RabitMQ pub/sub channel
+
+The connection is kept open and only re-established after a failure.
+Up to `batch` metrics are sent per message, as newline separated lines, or
+with `format = msgpack` as a msgpack list of [path, value, timestamp].
+A batch is also sent at the end of every collector run.
+
+With `confirm = True` the channel is put in publisher confirm mode, every
+publish then waits for the broker to ack or nack the message. Acked and
+nacked messages are counted as self-metrics along with the published
+messages and metrics.
+
+#### Dependencies
+
+ * [pika](http://pika.readthedocs.org/)
+ * [msgpack](https://pypi.python.org/pypi/msgpack-python) for
+   `format = msgpack`
+
 """
 
 from Handler import Handler
+from diamond.collector import str_to_bool
+from diamond.stats import registry
 import pika
+try:
+    from pika.exceptions import NackError
+except ImportError:
+    # Before pika 1.0 basic_publish returns False for a nacked message
+    class NackError(Exception):
+        pass
+try:
+    import msgpack
+    msgpack  # workaround for pyflakes issue #13
+except ImportError:
+    msgpack = None
+
+
+def exchange_type_keyword(version):
+    """
+      exchange_declare's type argument was renamed to exchange_type in
+      pika 0.10
+    """
+    try:
+        if tuple(int(v) for v in version.split('.')[:2]) < (0, 10):
+            return 'type'
+    except ValueError:
+        pass
+    return 'exchange_type'
+
+
+EXCHANGE_TYPE = exchange_type_keyword(getattr(pika, '__version__', ''))
 
 
 class rmqHandler (Handler):
@@ -25,10 +71,21 @@ class rmqHandler (Handler):
         # Initialize Data
         self.connection = None
         self.channel = None
+        self.metrics = []
 
         # Initialize Options
         self.server = self.config['server']
         self.rmq_exchange = self.config['rmq_exchange']
+        self.batch_size = int(self.config.get('batch', 1))
+        self.format = self.config.get('format', 'text')
+        self.confirm = str_to_bool(self.config.get('confirm', False))
+        self.name = self.__class__.__name__
+
+        if self.format not in ('text', 'msgpack'):
+            raise ValueError("rmqHandler: Unknown format %r" % self.format)
+        if self.format == 'msgpack' and msgpack is None:
+            raise ValueError("rmqHandler: format = msgpack needs the msgpack "
+                             "module")
 
         # Create rabbitMQ pub socket and bind
         self._bind()
@@ -37,27 +94,110 @@ class rmqHandler (Handler):
         """
            Create PUB socket and bind
         """
-        self.connection = pika.BlockingConnection(pika.ConnectionParameters(
-            host=self.server))
-        self.channel = self.connection.channel()
-        self.channel.exchange_declare(exchange=self.rmq_exchange, type='fanout')
+        self._close()
+        try:
+            self.connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=self.server))
+            self.channel = self.connection.channel()
+            kwargs = {EXCHANGE_TYPE: 'fanout'}
+            self.channel.exchange_declare(exchange=self.rmq_exchange,
+                                          **kwargs)
+            if self.confirm:
+                self.channel.confirm_delivery()
+        except Exception, e:
+            self.log.error("rmqHandler: Failed connecting to %s. %s.",
+                           self.server, e)
+            self._close()
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+        self.connection = None
+        self.channel = None
 
     def __del__(self):
         """
           Destroy instance of the rmqHandler class
         """
-        self.connection.close()
+        self._close()
 
     def process(self, metric):
         """
-          Process a metric and send it to zmq pub socket
+          Process a metric and send it to the RabbitMQ exchange
+        """
+        self.metrics.append(metric)
+        if len(self.metrics) >= self.batch_size:
+            self._send()
+
+    def process_batch(self, metrics):
+        """
+          Process a list of metrics, sending them batch at a time
+        """
+        self.metrics.extend(metrics)
+        if len(self.metrics) >= self.batch_size:
+            self._send()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        self._send()
+
+    def _encode(self, metrics):
+        if self.format == 'msgpack':
+            return msgpack.packb([[metric.path, metric.value,
+                                   metric.timestamp] for metric in metrics])
+        return ''.join([str(metric) for metric in metrics])
+
+    def _send(self):
+        """
+          Publish the queued metrics, batch_size per message. Reconnects
+          only if publishing fails, the metrics are then dropped.
         """
-        # Send the data as ......
+        metrics = self.metrics
+        self.metrics = []
+        if not metrics:
+            return
+        if self.channel is None:
+            self._bind()
+        if self.channel is None:
+            self.log.debug("rmqHandler: Not connected, dropping %d metrics.",
+                           len(metrics))
+            return
 
+        messages = 0
+        nacked = 0
         try:
-            self.channel.basic_publish(exchange=self.rmq_exchange,
-                                       routing_key='', body="%s" % metric)
+            for i in xrange(0, len(metrics), self.batch_size):
+                body = self._encode(metrics[i:i + self.batch_size])
+                delivered = self._publish(body)
+                messages += 1
+                if not delivered:
+                    nacked += 1
+        except Exception, e:  # Rough connection re-try logic.
+            self.log.info("Failed publishing to rabbitMQ. %s. Attempting "
+                          "reconnect", e)
+            self._bind()
+        registry.incr('handlers.%s.messages' % self.name, messages)
+        registry.incr('handlers.%s.published' % self.name,
+                      min(len(metrics), messages * self.batch_size))
+        if self.confirm:
+            registry.incr('handlers.%s.acked' % self.name, messages - nacked)
+            if nacked:
+                self.log.warn("rmqHandler: Broker nacked %d messages.",
+                              nacked)
+                registry.incr('handlers.%s.nacked' % self.name, nacked)
 
-        except Exception:  # Rough connection re-try logic.
-            self.log.info("Failed publishing to rabbitMQ. Attempting reconnect")
-        self._bind()
+    def _publish(self, body):
+        """
+          Publish a message, in confirm mode waiting for the broker to ack
+          it. Returns False if the broker nacked it.
+        """
+        try:
+            delivered = self.channel.basic_publish(
+                exchange=self.rmq_exchange, routing_key='', body=body)
+        except NackError:
+            return False
+        # pika before 0.10 returns None without confirms
+        return delivered is not False
@@ -15,10 +15,24 @@ It has these options:
  * `host` - The Riemann host to connect to.
  * `port` - The port it's on.
  * `transport` - Either `tcp` or `udp`. (default: `tcp`)
+ * `batch` - Events sent together in one message. (default: `100`)
+ * `flush_interval` - Seconds to keep adding events to a message across
+   collector runs. (default: `0`, send at the end of every run)
+ * `ttl_multiplier` - Event TTL as a multiple of the collector interval.
+   (default: `2`)
+ * `ttl` - Event TTL for metrics of unknown interval. (default: none)
+ * `tags` - Comma separated tags added to every event.
+ * `attributes` - Comma separated `key=value` attributes added to every
+   event.
+ * `tag_collector` - Tag events with the name of their collector.
+   (default: `False`)
+
+Keep `batch` low enough over `udp` that a message fits in a datagram.
 
 """
 
 from Handler import Handler
+import time
 try:
     import bernhard
     bernhard  # Pyflakes
@@ -27,14 +41,34 @@ except ImportError:
 
 
 class RiemannHandler(Handler):
+
+    # Service names kept per metric path
+    SERVICE_CACHE_SIZE = 100000
+
     def __init__(self, config=None):
         # Initialize Handler
         Handler.__init__(self, config)
 
-        # Initialize options
+        # Initialize options
         self.host = self.config['host']
         self.port = int(self.config['port'])
         self.transport = self.config.get('transport', 'tcp')
+        self.batch_size = int(self.config.get('batch', 100))
+        self.flush_interval = float(self.config.get('flush_interval', 0))
+        self.ttl_multiplier = float(self.config.get('ttl_multiplier', 2))
+        self.ttl = self.config.get('ttl')
+        if self.ttl is not None:
+            self.ttl = float(self.ttl)
+        self.tags = self._get_list('tags')
+        self.attributes = dict([item.split('=', 1)
+                                for item in self._get_list('attributes')])
+        self.tag_collector = str(
+            self.config.get('tag_collector', False)).lower() == 'true'
+
+        # Initialize data
+        self.events = []
+        self.batch_started = time.time()
+        self.services = {}
 
         # Initialize client
         if self.transport == 'tcp':
@@ -43,35 +77,103 @@ class RiemannHandler(Handler):
             transportCls = bernhard.UDPTransport
         self.client = bernhard.Client(self.host, self.port, transportCls)
 
+    def _get_list(self, key):
+        value = self.config.get(key, [])
+        if isinstance(value, basestring):
+            value = value.split(',')
+        return [item.strip() for item in value if item.strip()]
+
     def process(self, metric):
         """
-        Send a metric to Riemann.
+        Queue a metric for Riemann.
         """
-        event = self._metric_to_riemann_event(metric)
-        try:
-            self.client.send(event)
-        except Exception, e:
-            self.log.error("RiemannHandler: Error sending event to Riemann: %s",
-                           e)
+        if not self.events:
+            self.batch_started = time.time()
+        self.events.append(self._metric_to_riemann_event(metric))
+        if len(self.events) >= self.batch_size:
+            self._send()
+
+    def process_batch(self, metrics):
+        """
+        Queue a list of metrics for Riemann.
+        """
+        if not self.events:
+            self.batch_started = time.time()
+        self.events.extend([self._metric_to_riemann_event(metric)
+                            for metric in metrics])
+        if len(self.events) >= self.batch_size:
+            self._send()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        if time.time() - self.batch_started >= self.flush_interval:
+            self._send()
+
+    def _send(self):
+        """
+        Send the queued events, batch_size events per message.
+        """
+        events = self.events
+        self.events = []
+        for i in xrange(0, len(events), self.batch_size):
+            batch = []
+            for event in events[i:i + self.batch_size]:
+                # Skip a bad event rather than lose the whole batch
+                try:
+                    batch.append(bernhard.Event(params=event))
+                except Exception, e:
+                    self.log.error("RiemannHandler: Skipping bad event %r: "
+                                   "%s", event, e)
+            if not batch:
+                continue
+            try:
+                self.client.transmit(bernhard.Message(events=batch))
+            except Exception, e:
+                self.log.error("RiemannHandler: Error sending events to "
+                               "Riemann: %s", e)
+
+    def _get_service(self, metric):
+        """
+        Service name of a metric: its path without the host.
+        """
+        service = self.services.get(metric.path)
+        if service is None:
+            # Riemann has a separate "host" field, so remove from the path.
+            service = '%s.%s.%s' % (
+                metric.getPathPrefix(),
+                metric.getCollectorPath(),
+                metric.getMetricPath()
+            )
+            if len(self.services) >= self.SERVICE_CACHE_SIZE:
+                self.services.clear()
+            self.services[metric.path] = service
+        return service
 
     def _metric_to_riemann_event(self, metric):
         """
         Convert a metric to a dictionary representing a Riemann event.
         """
-        # Riemann has a separate "host" field, so remove from the path.
-        path = '%s.%s.%s' % (
-            metric.getPathPrefix(),
-            metric.getCollectorPath(),
-            metric.getMetricPath()
-        )
-
-        return {
+        event = {
             'host': metric.host,
-            'service': path,
+            'service': self._get_service(metric),
             'time': metric.timestamp,
             'metric': float(metric.value),
         }
 
+        if metric.interval:
+            event['ttl'] = metric.interval * self.ttl_multiplier
+        elif self.ttl is not None:
+            event['ttl'] = self.ttl
+
+        if self.tag_collector:
+            event['tags'] = self.tags + [metric.getCollectorPath()]
+        elif self.tags:
+            event['tags'] = self.tags
+        if self.attributes:
+            event['attributes'] = self.attributes
+
+        return event
+
     def _close(self):
         """
         Disconnect from Riemann.
@@ -26,6 +26,13 @@ max = 8.5
 name = Free Memory
 path = memory.MemFree
 min = 66020000
+
+Rules whose path is plain text, like the ones above, are looked up by the
+metric path suffix in a dict; the dots in them match a literal dot. Only
+paths using other regular expression syntax are matched as expressions, and
+these are first checked together with combined expressions of up to 99
+groups. The rules matching a metric path are cached, for up to `cache_size`
+(10000) paths.
 """
 
 __author__ = 'Bruno Clermont'
@@ -36,9 +43,13 @@ import re
 
 import raven.handlers.logging
 from Handler import Handler
+from lrucache import LRUCache
 from diamond.collector import get_hostname
 from configobj import Section
 
+# a rule path without regular expression syntax, besides escaped dots
+LITERAL_RE = re.compile(r'^[^\\^$*+?{}\[\]|()]+$')
+
 
 class InvalidRule(ValueError):
     """
@@ -164,8 +175,27 @@ class Rule(object):
                     self.min, self.max))
 
         # compile path regular expression
+        self.path = path
         self.regexp = re.compile(r'(?P<prefix>.*)\.(?P<path>%s)$' % path)
 
+        # plain text paths can be matched without the regular expression
+        literal = path.replace('\\.', '.')
+        if LITERAL_RE.match(literal):
+            self.literal = literal
+        else:
+            self.literal = None
+
+    def match(self, path):
+        """
+        match a metric path against the rule
+        @type path: string
+        @param path: metric path
+        @rtype tuple of (prefix, path) or None
+        """
+        match = self.regexp.match(path)
+        if match:
+            return match.group('prefix'), match.group('path')
+
     def process(self, metric, handler):
         """
         process a single diamond metric
@@ -175,45 +205,154 @@ class Rule(object):
         @param handler: configured Sentry graphite handler
         @rtype None
         """
-        match = self.regexp.match(metric.path)
+        match = self.match(metric.path)
         if match:
-            minimum = Minimum(metric.value, self.min)
-            maximum = Maximum(metric.value, self.max)
-
-            if minimum.is_error or maximum.is_error:
-                self.counter_errors += 1
-                message = "%s Warning on %s: %.1f" % (self.name,
-                                                      handler.hostname,
-                                                      metric.value)
-                culprit = "%s %s" % (handler.hostname, match.group('path'))
-                handler.raven_logger.error(message, extra={
-                    'culprit': culprit,
-                    'data': {
-                        'metric prefix': match.group('prefix'),
-                        'metric path': match.group('path'),
-                        'minimum check': minimum.verbose_message,
-                        'maximum check': maximum.verbose_message,
-                        'metric original path': metric.path,
-                        'metric value': metric.value,
-                        'metric precision': metric.precision,
-                        'metric timestamp': metric.timestamp,
-                        'minimum threshold': self.min,
-                        'maximum threshold': self.max,
-                        'path regular expression': self.regexp.pattern,
-                        'total errors': self.counter_errors,
-                        'total pass': self.counter_pass,
-                        'hostname': handler.hostname
-                    }
+            self.check(metric, handler, match[0], match[1])
+
+    def check(self, metric, handler, prefix, path):
+        """
+        check the value of a metric that matched the rule
+        @type metric: diamond.metric.Metric
+        @param metric: metric to check
+        @type handler: diamond.handler.sentry.SentryHandler
+        @param handler: configured Sentry graphite handler
+        @type prefix: string
+        @param prefix: part of the metric path before the rule path
+        @type path: string
+        @param path: part of the metric path matched by the rule path
+        @rtype None
+        """
+        minimum = Minimum(metric.value, self.min)
+        maximum = Maximum(metric.value, self.max)
+
+        if minimum.is_error or maximum.is_error:
+            self.counter_errors += 1
+            message = "%s Warning on %s: %.1f" % (self.name,
+                                                  handler.hostname,
+                                                  metric.value)
+            culprit = "%s %s" % (handler.hostname, path)
+            handler.raven_logger.error(message, extra={
+                'culprit': culprit,
+                'data': {
+                    'metric prefix': prefix,
+                    'metric path': path,
+                    'minimum check': minimum.verbose_message,
+                    'maximum check': maximum.verbose_message,
+                    'metric original path': metric.path,
+                    'metric value': metric.value,
+                    'metric precision': metric.precision,
+                    'metric timestamp': metric.timestamp,
+                    'minimum threshold': self.min,
+                    'maximum threshold': self.max,
+                    'path regular expression': self.regexp.pattern,
+                    'total errors': self.counter_errors,
+                    'total pass': self.counter_pass,
+                    'hostname': handler.hostname
                 }
-                )
-            else:
-                self.counter_pass += 1
+            }
+            )
+        else:
+            self.counter_pass += 1
 
     def __repr__(self):
         return '%s: min:%s max:%s %s' % (self.name, self.min, self.max,
                                          self.regexp.pattern)
 
 
+class RuleIndex(object):
+    """
+    Find the rules matching a metric path without trying every rule
+    """
+
+    # groups the re module supports in one expression, besides the match
+    MAX_GROUPS = 99
+
+    def __init__(self, rules, cache_size=10000):
+        """
+        @type rules: list of Rule
+        @param rules: rules, in the order they are applied
+        @type cache_size: int
+        @param cache_size: number of metric paths to cache the rules of
+        """
+        # plain text rule paths by path, regular expressions in a list
+        self.literals = {}
+        self.wildcards = []
+        for order, rule in enumerate(rules):
+            if rule.literal is not None:
+                self.literals.setdefault(rule.literal, []).append(
+                    (order, rule))
+            else:
+                self.wildcards.append((order, rule))
+
+        # wildcard rules in chunks, each with one expression that tells if
+        # any rule of the chunk can match. An expression is limited to
+        # MAX_GROUPS groups, so the rules' own groups decide the chunks.
+        self.chunks = []
+        chunk = []
+        groups = 0
+        for order, rule in self.wildcards:
+            count = rule.regexp.groups - 2
+            if chunk and groups + count > self.MAX_GROUPS:
+                self.chunks.append(self._combine(chunk))
+                chunk = []
+                groups = 0
+            chunk.append((order, rule))
+            groups += count
+        if chunk:
+            self.chunks.append(self._combine(chunk))
+
+        self.cache = LRUCache(cache_size)
+
+    def _combine(self, chunk):
+        """
+        @type chunk: list of (order, Rule)
+        @rtype tuple of (combined regular expression or None, chunk)
+        """
+        if len(chunk) < 2:
+            return None, chunk
+        try:
+            return re.compile(r'.*\.(?:%s)$' % '|'.join(
+                ['(?:%s)' % rule.path for order, rule in chunk])), chunk
+        except (re.error, AssertionError, OverflowError):
+            # e.g. the same group name in two rules or too many groups,
+            # match one by one
+            return None, chunk
+
+    def get_matches(self, path):
+        """
+        @type path: string
+        @param path: metric path
+        @rtype tuple of (rule, prefix, path) for the matching rules
+        """
+        matches = self.cache.get(path)
+        if matches is None:
+            matches = self._match(path)
+            self.cache.set(path, matches)
+        return matches
+
+    def _match(self, path):
+        found = []
+        if self.literals:
+            # try every suffix that follows a dot
+            offset = path.find('.')
+            while offset != -1:
+                suffix = path[offset + 1:]
+                for order, rule in self.literals.get(suffix, ()):
+                    found.append((order, rule, path[:offset], suffix))
+                offset = path.find('.', offset + 1)
+
+        for regexp, chunk in self.chunks:
+            if regexp is None or regexp.match(path):
+                for order, rule in chunk:
+                    match = rule.match(path)
+                    if match:
+                        found.append((order, rule, match[0], match[1]))
+
+        found.sort(key=lambda item: item[0])
+        return tuple([(rule, prefix, suffix)
+                      for order, rule, prefix, suffix in found])
+
+
 class SentryHandler(Handler):
     """
     Diamond handler that check if a metric goes too low or too high
@@ -234,6 +373,8 @@ class SentryHandler(Handler):
         self.raven_logger.addHandler(self.sentry_log_handler)
         self.configure_sentry_errors()
         self.rules = self.compile_rules()
+        self.index = RuleIndex(self.rules,
+                               int(self.config.get('cache_size', 10000)))
         self.hostname = get_hostname(self.config)
         if not len(self.rules):
             self.log.warning("No rules, this graphite handler is unused")
@@ -317,8 +458,8 @@ class SentryHandler(Handler):
         @param metric: metric to process
         @rtype None
         """
-        for rule in self.rules:
-            rule.process(metric, self)
+        for rule, prefix, path in self.index.get_matches(metric.path):
+            rule.check(metric, self, prefix, path)
 
     def __repr__(self):
         return "SentryHandler '%s' %d rules" % (
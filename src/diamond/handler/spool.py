@@ -0,0 +1,225 @@
+# coding=utf-8
+
+"""
+Append-only on-disk spool for handlers that have to hold on to data while
+their backend is unreachable.
+
+Entries are opaque strings, stored length prefixed in numbered segment
+files. Writes are fsynced at most once per fsync_interval seconds. When the
+spool grows past max_bytes the oldest segment is dropped. Reading is two
+phased: read() returns entries and a position, and only commit(position)
+consumes them, so entries that could not be delivered are read again.
+The read position is kept in an offset file, so a restarted Diamond
+continues where it stopped.
+"""
+
+import os
+import time
+import struct
+import logging
+
+
+class Spool(object):
+
+    SUFFIX = '.spool'
+    OFFSET_FILE = 'offset'
+
+    # Length prefix of every entry
+    HEADER = struct.Struct('!L')
+
+    def __init__(self, path, max_bytes=1073741824, segment_bytes=16777216,
+                 fsync_interval=1.0):
+        """
+        Create a new instance of the Spool class, picking up the segments
+        already in path
+        """
+        # Initialize Log
+        self.log = logging.getLogger('diamond')
+
+        # Initialize Options
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = max(1, min(segment_bytes, max_bytes / 4))
+        self.fsync_interval = fsync_interval
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        # Initialize Data
+        self.segments = sorted([int(name[:-len(self.SUFFIX)])
+                                for name in os.listdir(self.path)
+                                if name.endswith(self.SUFFIX)])
+        self.size = sum([os.path.getsize(self._segment_path(seq))
+                         for seq in self.segments])
+        self.read_offset = self._load_offset()
+        self.writer = None
+        self.writer_size = 0
+        self.last_sync = time.time()
+        self.dirty = False
+        self.dropped = 0
+
+    def _segment_path(self, seq):
+        return os.path.join(self.path, '%020d%s' % (seq, self.SUFFIX))
+
+    def _load_offset(self):
+        """
+        Read offset into the oldest segment, as saved by commit
+        """
+        if not self.segments:
+            return 0
+        try:
+            f = open(os.path.join(self.path, self.OFFSET_FILE))
+            try:
+                seq, offset = [int(x) for x in f.read().split()]
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return 0
+        if seq != self.segments[0]:
+            return 0
+        return offset
+
+    def _save_offset(self):
+        name = os.path.join(self.path, self.OFFSET_FILE)
+        f = open(name + '.tmp', 'w')
+        try:
+            if self.segments:
+                f.write('%d %d' % (self.segments[0], self.read_offset))
+        finally:
+            f.close()
+        os.rename(name + '.tmp', name)
+
+    def pending(self):
+        """
+        Number of bytes not consumed yet
+        """
+        return self.size - self.read_offset
+
+    def append(self, entries):
+        """
+        Append a list of strings to the spool
+        """
+        for entry in entries:
+            if self.writer is None or self.writer_size >= self.segment_bytes:
+                self._rotate()
+            data = self.HEADER.pack(len(entry)) + entry
+            self.writer.write(data)
+            self.writer_size += len(data)
+            self.size += len(data)
+        self.dirty = True
+
+        self._enforce_cap()
+
+        if time.time() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def _rotate(self):
+        """
+        Start appending to a new segment
+        """
+        self._close_writer()
+        if self.segments:
+            seq = self.segments[-1] + 1
+        else:
+            seq = 0
+        self.segments.append(seq)
+        self.writer = open(self._segment_path(seq), 'ab')
+        self.writer_size = 0
+
+    def _close_writer(self):
+        if self.writer is not None:
+            self.sync()
+            self.writer.close()
+            self.writer = None
+
+    def _enforce_cap(self):
+        """
+        Drop the oldest segments while the spool is larger than max_bytes
+        """
+        while self.size > self.max_bytes and len(self.segments) > 1:
+            seq = self.segments.pop(0)
+            name = self._segment_path(seq)
+            dropped = os.path.getsize(name)
+            os.unlink(name)
+            self.size -= dropped
+            self.dropped += dropped - self.read_offset
+            self.read_offset = 0
+            self.log.warn("Spool: %s is over %d bytes, dropped its oldest "
+                          "segment (%d bytes).", self.path, self.max_bytes,
+                          dropped)
+            self._save_offset()
+
+    def sync(self):
+        """
+        Flush appended entries to disk
+        """
+        if self.writer is not None and self.dirty:
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+        self.dirty = False
+        self.last_sync = time.time()
+
+    def read(self, max_bytes):
+        """
+        Return (entries, position) for about max_bytes worth of the oldest
+        entries. Pass position to commit once they have been delivered.
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+        entries = []
+        total = 0
+        position = None
+        offset = self.read_offset
+        for seq in self.segments:
+            f = open(self._segment_path(seq), 'rb')
+            try:
+                f.seek(offset)
+                while total < max_bytes:
+                    header = f.read(self.HEADER.size)
+                    if len(header) < self.HEADER.size:
+                        break
+                    length = self.HEADER.unpack(header)[0]
+                    entry = f.read(length)
+                    if len(entry) < length:
+                        # Partial write, cut short by a crash
+                        break
+                    entries.append(entry)
+                    total += self.HEADER.size + length
+                    offset += self.HEADER.size + length
+                    position = (seq, offset)
+            finally:
+                f.close()
+            if total >= max_bytes:
+                break
+            offset = 0
+        return entries, position
+
+    def commit(self, position):
+        """
+        Consume everything up to a position returned by read
+        """
+        if position is None:
+            return
+        seq, offset = position
+        while self.segments and self.segments[0] < seq:
+            self._remove(self.segments[0])
+            self.read_offset = 0
+        self.read_offset = offset
+        if (self.segments and self.segments[0] == seq
+                and offset >= os.path.getsize(self._segment_path(seq))):
+            # Fully consumed
+            if seq == self.segments[-1]:
+                self._close_writer()
+            self._remove(seq)
+            self.read_offset = 0
+        self._save_offset()
+
+    def _remove(self, seq):
+        name = self._segment_path(seq)
+        self.size -= os.path.getsize(name)
+        os.unlink(name)
+        self.segments.remove(seq)
+
+    def close(self):
+        self._close_writer()
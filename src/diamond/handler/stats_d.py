@@ -7,8 +7,8 @@ It's OK.
 
 #### Dependencies
 
- * [python-statsd](http://pypi.python.org/pypi/python-statsd/)
- * [statsd](https://github.com/etsy/statsd) v0.1.1 or newer.
+ * [statsd](https://github.com/etsy/statsd) v0.4.0 or newer, for datagrams
+   holding several metrics.
 
 #### Configuration
 
@@ -17,15 +17,11 @@ Enable this handler
  * handers = diamond.handler.stats_d.StatsdHandler
 
 
-#### Notes
+Metrics are buffered until the collector run ends, `batch` metrics are
+queued or a datagram of `udp_payload_size` bytes (1432 by default) is full,
+and are then sent packed several to a datagram.
 
-If your system has both
-[python-statsd](http://pypi.python.org/pypi/python-statsd/)
-and [statsd](http://pypi.python.org/pypi/statsd/) installed, you might
-experience failues after python updates or pip updates that change the order of
-importing. We recommend that you only have
-[python-statsd](http://pypi.python.org/pypi/python-statsd/)
-installed on your system if you are using this handler.
+#### Notes
 
 The handler file is named an odd stats_d.py because of an import issue with
 having the python library called statsd and this handler's module being called
@@ -35,12 +31,9 @@ of this handler.
 """
 
 from Handler import Handler
+from datagram import DatagramPacker
 import logging
-try:
-    import statsd
-    statsd  # Pyflakes
-except ImportError:
-    pass
+import socket
 
 
 class StatsdHandler(Handler):
@@ -55,8 +48,12 @@ class StatsdHandler(Handler):
         # Initialize Options
         self.host = self.config['host']
         self.port = int(self.config['port'])
-        self.batch_size = int(self.config.get('batch', 1))
-        self.metrics = []
+        self.batch_size = int(self.config.get('batch', 0))
+        self.packer = DatagramPacker(
+            self.__class__.__name__,
+            int(self.config.get('udp_payload_size', 1432)))
+        self.lines = []
+        self.lines_size = 0
         self.old_values = {}
 
         # Connect
@@ -66,48 +63,46 @@ class StatsdHandler(Handler):
         """
         Process a metric by sending it to statsd
         """
-
-        self.metrics.append(metric)
-
-        if len(self.metrics) >= self.batch_size:
+        if metric.metric_type == 'GAUGE':
+            line = '%s:%s|g\n' % (metric.path, metric.value)
+        else:
+            # To send a counter, we need to just send the delta
+            # but without any time delta changes
+            value = metric.raw_value
+            if metric.path in self.old_values:
+                value = value - self.old_values[metric.path]
+            self.old_values[metric.path] = metric.raw_value
+            line = '%s:%s|c\n' % (metric.path, value)
+
+        self.lines.append(line)
+        self.lines_size += len(line)
+
+        if (self.lines_size >= self.packer.max_payload
+                or (self.batch_size and len(self.lines) >= self.batch_size)):
             self._send()
 
     def _send(self):
         """
         Send data to statsd. Fire and forget.  Cross fingers and it'll arrive.
         """
-        for metric in self.metrics:
-
-            # Split the path into a prefix and a name
-            # to work with the statsd module's view of the world.
-            # It will get re-joined by the python-statsd module.
-            (prefix, name) = metric.path.rsplit(".", 1)
-            logging.debug("Sending %s %s|g", name, metric.value)
-
-            if metric.metric_type == 'GAUGE':
-                statsd.Gauge(prefix, self.connection).send(name, metric.value)
-            else:
-                # To send a counter, we need to just send the delta
-                # but without any time delta changes
-                value = metric.raw_value
-                if metric.path in self.old_values:
-                    value = value - self.old_values[metric.path]
-                self.old_values[metric.path] = metric.raw_value
-                statsd.Counter(prefix, self.connection).increment(name, value)
-
-        self.metrics = []
+        lines = self.lines
+        self.lines = []
+        self.lines_size = 0
+        if not lines:
+            return
+        try:
+            self.packer.send(self.socket, lines, (self.host, self.port))
+        except socket.error, e:
+            logging.error("StatsdHandler: Failed sending data. %s.", e)
 
     def flush(self):
         """Flush metrics in queue"""
         self._send()
+        self.packer.cycle()
 
     def _connect(self):
         """
         Connect to the statsd server
         """
         # Create socket
-        self.connection = statsd.Connection(
-            host=self.host,
-            port=self.port,
-            sample_rate=1.0
-        )
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
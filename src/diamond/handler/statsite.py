@@ -53,6 +53,8 @@ store only a fraction of the samples.
 """
 
 from Handler import Handler
+from connection import Connection
+from datagram import DatagramPacker
 import socket
 
 
@@ -60,8 +62,6 @@ class StatsiteHandler(Handler):
     """
     Implements the abstract Handler class, sending data to statsite
     """
-    RETRY = 3
-
     def __init__(self, config=None):
         """
         Create a new instance of the StatsiteHandler class
@@ -71,12 +71,36 @@ class StatsiteHandler(Handler):
 
         # Initialize Data
         self.socket = None
+        self.lines = []
+        self.lines_size = 0
+        self.backlog = []
 
         # Initialize Options
         self.host = self.config['host']
         self.tcpport = int(self.config['tcpport'])
         self.udbport = int(self.config['udbport'])
         self.timeout = int(self.config['timeout'])
+        self.max_backlog = int(self.config.get('max_backlog', 10000))
+        if self.udbport > 0:
+            self.port = self.udbport
+            proto = 'udp'
+        else:
+            self.port = self.tcpport
+            proto = 'tcp'
+
+        # Initialize Datagram Packer
+        self.packer = None
+        if proto == 'udp':
+            self.packer = DatagramPacker(
+                self.__class__.__name__,
+                int(self.config.get('udp_payload_size', 1432)))
+
+        # Initialize Connection
+        self.connection = Connection(
+            self.__class__.__name__, self.host, self.port, proto,
+            self.timeout,
+            float(self.config.get('reconnect_backoff_min', 1)),
+            float(self.config.get('reconnect_backoff_max', 60)))
 
         # Connect
         self._connect()
@@ -85,86 +109,94 @@ class StatsiteHandler(Handler):
         """
         Destroy instance of the StatsiteHandler class
         """
-        self._close()
+        if getattr(self, 'connection', None) is not None:
+            self.connection.close()
 
     def process(self, metric):
         """
         Process a metric by sending it to statsite
         """
-        # Just send the data as a string
-        self._send(str(metric))
-
-    def _send(self, data):
-        """
-        Send data to statsite. Data that can not be sent will be queued.
-        """
-        retry = self.RETRY
-        # Attempt to send any data in the queue
-        while retry > 0:
-            # Check socket
-            if not self.socket:
-                # Log Error
-                self.log.error("StatsiteHandler: Socket unavailable.")
-                # Attempt to restablish connection
-                self._connect()
-                # Decrement retry
-                retry -= 1
-                # Try again
-                continue
-            try:
-                # Send data to socket
-                data = data.split()
-                data = data[0] + ":" + data[1] + "|kv\n"
-                self.socket.sendall(data)
-                # Done
-                break
-            except socket.error, e:
-                # Log Error
-                self.log.error("StatsiteHandler: Failed sending data. %s.", e)
-                # Attempt to restablish connection
-                self._close()
-                # Decrement retry
-                retry -= 1
-                # try again
-                continue
+        data = str(metric).split()
+        line = data[0] + ":" + data[1] + "|kv\n"
+        if self.packer is None:
+            # Just send the data as a string
+            self._send([line])
+            return
 
-    def _connect(self):
+        # Buffer lines until they fill a datagram
+        self.lines.append(line)
+        self.lines_size += len(line)
+        if self.lines_size >= self.packer.max_payload:
+            self._send_lines()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        if self.packer is not None:
+            self._send_lines()
+            self.packer.cycle()
+
+    def _send_lines(self):
+        lines = self.lines
+        self.lines = []
+        self.lines_size = 0
+        if lines or self.backlog:
+            self._send(lines)
+
+    def _send(self, lines):
         """
-        Connect to the statsite server
+        Send lines to statsite. Data is kept while there is no connection.
         """
-        # Create socket
-        if self.udbport > 0:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.port = self.udbport
-        elif self.tcpport > 0:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.port = self.tcpport
-        if socket is None:
-            # Log Error
-            self.log.error("StatsiteHandler: Unable to create socket.")
-            # Close Socket
-            self._close()
+        if self.backlog:
+            self.backlog.extend(lines)
+            lines = self.backlog
+            self.backlog = []
+
+        # Check socket
+        if not self.socket:
+            self._connect()
+        if not self.socket:
+            self.log.debug("StatsiteHandler: Socket unavailable, keeping "
+                           "data.")
+            self._keep(lines)
             return
-        # Set socket timeout
-        self.socket.settimeout(self.timeout)
-        # Connect to statsite server
         try:
-            self.socket.connect((self.host, self.port))
-            # Log
-            self.log.debug("Established connection to statsite server %s:%d",
-                           self.host, self.port)
-        except Exception, ex:
+            # Send data to socket
+            if self.packer is not None:
+                self.packer.send(self.socket, lines)
+            else:
+                self.socket.sendall(''.join(lines))
+        except socket.error, e:
             # Log Error
-            self.log.error("StatsiteHandler: Failed to connect to %s:%i. %s",
-                           self.host, self.port, ex)
-            # Close Socket
+            self.log.error("StatsiteHandler: Failed sending data. %s.", e)
+            # Reconnect in the background
             self._close()
-            return
+            self._keep(lines)
+
+    def _keep(self, lines):
+        """
+        Keep unsent lines for the next send. Once statsite can't be reached,
+        beyond max_backlog lines the oldest are trimmed, down to 80% so it
+        is not done on every line.
+        """
+        self.backlog = lines
+        if self.connection.is_failing() and len(lines) > self.max_backlog:
+            keep = self.max_backlog * 4 / 5
+            self.log.warn("StatsiteHandler: Trimming backlog. Removing oldest "
+                          "%d and keeping newest %d lines",
+                          len(lines) - keep, keep)
+            self.backlog = lines[len(lines) - keep:]
+
+    def _connect(self):
+        """
+        Pick up the socket of the connection. It connects in the
+        background, so this never blocks.
+        """
+        self.socket = self.connection.get_socket()
 
     def _close(self):
         """
-        Close the socket
+        Drop the socket, the connection will reconnect
         """
         if self.socket is not None:
-            self.socket.close()
+            self.connection.reset()
         self.socket = None
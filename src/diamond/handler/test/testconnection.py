@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import socket
+import time
+
+from diamond.handler.connection import Connection
+from diamond.stats import registry
+
+
+class TestConnection(unittest.TestCase):
+
+    def wait_for(self, condition):
+        deadline = time.time() + 5
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_connects_in_background(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        connection = Connection('TestHandler', '127.0.0.1',
+                                server.getsockname()[1])
+        try:
+            # Never waits for the connection
+            self.assertEqual(connection.get_socket(), None)
+            self.wait_for(lambda: connection.state == Connection.CONNECTED)
+            self.assertTrue(connection.get_socket() is not None)
+            self.assertEqual(registry.gauges['handlers.TestHandler.connected'],
+                             1)
+
+            connection.reset()
+            self.assertEqual(connection.state, Connection.DISCONNECTED)
+            self.assertEqual(connection.get_socket(), None)
+        finally:
+            connection.close()
+            server.close()
+
+    @patch('time.sleep')
+    def test_backoff(self, sleep_mock):
+        connection = Connection('TestHandler', '127.0.0.1', 1,
+                                backoff_min=1, backoff_max=4, jitter=0)
+        attempts = []
+
+        def fail():
+            attempts.append(connection.backoff)
+            if len(attempts) == 5:
+                connection.closed = True
+            raise socket.error('Connection refused')
+
+        self.assertFalse(connection.is_failing())
+        with patch.object(connection, '_open', fail):
+            connection._reconnect()
+
+        self.assertEqual(attempts, [0, 1, 2, 4, 4])
+        self.assertEqual(connection.failures, 5)
+        self.assertTrue(connection.is_failing())
+        self.assertEqual([c[0][0] for c in sleep_mock.call_args_list],
+                         [1, 2, 4, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
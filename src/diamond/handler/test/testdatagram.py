@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import call
+
+from diamond.handler.datagram import DatagramPacker
+
+
+class TestDatagramPacker(unittest.TestCase):
+
+    def test_pack_fills_datagrams(self):
+        packer = DatagramPacker('test', max_payload=20)
+        lines = ['a.b 1 10\n', 'c.d 2 10\n', 'e.f 3 10\n']
+        self.assertEqual(packer.pack(lines),
+                         ['a.b 1 10\nc.d 2 10\n', 'e.f 3 10\n'])
+
+    def test_pack_exact_fit(self):
+        packer = DatagramPacker('test', max_payload=18)
+        lines = ['a.b 1 10\n', 'c.d 2 10\n', 'e.f 3 10\n']
+        self.assertEqual(packer.pack(lines),
+                         ['a.b 1 10\nc.d 2 10\n', 'e.f 3 10\n'])
+
+    def test_pack_drops_oversized(self):
+        packer = DatagramPacker('test', max_payload=10)
+        lines = ['a.b 1 10\n', 'a.very.long.metric 1 10\n', 'c.d 2 10\n']
+        self.assertEqual(packer.pack(lines), ['a.b 1 10\n', 'c.d 2 10\n'])
+        self.assertEqual(packer.oversized, 1)
+
+    def test_pack_empty(self):
+        packer = DatagramPacker('test')
+        self.assertEqual(packer.pack([]), [])
+
+    def test_send(self):
+        packer = DatagramPacker('test', max_payload=20)
+        sock = Mock()
+        lines = ['a.b 1 10\n', 'c.d 2 10\n', 'e.f 3 10\n']
+        self.assertEqual(packer.send(sock, lines), 2)
+        self.assertEqual(sock.send.call_args_list,
+                         [call('a.b 1 10\nc.d 2 10\n'), call('e.f 3 10\n')])
+
+        packer.send(sock, lines, ('localhost', 2003))
+        sock.sendto.assert_called_with('e.f 3 10\n', ('localhost', 2003))
+        self.assertEqual(packer.packets, 4)
+
+    def test_cycle(self):
+        packer = DatagramPacker('test', max_payload=20)
+        packer.send(Mock(), ['a.b 1 10\n'])
+        self.assertEqual(packer.cycle_packets, 1)
+        packer.cycle()
+        self.assertEqual(packer.cycle_packets, 0)
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import call
+from mock import patch
+
+import threading
+
+from diamond.handler.dispatcher import Dispatcher
+from diamond.metric import Metric
+
+
+class BlockedHandler(object):
+    """
+    Handler stand-in that blocks until released
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.metrics = []
+
+    def _process(self, metric):
+        self.started.set()
+        self.release.wait()
+        self.metrics.append(metric)
+
+    def _flush(self):
+        self.metrics.append('flush')
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_process_and_flush_in_order(self):
+        handler = Mock()
+        dispatcher = Dispatcher(handler, 10)
+
+        metric = Metric('servers.host.cpu.total.idle', 0, timestamp=123)
+        dispatcher._process(metric)
+        dispatcher._flush()
+        dispatcher.stop()
+
+        self.assertEqual(handler.mock_calls,
+                         [call._process(metric), call._flush()])
+        self.assertEqual(dispatcher.get_stats()['processed'], 1)
+        self.assertEqual(dispatcher.get_stats()['dropped'], 0)
+
+    def _fill(self, policy):
+        handler = BlockedHandler()
+        dispatcher = Dispatcher(handler, 2, policy)
+
+        metrics = [Metric('metricname%d' % i, i, timestamp=123)
+                   for i in range(5)]
+
+        # The worker takes the first metric and hangs on it
+        dispatcher._process(metrics[0])
+        handler.started.wait(5)
+        for m in metrics[1:]:
+            dispatcher._process(m)
+
+        handler.release.set()
+        dispatcher.stop()
+        return dispatcher, handler, metrics
+
+    def test_drop_oldest(self):
+        dispatcher, handler, metrics = self._fill(Dispatcher.DROP_OLDEST)
+        self.assertEqual(handler.metrics,
+                         [metrics[0], metrics[3], metrics[4]])
+        self.assertEqual(dispatcher.dropped, 2)
+
+    def test_drop_newest(self):
+        dispatcher, handler, metrics = self._fill(Dispatcher.DROP_NEWEST)
+        self.assertEqual(handler.metrics,
+                         [metrics[0], metrics[1], metrics[2]])
+        self.assertEqual(dispatcher.dropped, 2)
+
+    def test_flush_never_dropped(self):
+        for policy in (Dispatcher.DROP_OLDEST, Dispatcher.DROP_NEWEST):
+            handler = BlockedHandler()
+            dispatcher = Dispatcher(handler, 2, policy)
+            metrics = [Metric('metricname%d' % i, i, timestamp=123)
+                       for i in range(4)]
+
+            dispatcher._process(metrics[0])
+            handler.started.wait(5)
+            dispatcher._process(metrics[1])
+            dispatcher._flush()
+            dispatcher._flush()
+            dispatcher._process(metrics[2])
+            dispatcher._process(metrics[3])
+
+            handler.release.set()
+            dispatcher.stop()
+            self.assertEqual(handler.metrics.count('flush'), 1)
+            self.assertEqual(handler.metrics[0], metrics[0])
+
+    def test_stop_drains_queue(self):
+        handler = BlockedHandler()
+        dispatcher = Dispatcher(handler, 10)
+        metrics = [Metric('metricname%d' % i, i, timestamp=123)
+                   for i in range(3)]
+        dispatcher._process(metrics[0])
+        handler.started.wait(5)
+        dispatcher._process(metrics[1])
+        dispatcher._process(metrics[2])
+        handler.release.set()
+        dispatcher.stop()
+        self.assertEqual(handler.metrics, metrics)
+        # Stopping again is harmless
+        dispatcher.stop()
+
+    def test_stop_gives_up_on_hung_handler(self):
+        handler = BlockedHandler()
+        dispatcher = Dispatcher(handler, 10, stop_timeout=0.1)
+        dispatcher._process(Metric('metricname0', 0, timestamp=123))
+        handler.started.wait(5)
+        dispatcher._process_batch([Metric('metricname1', 1, timestamp=123),
+                                   Metric('metricname2', 2, timestamp=123)])
+        with patch.object(dispatcher.log, 'error') as error:
+            dispatcher.stop()
+        self.assertTrue(dispatcher.thread.isAlive())
+        self.assertEqual(error.call_args[0][-1], 2)
+        handler.release.set()
+        dispatcher.thread.join(5)
+
+    def test_forked(self):
+        handler = Mock()
+        dispatcher = Dispatcher(handler, 10, Dispatcher.BLOCK)
+        dispatcher.stop()
+
+        # The child has no worker, so it must not queue
+        metric = Metric('servers.host.cpu.total.idle', 0, timestamp=123)
+        patch_pid = patch('os.getpid', Mock(return_value=dispatcher.pid + 1))
+        patch_pid.start()
+        try:
+            for i in range(20):
+                dispatcher._process(metric)
+            dispatcher._flush()
+        finally:
+            patch_pid.stop()
+
+        self.assertEqual(handler._process.call_count, 20)
+        self.assertEqual(handler._flush.call_count, 1)
+        self.assertEqual(dispatcher.queue.qsize(), 0)
+
+    def test_latency_window(self):
+        handler = Mock()
+        dispatcher = Dispatcher(handler, 10)
+        dispatcher.stop()
+        dispatcher._record_latency(0.5)
+        dispatcher._record_latency(0.25)
+        stats = dispatcher.get_stats()
+        self.assertEqual(stats['latency_max'], 0.5)
+        self.assertEqual(stats['latency_avg'], 0.375)
+        self.assertEqual(dispatcher.get_stats()['latency_max'], 0)
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, Dispatcher, Mock(), 10, 'sometimes')
+
+
+if __name__ == "__main__":
+    unittest.main()
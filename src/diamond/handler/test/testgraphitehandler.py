@@ -8,6 +8,8 @@ from mock import patch
 from mock import call
 
 import configobj
+import shutil
+import tempfile
 
 from diamond.handler.graphite import GraphiteHandler
 from diamond.metric import Metric
@@ -110,6 +112,37 @@ class TestGraphiteHandler(unittest.TestCase):
         self.assertEqual(sendmock.call_count, len(expected_data))
         self.assertEqual(sendmock.call_args_list, expected_data)
 
+    def test_process_batch(self):
+        config = configobj.ConfigObj()
+        config['host'] = 'graphite.example.com'
+        config['batch'] = 2
+
+        metrics = [
+            Metric('metricname1', 0, timestamp=123),
+            Metric('metricname2', 0, timestamp=123),
+            Metric('metricname3', 0, timestamp=123),
+        ]
+
+        expected_data = [
+            call("metricname1 0 123\nmetricname2 0 123\n"
+                 + "metricname3 0 123\n"),
+        ]
+
+        handler = GraphiteHandler(config)
+
+        patch_sock = patch.object(handler, 'socket', True)
+        sendmock = Mock()
+        patch_send = patch.object(GraphiteHandler, '_send_data', sendmock)
+
+        patch_sock.start()
+        patch_send.start()
+        handler._process_batch(metrics)
+        patch_send.stop()
+        patch_sock.stop()
+
+        self.assertEqual(sendmock.call_count, len(expected_data))
+        self.assertEqual(sendmock.call_args_list, expected_data)
+
     def test_backlog(self):
         config = configobj.ConfigObj()
         config['host'] = 'graphite.example.com'
@@ -145,11 +178,15 @@ class TestGraphiteHandler(unittest.TestCase):
         patch_connect = patch.object(GraphiteHandler, '_connect', connect_mock)
         send_mock = Mock()
         patch_send = patch.object(GraphiteHandler, '_send_data', send_mock)
+        patch_failing = patch.object(handler.connection, 'is_failing',
+                                     Mock(return_value=True))
 
         patch_connect.start()
         patch_send.start()
+        patch_failing.start()
         for m in metrics:
             handler.process(m)
+        patch_failing.stop()
         patch_send.stop()
         patch_connect.stop()
 
@@ -157,6 +194,86 @@ class TestGraphiteHandler(unittest.TestCase):
         self.assertEqual(send_mock.call_count, 0)
         self.assertEqual(handler.metrics, expected_data)
 
+    def test_backlog_while_connecting(self):
+        config = configobj.ConfigObj()
+        config['host'] = 'graphite.example.com'
+        config['batch'] = 1
+        config['max_backlog_multiplier'] = 4
+        config['trim_backlog_multiplier'] = 3
+
+        handler = GraphiteHandler(config)
+        metrics = [Metric('metricname%d' % i, 0, timestamp=123)
+                   for i in range(8)]
+
+        # the connection is still being set up, nothing is trimmed
+        with patch.object(GraphiteHandler, '_connect'):
+            with patch.object(handler.connection, 'is_failing',
+                              Mock(return_value=False)):
+                for m in metrics:
+                    handler.process(m)
+        self.assertEqual(handler.metrics, [str(m) for m in metrics])
+
+        # and all of it is sent once connected
+        sock = Mock()
+        with patch.object(handler, 'socket', sock):
+            handler.flush()
+        sock.sendall.assert_called_once_with(
+            ''.join([str(m) for m in metrics]))
+        self.assertEqual(handler.metrics, [])
+
+    def test_spool(self):
+        config = configobj.ConfigObj()
+        config['host'] = 'graphite.example.com'
+        config['batch'] = 1
+        config['spool_dir'] = tempfile.mkdtemp()
+
+        handler = GraphiteHandler(config)
+        send_mock = Mock()
+        patch_send = patch.object(GraphiteHandler, '_send_data', send_mock)
+        patch_send.start()
+        try:
+            # graphite is unreachable, metrics go to the spool
+            with patch.object(GraphiteHandler, '_connect'):
+                handler.process(Metric('metricname1', 0, timestamp=123))
+                handler.process(Metric('metricname2', 0, timestamp=123))
+            self.assertEqual(handler.metrics, [])
+            self.assertEqual(send_mock.call_count, 0)
+            self.assertTrue(handler.spool.pending() > 0)
+
+            # and are replayed once it is back
+            handler.spool_last_replay -= 1
+            with patch.object(handler, 'socket', True):
+                handler.process(Metric('metricname3', 0, timestamp=123))
+        finally:
+            patch_send.stop()
+            shutil.rmtree(config['spool_dir'])
+
+        self.assertEqual(send_mock.call_args_list, [
+            call("metricname3 0 123\n"),
+            call("metricname1 0 123\nmetricname2 0 123\n"),
+        ])
+        self.assertEqual(handler.spool.pending(), 0)
+
+    def test_udp_packing(self):
+        config = configobj.ConfigObj()
+        config['host'] = 'graphite.example.com'
+        config['proto'] = 'udp'
+        config['batch'] = 3
+        config['udp_payload_size'] = 40
+
+        handler = GraphiteHandler(config)
+        sock = Mock()
+        with patch.object(handler, 'socket', sock):
+            handler.process(Metric('metricname1', 0, timestamp=123))
+            handler.process(Metric('metricname2', 0, timestamp=123))
+            handler.process(Metric('metricname3', 0, timestamp=123))
+
+        self.assertEqual(sock.send.call_args_list, [
+            call("metricname1 0 123\nmetricname2 0 123\n"),
+            call("metricname3 0 123\n"),
+        ])
+        self.assertEqual(handler.metrics, [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import patch
+
+import configobj
+import cPickle
+import struct
+
+from diamond.handler.graphitepickle import GraphitePickleHandler
+from diamond.metric import Metric
+
+
+def unpack(data):
+    """
+    Split sent data into its unpickled messages
+    """
+    messages = []
+    while data:
+        length = struct.unpack('!L', data[:4])[0]
+        messages.append(cPickle.loads(data[4:4 + length]))
+        data = data[4 + length:]
+    return messages
+
+
+class TestGraphitePickleHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['host'] = 'graphite.example.com'
+        self.config['batch'] = 100
+
+        self.handler = GraphitePickleHandler(self.config)
+        self.sendmock = Mock()
+        self.patches = [patch.object(self.handler, 'socket', True),
+                        patch.object(GraphitePickleHandler, '_send_data',
+                                     self.sendmock)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def sent(self):
+        return unpack(''.join([args[0] for args, kwargs
+                               in self.sendmock.call_args_list]))
+
+    def test_batch(self):
+        for i in xrange(99):
+            self.handler.process(Metric('metric%d' % i, i, timestamp=123))
+        self.assertEqual(self.sendmock.call_count, 0)
+        self.handler.process(Metric('metric99', 99, timestamp=123))
+        self.assertEqual(self.sendmock.call_count, 1)
+        self.assertEqual(self.sent(), [[('metric%d' % i, (123, i))
+                                        for i in xrange(100)]])
+
+    def test_flush_partial_batch(self):
+        self.handler.process(Metric('metric1', 1.5, timestamp=123))
+        self.handler.process(Metric('metric2', 2, timestamp=123))
+        self.assertEqual(self.sendmock.call_count, 0)
+        self.handler._flush()
+        self.assertEqual(self.sendmock.call_count, 1)
+        self.assertEqual(self.sent(), [[('metric1', (123, 1.5)),
+                                        ('metric2', (123, 2))]])
+        # Nothing is sent twice
+        self.handler._flush()
+        self.assertEqual(self.sendmock.call_count, 1)
+
+    def test_protocol(self):
+        self.handler.process(Metric('metric1', 1, timestamp=123))
+        self.handler._flush()
+        data = self.sendmock.call_args[0][0]
+        # Protocol 2 pickles start with the PROTO opcode
+        self.assertEqual(data[4:6], '\x80\x02')
+
+    def test_max_payload(self):
+        self.handler.max_payload = 1024
+        metrics = [Metric('servers.host.collector.metric%04d' % i, i * 0.5,
+                          timestamp=1234567890) for i in xrange(1000)]
+        self.handler.process_batch(metrics)
+        self.assertEqual(self.sendmock.call_count, 1)
+
+        data = self.sendmock.call_args[0][0]
+        messages = self.sent()
+        self.assertTrue(len(messages) > 1)
+        offset = 0
+        while offset < len(data):
+            length = struct.unpack('!L', data[offset:offset + 4])[0]
+            self.assertTrue(length <= 1024)
+            offset += 4 + length
+        self.assertEqual(sum(messages, []),
+                         [(m.path, (m.timestamp, m.value)) for m in metrics])
+
+    def test_oversized_point(self):
+        self.handler.max_payload = 16
+        self.handler.process(Metric('metric1', 1, timestamp=123))
+        self.handler.process(Metric('metric2', 2, timestamp=123))
+        self.handler._flush()
+        self.assertEqual(self.sent(), [[('metric1', (123, 1))],
+                                       [('metric2', (123, 2))]])
+
+################################################################################
+if __name__ == "__main__":
+    unittest.main()
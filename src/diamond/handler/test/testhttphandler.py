@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import configobj
+import gzip
+import httplib
+import socket
+import time
+from StringIO import StringIO
+
+from diamond.handler.httpHandler import HttpPostHandler
+from diamond.metric import Metric
+
+
+class TestHttpPostHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['url'] = 'http://metrics.example.com:8080/endpoint'
+        self.config['batch'] = 2
+        self.config['retry_interval'] = 0
+        self.metrics = [Metric('servers.host.cpu.m%d' % i, i, timestamp=10)
+                        for i in range(3)]
+
+    def get_bodies(self, connection):
+        return [c[0][2] for c in connection.return_value.request.call_args_list]
+
+    @patch('httplib.HTTPConnection')
+    def test_batches(self, connection):
+        connection.return_value.getresponse.return_value.status = 200
+        handler = HttpPostHandler(self.config)
+        for metric in self.metrics:
+            handler.process(metric)
+        handler.flush()
+        handler.stop()
+
+        connection.assert_called_once_with('metrics.example.com:8080',
+                                           timeout=15)
+        request = connection.return_value.request
+        self.assertEqual(request.call_args[0][:2], ('POST', '/endpoint'))
+        self.assertEqual(self.get_bodies(connection), [
+            'servers.host.cpu.m0 0 10\nservers.host.cpu.m1 1 10\n',
+            'servers.host.cpu.m2 2 10\n',
+        ])
+
+    @patch('httplib.HTTPConnection')
+    def test_stop_posts_pending(self, connection):
+        connection.return_value.getresponse.return_value.status = 200
+        handler = HttpPostHandler(self.config)
+        handler.process(self.metrics[0])
+        handler.stop()
+        handler.stop()
+
+        self.assertEqual(self.get_bodies(connection),
+                         ['servers.host.cpu.m0 0 10\n'])
+        headers = connection.return_value.request.call_args[0][3]
+        self.assertEqual(headers['Content-Type'],
+                         'application/x-www-form-urlencoded')
+
+    @patch('httplib.HTTPConnection')
+    def test_poster_survives_errors(self, connection):
+        connection.return_value.getresponse.return_value.status = 200
+        connection.return_value.request.side_effect = [
+            ValueError('unexpected'), None]
+        handler = HttpPostHandler(self.config)
+        handler.process_batch(self.metrics[:2])
+        handler.process_batch(self.metrics[:2])
+        handler.stop()
+
+        self.assertEqual(connection.return_value.request.call_count, 2)
+        self.assertEqual(handler.dropped, 2)
+        self.assertEqual(len(handler.queue), 0)
+
+    @patch('httplib.HTTPConnection')
+    def test_gzip(self, connection):
+        self.config['compression'] = 'gzip'
+        connection.return_value.getresponse.return_value.status = 204
+        handler = HttpPostHandler(self.config)
+        handler.process_batch(self.metrics[:2])
+        handler.stop()
+
+        body, headers = connection.return_value.request.call_args[0][2:]
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(),
+                         'servers.host.cpu.m0 0 10\nservers.host.cpu.m1 1 10\n')
+
+    @patch('httplib.HTTPConnection')
+    def test_flush_interval(self, connection):
+        self.config['flush_interval'] = 60
+        handler = HttpPostHandler(self.config)
+        handler.process(self.metrics[0])
+        handler.flush()
+        self.assertEqual(len(handler.metrics), 1)
+
+        handler.batch_started -= 60
+        handler.flush()
+        self.assertEqual(handler.metrics, [])
+        handler.stop()
+
+    @patch('httplib.HTTPConnection')
+    def test_retry(self, connection):
+        response = connection.return_value.getresponse.return_value
+        response.status = 200
+        connection.return_value.request.side_effect = [
+            socket.error('refused'), None]
+        handler = HttpPostHandler(self.config)
+        handler.process_batch(self.metrics[:2])
+        # Stopping gives up on failed batches, wait for the retry first
+        deadline = time.time() + 5
+        while (connection.return_value.request.call_count < 2
+               and time.time() < deadline):
+            time.sleep(0.01)
+        handler.stop()
+
+        self.assertEqual(len(self.get_bodies(connection)), 2)
+        self.assertEqual(self.get_bodies(connection)[0],
+                         self.get_bodies(connection)[1])
+        self.assertEqual(len(handler.queue), 0)
+
+    @patch('httplib.HTTPConnection')
+    def test_stale_keep_alive(self, connection):
+        response = connection.return_value.getresponse.return_value
+        response.status = 200
+        connection.return_value.request.side_effect = [
+            None, httplib.BadStatusLine(''), None, socket.error('refused')]
+        handler = HttpPostHandler(self.config)
+        request = handler._encode('servers.host.cpu.m0 0 10\n')
+        self.assertTrue(handler._post(request))
+        # The server dropped the idle connection, reconnect at once
+        self.assertTrue(handler._post(request))
+        self.assertEqual(connection.call_count, 2)
+        self.assertEqual(connection.return_value.request.call_count, 3)
+        handler.connection = None
+        # A fresh connection failing is left to the retry_interval backoff
+        self.assertFalse(handler._post(request))
+        self.assertEqual(connection.return_value.request.call_count, 4)
+        handler.stop()
+
+    @patch('httplib.HTTPConnection')
+    def test_queue_bound(self, connection):
+        self.config['max_queue'] = 1
+        handler = HttpPostHandler(self.config)
+        # Keep the poster thread from taking batches off the queue
+        handler.condition.acquire()
+        try:
+            handler.process_batch(self.metrics[:2])
+            handler.process_batch(self.metrics[:2])
+            self.assertEqual(handler.dropped, 2)
+            self.assertEqual(len(handler.queue), 1)
+        finally:
+            handler.condition.release()
+        handler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from test import run_only
+from mock import patch
+
+import configobj
+import time
+try:
+    import json
+    json  # workaround for pyflakes issue #13
+except ImportError:
+    import simplejson as json
+
+from diamond.metric import Metric
+try:
+    import mosquitto
+    from diamond.handler.mqtt import MQTTHandler
+except ImportError:
+    mosquitto = None
+
+
+def run_only_if_mosquitto_is_available(func):
+    pred = lambda: mosquitto is not None
+    return run_only(func, pred)
+
+
+class TestMQTTHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['hostname'] = 'host'
+        self.metrics = [
+            Metric('servers.host.cpu.total.idle', 1.5, timestamp=10,
+                   precision=1, host='host'),
+            Metric('servers.host.cpu.total.user', 2, timestamp=10,
+                   host='host'),
+        ]
+        self.handler = None
+
+    def tearDown(self):
+        if self.handler is not None:
+            self.handler.stop()
+
+    def get_handler(self, client):
+        # The network loop waits for network activity
+        client.return_value.loop.side_effect = lambda timeout: (
+            time.sleep(0.001) or 0)
+        client.return_value.publish.return_value = (0, 1)
+        self.handler = MQTTHandler(self.config)
+        return self.handler
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_topic(self, client):
+        self.config['prefix'] = 'pre'
+        handler = self.get_handler(client)
+        handler.process_batch(self.metrics)
+
+        self.assertEqual(client.return_value.publish.call_args_list,
+                         [(('pre/servers/host/cpu/total/idle', '1.5 10', 0),),
+                          (('pre/servers/host/cpu/total/user', '2 10', 0),)])
+        self.assertEqual(handler.topics.get('servers.host.cpu.total.idle'),
+                         'pre/servers/host/cpu/total/idle')
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_no_timestamp(self, client):
+        self.config['timestamp'] = 'False'
+        handler = self.get_handler(client)
+        handler.process(self.metrics[0])
+
+        self.assertEqual(client.return_value.publish.call_args,
+                         (('servers/host/cpu/total/idle', '1.5', 0),))
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_network_loop(self, client):
+        handler = self.get_handler(client)
+        for i in xrange(1000):
+            if client.return_value.loop.called:
+                break
+            time.sleep(0.001)
+        handler.stop()
+        self.assertTrue(client.return_value.loop.called)
+        self.assertFalse(handler.thread.isAlive())
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_inflight_window(self, client):
+        self.config['qos'] = 1
+        self.config['max_inflight'] = 1
+        self.config['inflight_timeout'] = 0.01
+        handler = self.get_handler(client)
+
+        handler.process(self.metrics[0])
+        # The window is full, the message is dropped
+        handler.process(self.metrics[1])
+        self.assertEqual(client.return_value.publish.call_count, 1)
+        self.assertEqual(handler.dropped, 1)
+
+        # Once acknowledged there is room again
+        handler._published(client.return_value, None, 1)
+        handler.process(self.metrics[1])
+        self.assertEqual(client.return_value.publish.call_count, 2)
+        self.assertEqual(handler.inflight, 1)
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_inflight_deadline_per_flush(self, client):
+        self.config['qos'] = 1
+        self.config['max_inflight'] = 1
+        self.config['inflight_timeout'] = 60
+        handler = self.get_handler(client)
+        handler.process(self.metrics[0])
+
+        # Once the window timed out in this run, drop without waiting
+        handler.deadline = time.time()
+        start = time.time()
+        handler.process(self.metrics[1])
+        handler.process(self.metrics[1])
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(handler.dropped, 2)
+
+        # The next run waits again
+        handler.flush()
+        self.assertEqual(handler.deadline, None)
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_json(self, client):
+        self.config['mode'] = 'json'
+        handler = self.get_handler(client)
+        handler.process_batch(self.metrics)
+        self.assertFalse(client.return_value.publish.called)
+
+        handler.flush()
+        self.assertEqual(client.return_value.publish.call_count, 1)
+        topic, payload, qos = client.return_value.publish.call_args[0]
+        self.assertEqual(topic, 'servers/host/cpu')
+        self.assertEqual(json.loads(payload),
+                         {'timestamp': 10,
+                          'metrics': {'total.idle': 1.5, 'total.user': 2}})
+
+        handler.flush()
+        self.assertEqual(client.return_value.publish.call_count, 1)
+
+    @run_only_if_mosquitto_is_available
+    @patch('mosquitto.Mosquitto')
+    def test_json_unusual_path(self, client):
+        self.config['mode'] = 'json'
+        handler = self.get_handler(client)
+        # The host isn't part of the path, so it can't be split on it
+        handler.process(Metric('servers.other.cpu.total.idle', 1.5,
+                               timestamp=10, precision=1, host='host'))
+        handler.flush()
+
+        topic, payload, qos = client.return_value.publish.call_args[0]
+        self.assertEqual(topic, 'servers/other/cpu/total')
+        self.assertEqual(json.loads(payload),
+                         {'timestamp': 10, 'metrics': {'idle': 1.5}})
+
+################################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+
+import configobj
+
+from diamond.handler.hashring import ConsistentHashRing
+from diamond.handler.hashring import parse_destination
+from diamond.handler.multigraphite import MultiGraphiteHandler
+from diamond.metric import Metric
+
+
+class MockedMultiGraphiteHandler(MultiGraphiteHandler):
+    handler_class = staticmethod(lambda config: Mock(config=config))
+
+
+class TestMultiGraphiteHandler(unittest.TestCase):
+
+    def get_handler(self, **kwargs):
+        config = configobj.ConfigObj()
+        config['host'] = ['carbon1:2003:a', 'carbon1:2103:b', 'carbon2']
+        config.update(kwargs)
+        return MockedMultiGraphiteHandler(config)
+
+    def metrics(self):
+        return [Metric('servers.host.cpu.cpu%d.idle' % i, 0, timestamp=123)
+                for i in range(300)]
+
+    def test_parse_destination(self):
+        self.assertEqual(parse_destination('carbon1:2103:b', None),
+                         ('carbon1', 2103, 'b'))
+        self.assertEqual(parse_destination(' carbon2', 2004),
+                         ('carbon2', 2004, None))
+
+    def test_all(self):
+        handler = self.get_handler()
+        metric = Metric('servers.host.cpu.total.idle', 0, timestamp=123)
+        handler.process(metric)
+
+        for h in handler.handlers:
+            h.process.assert_called_once_with(metric)
+
+    def test_consistent_hash(self):
+        handler = self.get_handler(mode='consistent_hash')
+        self.assertEqual(handler.handlers[1].config['port'], 2103)
+
+        for metric in self.metrics():
+            handler.process(metric)
+
+        counts = [h.process.call_count for h in handler.handlers]
+        # Every metric goes to exactly one server and all of them get some
+        self.assertEqual(sum(counts), 300)
+        self.assertTrue(min(counts) > 0)
+
+    def test_routing_matches_ring(self):
+        handler = self.get_handler(mode='consistent_hash',
+                                   replication_factor=2)
+        ring = ConsistentHashRing([('carbon1', 'a'), ('carbon1', 'b'),
+                                   ('carbon2', None)])
+        for metric in self.metrics()[:20]:
+            expected = [handler.destinations[node]
+                        for node in ring.get_nodes(metric.path)[:2]]
+            self.assertEqual(handler.get_handlers(metric), expected)
+
+    def test_process_batch(self):
+        handler = self.get_handler(mode='consistent_hash')
+        handler.process_batch(self.metrics())
+
+        sent = []
+        for h in handler.handlers:
+            for batch in [c[0][0] for c in h.process_batch.call_args_list]:
+                for metric in batch:
+                    self.assertEqual(handler.get_handlers(metric), [h])
+                sent.extend(batch)
+        self.assertEqual(len(sent), 300)
+
+    def test_duplicate_destination(self):
+        hosts = ['carbon1:2003', 'carbon1:2103']
+        # Sending everything everywhere doesn't care
+        handler = self.get_handler(host=hosts)
+        self.assertEqual(len(handler.handlers), 2)
+        self.assertRaises(ValueError, self.get_handler, host=hosts,
+                          mode='consistent_hash')
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, self.get_handler, mode='random')
+
+
+if __name__ == "__main__":
+    unittest.main()
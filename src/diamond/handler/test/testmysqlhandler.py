@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from test import run_only
+from mock import patch
+
+import configobj
+
+from diamond.metric import Metric
+try:
+    import MySQLdb
+    from diamond.handler.mysql import MySQLHandler
+except ImportError:
+    MySQLdb = None
+
+
+def run_only_if_mysqldb_is_available(func):
+    pred = lambda: MySQLdb is not None
+    return run_only(func, pred)
+
+
+class TestMySQLHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['hostname'] = 'localhost'
+        self.config['port'] = '3306'
+        self.config['username'] = 'diamond'
+        self.config['password'] = ''
+        self.config['database'] = 'diamond'
+        self.config['table'] = 'metrics'
+        self.config['col_time'] = 'timestamp'
+        self.config['col_metric'] = 'metric'
+        self.config['col_value'] = 'value'
+        self.config['batch'] = 2
+        self.config['max_backlog'] = 3
+
+    @run_only_if_mysqldb_is_available
+    @patch('MySQLdb.Connect')
+    def test_batch(self, connect):
+        cursor = connect.return_value.cursor.return_value
+        handler = MySQLHandler(self.config)
+        handler.process(Metric('servers.host.cpu.idle', 1, timestamp=10))
+        self.assertFalse(cursor.executemany.called)
+        handler.process(Metric('servers.host.cpu.user', 2, timestamp=10))
+
+        cursor.executemany.assert_called_once_with(
+            "INSERT INTO metrics (metric, timestamp, value) "
+            "VALUES (%s, %s, %s)",
+            [('servers.host.cpu.idle', '10', '1'),
+             ('servers.host.cpu.user', '10', '2')])
+        self.assertEqual(connect.return_value.commit.call_count, 1)
+        self.assertEqual(handler.rows, [])
+
+    @run_only_if_mysqldb_is_available
+    @patch('MySQLdb.Connect')
+    def test_retry_backlog(self, connect):
+        cursor = connect.return_value.cursor.return_value
+        cursor.executemany.side_effect = MySQLdb.OperationalError('gone')
+        handler = MySQLHandler(self.config)
+        for i in range(5):
+            handler.process(Metric('servers.host.cpu.m%d' % i, i,
+                                   timestamp=10))
+
+        # Kept for the next attempt, up to max_backlog
+        self.assertEqual([row[0] for row in handler.rows],
+                         ['servers.host.cpu.m2', 'servers.host.cpu.m3',
+                          'servers.host.cpu.m4'])
+
+        cursor.executemany.side_effect = None
+        handler.flush()
+        self.assertEqual(handler.rows, [])
+        self.assertEqual(len(cursor.executemany.call_args[0][1]), 3)
+
+    @run_only_if_mysqldb_is_available
+    @patch('MySQLdb.Connect')
+    def test_bad_data_dropped(self, connect):
+        cursor = connect.return_value.cursor.return_value
+        cursor.executemany.side_effect = MySQLdb.DataError('too long')
+        handler = MySQLHandler(self.config)
+        handler.process_batch([Metric('servers.host.cpu.idle', 1,
+                                      timestamp=10),
+                               Metric('servers.host.cpu.user', 2,
+                                      timestamp=10)])
+        self.assertEqual(handler.rows, [])
+        self.assertTrue(connect.return_value.rollback.called)
+
+
+if __name__ == "__main__":
+    unittest.main()
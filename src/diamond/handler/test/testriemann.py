@@ -4,6 +4,7 @@
 
 from test import unittest
 from test import run_only
+from mock import patch
 import configobj
 
 from diamond.handler.riemann import RiemannHandler
@@ -42,3 +43,67 @@ class TestRiemannHandler(unittest.TestCase):
             'time': 1234567,
             'metric': 0.0,
         })
+
+    @run_only_if_bernhard_is_available
+    def test_event_ttl_and_tags(self):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config['port'] = 5555
+        config['tags'] = 'diamond, prod'
+        config['attributes'] = 'dc=ams1'
+        config['tag_collector'] = 'True'
+
+        handler = RiemannHandler(config)
+        metric = Metric('servers.com.example.www.cpu.total.idle',
+                        0,
+                        timestamp=1234567,
+                        host='com.example.www',
+                        interval=10)
+
+        event = handler._metric_to_riemann_event(metric)
+
+        self.assertEqual(event['ttl'], 20)
+        self.assertEqual(event['tags'], ['diamond', 'prod', 'cpu'])
+        self.assertEqual(event['attributes'], {'dc': 'ams1'})
+
+    @run_only_if_bernhard_is_available
+    @patch('bernhard.Client')
+    def test_batch(self, client):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config['port'] = 5555
+        config['batch'] = 2
+
+        handler = RiemannHandler(config)
+        metrics = [Metric('servers.com.example.www.cpu.total.m%d' % i, i,
+                          timestamp=1234567, host='com.example.www')
+                   for i in range(3)]
+        handler.process_batch(metrics)
+        handler.flush()
+
+        transmit = client.return_value.transmit
+        self.assertEqual(transmit.call_count, 2)
+        self.assertEqual(len(transmit.call_args_list[0][0][0].events), 2)
+        self.assertEqual(len(transmit.call_args_list[1][0][0].events), 1)
+
+    @run_only_if_bernhard_is_available
+    @patch('bernhard.Message')
+    @patch('bernhard.Event')
+    @patch('bernhard.Client')
+    def test_bad_event_skipped(self, client, event, message):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config['port'] = 5555
+        config['batch'] = 3
+        event.side_effect = [ValueError('bad'), 'event1', 'event2']
+
+        handler = RiemannHandler(config)
+        metrics = [Metric('servers.com.example.www.cpu.total.m%d' % i, i,
+                          timestamp=1234567, host='com.example.www')
+                   for i in range(3)]
+        handler.process_batch(metrics)
+        handler.flush()
+
+        message.assert_called_once_with(events=['event1', 'event2'])
+        client.return_value.transmit.assert_called_once_with(
+            message.return_value)
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from test import run_only
+from mock import create_autospec
+from mock import patch
+
+import configobj
+
+from diamond.metric import Metric
+from diamond.stats import registry
+try:
+    import pika
+    from pika.adapters.blocking_connection import BlockingChannel
+    from diamond.handler.rabbitmq_pubsub import exchange_type_keyword
+    from diamond.handler.rabbitmq_pubsub import rmqHandler
+except ImportError:
+    pika = None
+
+
+def run_only_if_pika_is_available(func):
+    pred = lambda: pika is not None
+    return run_only(func, pred)
+
+
+class TestRmqHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['server'] = 'localhost'
+        self.config['rmq_exchange'] = 'diamond'
+        self.metrics = [Metric('servers.host.cpu.m%d' % i, i, timestamp=10)
+                        for i in range(3)]
+
+    def mock_channel(self, connection):
+        """
+        Channel of the mocked connection, with pika's method signatures
+        """
+        channel = create_autospec(BlockingChannel, instance=True)
+        connection.return_value.channel.return_value = channel
+        return channel
+
+    @run_only_if_pika_is_available
+    @patch('pika.BlockingConnection', autospec=True)
+    def test_persistent_connection(self, connection):
+        channel = self.mock_channel(connection)
+        handler = rmqHandler(self.config)
+        for metric in self.metrics:
+            handler.process(metric)
+
+        self.assertEqual(connection.call_count, 1)
+        channel.exchange_declare.assert_called_once_with(
+            exchange='diamond', exchange_type='fanout')
+        self.assertEqual(channel.basic_publish.call_count, 3)
+
+    @run_only_if_pika_is_available
+    def test_exchange_type_keyword(self):
+        self.assertEqual(exchange_type_keyword('0.9.14'), 'type')
+        self.assertEqual(exchange_type_keyword('0.10.0'), 'exchange_type')
+        self.assertEqual(exchange_type_keyword('1.0.0b1'), 'exchange_type')
+        self.assertEqual(exchange_type_keyword(''), 'exchange_type')
+
+    @run_only_if_pika_is_available
+    @patch('pika.BlockingConnection', autospec=True)
+    def test_batch(self, connection):
+        self.config['batch'] = 2
+        channel = self.mock_channel(connection)
+        handler = rmqHandler(self.config)
+        handler.process_batch(self.metrics)
+        handler.flush()
+
+        self.assertEqual(
+            [c[1]['body'] for c in channel.basic_publish.call_args_list],
+            ['servers.host.cpu.m0 0 10\nservers.host.cpu.m1 1 10\n',
+             'servers.host.cpu.m2 2 10\n'])
+
+    @run_only_if_pika_is_available
+    @patch('pika.BlockingConnection', autospec=True)
+    def test_reconnect_on_failure(self, connection):
+        channel = self.mock_channel(connection)
+        handler = rmqHandler(self.config)
+        channel.basic_publish.side_effect = [Exception('closed'), None]
+        handler.process(self.metrics[0])
+        handler.process(self.metrics[1])
+        self.assertEqual(connection.call_count, 2)
+
+    @run_only_if_pika_is_available
+    @patch('pika.BlockingConnection', autospec=True)
+    def test_confirms(self, connection):
+        self.config['confirm'] = 'True'
+        self.config['batch'] = 1
+        channel = self.mock_channel(connection)
+        channel.basic_publish.side_effect = [True, False, True]
+        registry.clear()
+        handler = rmqHandler(self.config)
+        channel.confirm_delivery.assert_called_once_with()
+
+        handler.process_batch(self.metrics)
+        counters, gauges, histograms = registry.collect()
+        self.assertEqual(counters['handlers.rmqHandler.messages'], 3)
+        self.assertEqual(counters['handlers.rmqHandler.acked'], 2)
+        self.assertEqual(counters['handlers.rmqHandler.nacked'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
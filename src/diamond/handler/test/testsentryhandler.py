@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from test import run_only
+
+try:
+    import raven
+    raven  # workaround for pyflakes issue #13
+    from diamond.handler.lrucache import LRUCache
+    from diamond.handler.sentry import Rule
+    from diamond.handler.sentry import RuleIndex
+except ImportError:
+    raven = None
+
+
+def run_only_if_raven_is_available(func):
+    pred = lambda: raven is not None
+    return run_only(func, pred)
+
+
+class TestRuleIndex(unittest.TestCase):
+
+    @run_only_if_raven_is_available
+    def test_same_as_every_rule(self):
+        rules = [
+            Rule('load', 'loadavg.15', max=8.5),
+            Rule('free', 'memory.MemFree', min=66020000),
+            Rule('load 1', 'loadavg\\.01', max=8.5),
+            Rule('cpu', r'cpu\.cpu[0-9]+\.user', max=90),
+            Rule('disk', 'diskspace.*_free', min=10),
+            Rule('load again', 'loadavg.15', max=20),
+        ]
+        index = RuleIndex(rules)
+        for rule in rules[:3] + rules[5:]:
+            self.assertNotEqual(rule.literal, None)
+        self.assertEqual(rules[3].literal, None)
+
+        paths = ['servers.host.loadavg.15', 'servers.host.loadavg.01',
+                 'servers.host.memory.MemFree', 'servers.host.cpu.cpu3.user',
+                 'servers.host.cpu.total.user', 'servers.host.diskspace.root'
+                 '.byte_free', 'servers.host.memory.Buffers', 'loadavg.15']
+        for path in paths:
+            expected = [(rule, rule.match(path)) for rule in rules
+                        if rule.match(path)]
+            found = [(rule, (prefix, suffix)) for rule, prefix, suffix
+                     in index.get_matches(path)]
+            self.assertEqual(found, expected, path)
+            # and once more from the cache
+            self.assertEqual(len(index.get_matches(path)), len(expected))
+
+    @run_only_if_raven_is_available
+    def test_many_groups(self):
+        # more groups than one expression can hold
+        rules = [Rule('cpu %d' % i, r'cpu\.cpu%d\.(user|system)' % i, max=90)
+                 for i in xrange(150)]
+        rules.append(Rule('many', 'disk.(%s)' % ')('.join('a' * 60), max=1))
+        index = RuleIndex(rules)
+        self.assertEqual([len(chunk) for regexp, chunk in index.chunks],
+                         [99, 51, 1])
+        self.assertNotEqual(index.chunks[0][0], None)
+        self.assertEqual(index.chunks[2][0], None)
+
+        for path in ['servers.host.cpu.cpu3.user',
+                     'servers.host.cpu.cpu149.system',
+                     'servers.host.cpu.cpu150.user',
+                     'servers.host.disk.' + 'a' * 60]:
+            expected = [(rule, rule.match(path)) for rule in rules
+                        if rule.match(path)]
+            found = [(rule, (prefix, suffix)) for rule, prefix, suffix
+                     in index.get_matches(path)]
+            self.assertEqual(found, expected, path)
+
+    @run_only_if_raven_is_available
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
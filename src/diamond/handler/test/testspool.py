@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+
+import os
+import shutil
+import tempfile
+
+from diamond.handler.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_read_and_commit(self):
+        spool = Spool(self.path)
+        spool.append(['metric1 0 123\n', 'metric2 0 123\n'])
+        spool.append(['metric3 0 123\n'])
+
+        entries, position = spool.read(20)
+        self.assertEqual(entries, ['metric1 0 123\n', 'metric2 0 123\n'])
+
+        # Not committed, so read again
+        entries, position = spool.read(20)
+        self.assertEqual(entries, ['metric1 0 123\n', 'metric2 0 123\n'])
+        spool.commit(position)
+
+        entries, position = spool.read(1024)
+        self.assertEqual(entries, ['metric3 0 123\n'])
+        spool.commit(position)
+        self.assertEqual(spool.pending(), 0)
+        self.assertEqual(spool.segments, [])
+
+    def test_resume_after_restart(self):
+        spool = Spool(self.path, segment_bytes=40)
+        spool.append(['metric%d 0 123\n' % i for i in range(6)])
+        entries, position = spool.read(1)
+        spool.commit(position)
+        spool.close()
+
+        spool = Spool(self.path, segment_bytes=40)
+        entries, position = spool.read(1024)
+        self.assertEqual(entries, ['metric%d 0 123\n' % i
+                                   for i in range(1, 6)])
+
+    def test_partial_write(self):
+        spool = Spool(self.path)
+        spool.append(['metric1 0 123\n'])
+        spool.close()
+        f = open(os.path.join(self.path, os.listdir(self.path)[0]), 'ab')
+        f.write('\x00\x00\x00\x20metr')
+        f.close()
+
+        entries, position = Spool(self.path).read(1024)
+        self.assertEqual(entries, ['metric1 0 123\n'])
+
+    def test_size_cap(self):
+        spool = Spool(self.path, max_bytes=180, segment_bytes=40)
+        spool.append(['metric%d 0 123\n' % i for i in range(20)])
+
+        self.assertTrue(spool.size <= 180)
+        self.assertTrue(spool.dropped > 0)
+        entries, position = spool.read(1024)
+        self.assertEqual(entries[-1], 'metric19 0 123\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
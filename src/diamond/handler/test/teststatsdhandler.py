@@ -3,39 +3,18 @@
 ################################################################################
 
 from test import unittest
-from test import run_only
 from mock import patch
-from mock import ANY
 
 import configobj
 
 from diamond.handler.stats_d import StatsdHandler
 from diamond.metric import Metric
-try:
-    import statsd
-    statsd  # Pyflakes
-except ImportError:
-    pass
-
-
-def run_only_if_statsd_is_available(func):
-    try:
-        import statsd
-        statsd  # workaround for pyflakes issue #13
-    except ImportError:
-        statsd = None
-    pred = lambda: statsd is not None
-    return run_only(func, pred)
 
 
 class TestStatsdHandler(unittest.TestCase):
 
-    @run_only_if_statsd_is_available
-    @patch('statsd.Client')
-    def test_single_gauge(self, mock_client):
-        instance = mock_client.return_value
-        instance._send.return_value = 1
-
+    @patch('socket.socket')
+    def test_single_gauge(self, mock_socket):
         config = configobj.ConfigObj()
         config['host'] = 'localhost'
         config['port'] = '9999'
@@ -45,20 +24,15 @@ class TestStatsdHandler(unittest.TestCase):
                         123, raw_value=123, timestamp=1234567,
                         host='will-be-ignored', metric_type='GAUGE')
 
-        expected_data = {
-            'servers.com.example.www.cpu.total.idle': '123|g'
-        }
+        expected_data = 'servers.com.example.www.cpu.total.idle:123|g\n'
 
         handler = StatsdHandler(config)
         handler.process(metric)
-        mock_client._send.assert_called_with(ANY, expected_data)
-
-    @run_only_if_statsd_is_available
-    @patch('statsd.Client')
-    def test_single_counter(self, mock_client):
-        instance = mock_client.return_value
-        instance._send.return_value = 1
+        mock_socket.return_value.sendto.assert_called_with(
+            expected_data, ('localhost', 9999))
 
+    @patch('socket.socket')
+    def test_single_counter(self, mock_socket):
         config = configobj.ConfigObj()
         config['host'] = 'localhost'
         config['port'] = '9999'
@@ -68,20 +42,15 @@ class TestStatsdHandler(unittest.TestCase):
                         5, raw_value=123, timestamp=1234567,
                         host='will-be-ignored', metric_type='COUNTER')
 
-        expected_data = {
-            'servers.com.example.www.cpu.total.idle': '123|c'
-        }
+        expected_data = 'servers.com.example.www.cpu.total.idle:123|c\n'
 
         handler = StatsdHandler(config)
         handler.process(metric)
-        mock_client._send.assert_called_with(ANY, expected_data)
-
-    @run_only_if_statsd_is_available
-    @patch('statsd.Client')
-    def test_multiple_counter(self, mock_client):
-        instance = mock_client.return_value
-        instance._send.return_value = 1
+        mock_socket.return_value.sendto.assert_called_with(
+            expected_data, ('localhost', 9999))
 
+    @patch('socket.socket')
+    def test_multiple_counter(self, mock_socket):
         config = configobj.ConfigObj()
         config['host'] = 'localhost'
         config['port'] = '9999'
@@ -95,17 +64,32 @@ class TestStatsdHandler(unittest.TestCase):
                          7, raw_value=128, timestamp=1234567,
                          host='will-be-ignored', metric_type='COUNTER')
 
-        expected_data1 = {
-            'servers.com.example.www.cpu.total.idle': '123|c'
-        }
-
-        expected_data2 = {
-            'servers.com.example.www.cpu.total.idle': '5|c'
-        }
+        expected_data1 = 'servers.com.example.www.cpu.total.idle:123|c\n'
+        expected_data2 = 'servers.com.example.www.cpu.total.idle:5|c\n'
 
         handler = StatsdHandler(config)
+        sendto = mock_socket.return_value.sendto
         handler.process(metric1)
-        mock_client._send.assert_called_with(ANY, expected_data1)
+        sendto.assert_called_with(expected_data1, ('localhost', 9999))
 
         handler.process(metric2)
-        mock_client._send.assert_called_with(ANY, expected_data2)
+        sendto.assert_called_with(expected_data2, ('localhost', 9999))
+
+    @patch('socket.socket')
+    def test_packed_until_flush(self, mock_socket):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config['port'] = '9999'
+
+        handler = StatsdHandler(config)
+        sendto = mock_socket.return_value.sendto
+        for i in range(3):
+            handler.process(Metric('servers.host.cpu.metric%d' % i, i,
+                                   timestamp=1234567, metric_type='GAUGE'))
+        self.assertFalse(sendto.called)
+
+        handler.flush()
+        sendto.assert_called_once_with(
+            'servers.host.cpu.metric0:0|g\n'
+            'servers.host.cpu.metric1:1|g\n'
+            'servers.host.cpu.metric2:2|g\n', ('localhost', 9999))
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import configobj
+
+from diamond.handler.statsite import StatsiteHandler
+from diamond.metric import Metric
+
+
+class TestStatsiteHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['host'] = 'localhost'
+        self.config['tcpport'] = '8125'
+        self.config['udbport'] = '0'
+        self.config['timeout'] = '15'
+        self.config['max_backlog'] = '5'
+        self.metrics = [Metric('servers.host.cpu.m%d' % i, i, timestamp=10)
+                        for i in range(10)]
+
+    @patch('diamond.handler.statsite.Connection')
+    def test_kept_while_connecting(self, connection):
+        get_socket = connection.return_value.get_socket
+        sock = get_socket.return_value
+        get_socket.return_value = None
+        connection.return_value.is_failing.return_value = False
+        handler = StatsiteHandler(self.config)
+        for metric in self.metrics:
+            handler.process(metric)
+        self.assertEqual(len(handler.backlog), 10)
+
+        # Sent in one go once connected
+        get_socket.return_value = sock
+        handler.process(Metric('servers.host.cpu.m10', 10, timestamp=10))
+        sock.sendall.assert_called_once_with(''.join(
+            ['servers.host.cpu.m%d:%d|kv\n' % (i, i) for i in range(11)]))
+        self.assertEqual(handler.backlog, [])
+
+    @patch('diamond.handler.statsite.Connection')
+    def test_udp_kept_across_flushes(self, connection):
+        self.config['udbport'] = '8125'
+        get_socket = connection.return_value.get_socket
+        sock = get_socket.return_value
+        get_socket.return_value = None
+        connection.return_value.is_failing.return_value = False
+        handler = StatsiteHandler(self.config)
+        handler.process(self.metrics[0])
+        handler.flush()
+        # An empty flush keeps what is pending
+        handler.flush()
+        handler.process(self.metrics[1])
+        handler.flush()
+        self.assertEqual(len(handler.backlog), 2)
+
+        # Both are sent once connected
+        get_socket.return_value = sock
+        handler.flush()
+        sock.send.assert_called_once_with(
+            'servers.host.cpu.m0:0|kv\nservers.host.cpu.m1:1|kv\n')
+        self.assertEqual(handler.backlog, [])
+
+    @patch('diamond.handler.statsite.Connection')
+    def test_trimmed_once_failing(self, connection):
+        connection.return_value.get_socket.return_value = None
+        connection.return_value.is_failing.return_value = True
+        handler = StatsiteHandler(self.config)
+        for metric in self.metrics:
+            handler.process(metric)
+        self.assertTrue(len(handler.backlog) <= 5)
+        self.assertEqual(handler.backlog[-1], 'servers.host.cpu.m9:9|kv\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import configobj
+import gzip
+import httplib
+import socket
+from StringIO import StringIO
+try:
+    import json
+    json  # workaround for pyflakes issue #13
+except ImportError:
+    import simplejson as json
+
+from diamond.handler.tsdb import TSDBHandler
+from diamond.metric import Metric
+
+
+class TestTSDBHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['host'] = 'localhost'
+        self.config['port'] = '4242'
+        self.config['timeout'] = '15'
+        self.config['tags'] = 'env=prod, dc=ams1'
+        self.metrics = [
+            Metric('servers.host1.cpu.total.idle', 5, timestamp=1234567,
+                   host='host1'),
+            Metric('servers.host1.cpu.total.user', 1.5, timestamp=1234567,
+                   precision=1, host='host1'),
+        ]
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_telnet(self, connection):
+        sock = connection.return_value.get_socket.return_value
+        handler = TSDBHandler(self.config)
+        for metric in self.metrics:
+            handler.process(metric)
+        self.assertFalse(sock.sendall.called)
+
+        handler.flush()
+        sock.sendall.assert_called_once_with(
+            'put cpu.total.idle 1234567 5 host=host1 env=prod dc=ams1\n'
+            'put cpu.total.user 1234567 1.5 host=host1 env=prod dc=ams1\n')
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_telnet_batch(self, connection):
+        sock = connection.return_value.get_socket.return_value
+        self.config['batch'] = 1
+        handler = TSDBHandler(self.config)
+        handler.process(Metric('no.host.path', 1, timestamp=1234567))
+        sock.sendall.assert_called_once_with(
+            'put no.host.path 1234567 1 env=prod dc=ams1\n')
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_telnet_not_connected(self, connection):
+        get_socket = connection.return_value.get_socket
+        sock = get_socket.return_value
+        get_socket.return_value = None
+        connection.return_value.is_failing.return_value = False
+        self.config['batch'] = 1
+        self.config['max_backlog_multiplier'] = 1
+        handler = TSDBHandler(self.config)
+        handler.process(self.metrics[0])
+        # Not trimmed while the connection is pending
+        self.assertEqual(len(handler.points), 1)
+
+        # Sent once connected
+        get_socket.return_value = sock
+        handler.process(self.metrics[1])
+        sock.sendall.assert_called_once_with(
+            'put cpu.total.idle 1234567 5 host=host1 env=prod dc=ams1\n'
+            'put cpu.total.user 1234567 1.5 host=host1 env=prod dc=ams1\n')
+        self.assertEqual(handler.points, [])
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_telnet_backlog(self, connection):
+        connection.return_value.get_socket.return_value = None
+        connection.return_value.is_failing.return_value = True
+        self.config['batch'] = 1
+        handler = TSDBHandler(self.config)
+        for i in range(5):
+            handler.process(Metric('servers.host1.cpu.m%d' % i, i,
+                                   timestamp=1234567, host='host1'))
+        self.assertEqual([point[0] for point in handler.points],
+                         ['cpu.m1', 'cpu.m2', 'cpu.m3', 'cpu.m4'])
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_telnet_default_tags(self, connection):
+        sock = connection.return_value.get_socket.return_value
+        self.config['batch'] = 1
+        self.config['tags'] = ''
+        self.config['hostname'] = 'diamond1'
+        handler = TSDBHandler(self.config)
+        handler.process(Metric('no.host.path', 1, timestamp=1234567))
+        sock.sendall.assert_called_once_with(
+            'put no.host.path 1234567 1 host=diamond1\n')
+
+    @patch('diamond.handler.tsdb.Connection')
+    def test_non_finite(self, connection):
+        sock = connection.return_value.get_socket.return_value
+        handler = TSDBHandler(self.config)
+        handler.process_batch([
+            Metric('servers.host1.cpu.nan', float('nan'), timestamp=1234567,
+                   host='host1'),
+            Metric('servers.host1.cpu.inf', float('inf'), timestamp=1234567,
+                   host='host1'),
+        ] + self.metrics[:1])
+        handler.flush()
+        sock.sendall.assert_called_once_with(
+            'put cpu.total.idle 1234567 5 host=host1 env=prod dc=ams1\n')
+
+    @patch('httplib.HTTPConnection')
+    def test_http(self, http):
+        self.config['mode'] = ' HTTP '
+        self.config['compression'] = 'gzip'
+        http.return_value.getresponse.return_value.status = 204
+        handler = TSDBHandler(self.config)
+        handler.process_batch(self.metrics)
+        handler.flush()
+
+        http.assert_called_once_with('localhost', 4242, timeout=15)
+        method, url, body, headers = http.return_value.request.call_args[0]
+        self.assertEqual((method, url), ('POST', '/api/put'))
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        body = gzip.GzipFile(fileobj=StringIO(body)).read()
+        tags = {'host': 'host1', 'env': 'prod', 'dc': 'ams1'}
+        self.assertEqual(json.loads(body), [
+            {'metric': 'cpu.total.idle', 'timestamp': 1234567, 'value': 5,
+             'tags': tags},
+            {'metric': 'cpu.total.user', 'timestamp': 1234567, 'value': 1.5,
+             'tags': tags},
+        ])
+
+    @patch('httplib.HTTPConnection')
+    def test_http_error_reconnects(self, http):
+        self.config['mode'] = 'http'
+        self.config['batch'] = 1
+        http.return_value.request.side_effect = [socket.error('down'), None,
+                                                 None]
+        http.return_value.getresponse.return_value.status = 204
+        handler = TSDBHandler(self.config)
+        handler.process(self.metrics[0])
+        self.assertEqual(handler.http, None)
+        # Kept for the next post
+        self.assertEqual(len(handler.points), 1)
+        handler.process(self.metrics[1])
+        self.assertEqual(http.call_count, 2)
+        self.assertEqual(http.return_value.request.call_count, 3)
+        self.assertEqual(handler.points, [])
+
+    @patch('httplib.HTTPConnection')
+    def test_http_stale_keep_alive(self, http):
+        self.config['mode'] = 'http'
+        self.config['batch'] = 1
+        http.return_value.getresponse.return_value.status = 204
+        handler = TSDBHandler(self.config)
+        handler.process(self.metrics[0])
+
+        # The server closed the idle connection, posted again at once
+        http.return_value.request.side_effect = [
+            httplib.BadStatusLine(''), None]
+        handler.process(self.metrics[1])
+        self.assertEqual(http.call_count, 2)
+        self.assertEqual(http.return_value.request.call_count, 3)
+        self.assertEqual(handler.points, [])
+
+    @patch('httplib.HTTPConnection')
+    def test_http_down(self, http):
+        self.config['mode'] = 'http'
+        self.config['batch'] = 1
+        self.config['max_backlog_multiplier'] = 3
+        self.config['trim_backlog_multiplier'] = 2
+        http.return_value.request.side_effect = socket.error('down')
+        handler = TSDBHandler(self.config)
+        handler.points = [handler.get_point(metric)
+                          for metric in self.metrics]
+        handler.flush()
+        # One attempt for all batches
+        self.assertEqual(http.return_value.request.call_count, 1)
+        self.assertEqual(len(handler.points), 2)
+
+        # Bounded once TSDB is known to be down
+        handler.process_batch(self.metrics)
+        self.assertEqual(http.return_value.request.call_count, 2)
+        self.assertEqual(len(handler.points), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
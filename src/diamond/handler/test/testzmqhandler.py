@@ -0,0 +1,104 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from test import run_only
+from mock import patch
+
+import configobj
+
+from diamond.metric import Metric
+try:
+    import zmq
+    from diamond.handler.zmq_pubsub import zmqHandler
+    from diamond.handler.zmq_pubsub import decode
+except ImportError:
+    zmq = None
+
+
+def run_only_if_zmq_is_available(func):
+    pred = lambda: zmq is not None
+    return run_only(func, pred)
+
+
+class TestZmqHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configobj.ConfigObj()
+        self.config['port'] = '5555'
+        self.metrics = [Metric('servers.host.cpu.m%d' % i, i, timestamp=10)
+                        for i in range(3)]
+
+    @run_only_if_zmq_is_available
+    @patch('zmq.Context')
+    def test_lines(self, context):
+        self.config['mode'] = 'lines'
+        handler = zmqHandler(self.config)
+        socket = context.return_value.socket.return_value
+        handler.process_batch(self.metrics)
+        self.assertFalse(socket.send.called)
+
+        handler.flush()
+        socket.send.assert_called_once_with(
+            'servers.host.cpu.m0 0 10\nservers.host.cpu.m1 1 10\n'
+            'servers.host.cpu.m2 2 10\n', zmq.NOBLOCK)
+
+    @run_only_if_zmq_is_available
+    @patch('zmq.Context')
+    def test_multipart(self, context):
+        self.config['mode'] = 'multipart'
+        self.config['batch'] = 2
+        handler = zmqHandler(self.config)
+        socket = context.return_value.socket.return_value
+        handler.process_batch(self.metrics[:2])
+        socket.send_multipart.assert_called_once_with(
+            ['servers.host.cpu.m0 0 10\n', 'servers.host.cpu.m1 1 10\n'],
+            zmq.NOBLOCK)
+
+    @run_only_if_zmq_is_available
+    @patch('zmq.Context')
+    def test_binary(self, context):
+        self.config['mode'] = 'lines'
+        self.config['encoding'] = 'binary'
+        handler = zmqHandler(self.config)
+        socket = context.return_value.socket.return_value
+        paths = {}
+
+        handler.process_batch(self.metrics)
+        handler.flush()
+        first = socket.send.call_args[0][0]
+        self.assertEqual(decode(first, paths), [
+            ('servers.host.cpu.m0', 10, 0.0),
+            ('servers.host.cpu.m1', 10, 1.0),
+            ('servers.host.cpu.m2', 10, 2.0),
+        ])
+
+        # Paths are interned, the second message only holds points
+        handler.process_batch(self.metrics)
+        handler.flush()
+        second = socket.send.call_args[0][0]
+        self.assertTrue(len(second) < len(first))
+        self.assertEqual(len(decode(second, paths)), 3)
+
+        # A subscriber that missed the definitions picks them up again
+        handler.intern_time -= handler.intern_refresh
+        handler.process_batch(self.metrics[1:])
+        handler.flush()
+        third = socket.send.call_args[0][0]
+        self.assertEqual(decode(third, {}), [
+            ('servers.host.cpu.m1', 10, 1.0),
+            ('servers.host.cpu.m2', 10, 2.0),
+        ])
+        # under the same ids, what subscribers already know stays valid
+        handler.process_batch(self.metrics[1:])
+        handler.flush()
+        fourth = socket.send.call_args[0][0]
+        self.assertEqual(decode(fourth, paths), [
+            ('servers.host.cpu.m1', 10, 1.0),
+            ('servers.host.cpu.m2', 10, 2.0),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,17 +34,52 @@ yourself.
 `    handlers = diamond.handler.tsdb.TSDBHandler
 `
 
+Metrics are sent as `<collector>.<metric path>` with a `host` tag, plus the
+static tags given in `tags`. Metrics without a host are sent under their
+full path with the static tags, or with this host's name as the `host` tag if
+there are none, as OpenTSDB needs at least one tag. Values that are not
+finite numbers (nan, inf) are skipped:
+
+        [[TSDBHandler]]
+        host = opentsdb.example.com
+        port = 4242
+        tags = env=prod, dc=ams1
+
+By default `put` lines are buffered and written `batch` at a time, and at
+the end of each collector run, over the telnet interface. Until connected
+they are kept. Once connecting fails, only up to
+`batch * max_backlog_multiplier`, after which the newest
+`batch * trim_backlog_multiplier` are kept. With
+`mode = http` they are posted as JSON to `/api/put` (OpenTSDB 2.0 or newer)
+instead, over a kept alive connection and gzipped if `compression = gzip`.
+A post on a connection TSDB closed meanwhile is retried once on a new one.
+Once a post fails the remaining batches wait for the next flush, kept as
+with telnet.
+
 """
 
 from Handler import Handler
+from connection import Connection
+from diamond.collector import get_hostname
+from StringIO import StringIO
+import gzip
+import httplib
 import socket
+try:
+    import json
+    json  # workaround for pyflakes issue #13
+except ImportError:
+    import simplejson as json
 
 
 class TSDBHandler(Handler):
     """
-    Implements the abstract Handler class, sending data to graphite
+    Implements the abstract Handler class, sending data to OpenTSDB
     """
-    RETRY = 3
+
+    # Modes
+    TELNET = 'telnet'
+    HTTP = 'http'
 
     def __init__(self, config=None):
         """
@@ -55,92 +90,252 @@ class TSDBHandler(Handler):
 
         # Initialize Data
         self.socket = None
+        self.http = None
+        self.http_failing = False
+        self.points = []
 
         # Initialize Options
         self.host = self.config['host']
         self.port = int(self.config['port'])
         self.timeout = int(self.config['timeout'])
+        self.batch_size = int(self.config.get('batch', 100))
+        self.max_backlog_multiplier = int(
+            self.config.get('max_backlog_multiplier', 5))
+        self.trim_backlog_multiplier = int(
+            self.config.get('trim_backlog_multiplier', 4))
+        self.mode = self.config.get('mode', self.TELNET).lower().strip()
+        self.compression = self.config.get('compression', '')
+        self.tags = self._parse_tags(self.config.get('tags', ''))
+        # OpenTSDB needs at least one tag
+        self.default_tags = self.tags or [('host', get_hostname(self.config))]
+
+        if self.mode not in (self.TELNET, self.HTTP):
+            raise ValueError("TSDBHandler: Unknown mode %r" % self.mode)
+
+        # Initialize Connection
+        self.connection = None
+        if self.mode == self.TELNET:
+            self.connection = Connection(
+                self.__class__.__name__, self.host, self.port, 'tcp',
+                self.timeout,
+                float(self.config.get('reconnect_backoff_min', 1)),
+                float(self.config.get('reconnect_backoff_max', 60)))
 
-        # Connect
-        self._connect()
+            # Connect
+            self._connect()
 
     def __del__(self):
         """
         Destroy instance of the TSDBHandler class
         """
-        self._close()
+        if getattr(self, 'connection', None) is not None:
+            self.connection.close()
+        if getattr(self, 'http', None) is not None:
+            self.http.close()
+
+    def _parse_tags(self, tags):
+        """
+        Parse "key=value" tags, given as a list or a comma or space
+        separated string, into a list of (key, value)
+        """
+        if isinstance(tags, basestring):
+            tags = tags.replace(',', ' ').split()
+        parsed = []
+        for tag in tags:
+            for item in tag.split():
+                key, value = item.split('=', 1)
+                parsed.append((key.strip(), value.strip()))
+        return parsed
+
+    def get_point(self, metric):
+        """
+        Return (metric name, timestamp, value, tags) for a metric, or None if
+        its value is not a finite number. The name is the collector and
+        metric path, the host becomes a tag.
+        """
+        number = float(metric.value)
+        # Only nan and inf are not zero here
+        if number - number != 0:
+            self.log.debug("TSDBHandler: Skipping %s, its value is %s.",
+                           metric.path, metric.value)
+            return None
+        # Render the value with the metric's precision
+        value = str(metric).split()[1]
+        try:
+            if metric.host is None:
+                raise ValueError
+            name = '%s.%s' % (metric.getCollectorPath(),
+                              metric.getMetricPath())
+            tags = [('host', metric.host)] + self.tags
+        except ValueError:
+            # Not a servers.<host>.<collector> path
+            name = metric.path
+            tags = list(self.default_tags)
+        return name, int(metric.timestamp), value, tags
 
     def process(self, metric):
         """
-        Process a metric by sending it to TSDB
+        Process a metric by queueing it for TSDB
         """
-        # Just send the data as a string
-        self._send("put " + str(metric))
+        point = self.get_point(metric)
+        if point is not None:
+            self.points.append(point)
+        if len(self.points) >= self.batch_size:
+            self._send()
 
-    def _send(self, data):
+    def process_batch(self, metrics):
         """
-        Send data to TSDB. Data that can not be sent will be queued.
+        Process a list of metrics, queueing them for TSDB
         """
-        retry = self.RETRY
-        # Attempt to send any data in the queue
-        while retry > 0:
-            # Check socket
-            if not self.socket:
-                # Log Error
-                self.log.error("TSDBHandler: Socket unavailable.")
-                # Attempt to restablish connection
-                self._connect()
-                # Decrement retry
-                retry -= 1
-                # Try again
-                continue
+        for metric in metrics:
+            point = self.get_point(metric)
+            if point is not None:
+                self.points.append(point)
+        if len(self.points) >= self.batch_size:
+            self._send()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        self._send()
+
+    def _send(self):
+        """
+        Send the queued points to TSDB, batch_size at a time
+        """
+        points = self.points
+        self.points = []
+        if not points:
+            return
+        if self.mode == self.HTTP:
+            for i in xrange(0, len(points), self.batch_size):
+                if not self._send_http(points[i:i + self.batch_size]):
+                    # Don't wait on an unreachable TSDB for every batch
+                    self._keep(points[i:])
+                    break
+        else:
+            self._send_telnet(points)
+
+    def _send_telnet(self, points):
+        """
+        Write put lines to TSDB. Data is kept while there is no connection.
+        """
+        # Check socket
+        if not self.socket:
+            self._connect()
+        if not self.socket:
+            self.log.debug("TSDBHandler: Socket unavailable, keeping data.")
+            self._keep(points)
+            return
+        lines = []
+        for name, timestamp, value, tags in points:
+            fields = ['put', name, str(timestamp), value]
+            fields.extend(['%s=%s' % tag for tag in tags])
+            lines.append(' '.join(fields) + '\n')
+        try:
+            # Send data to socket
+            self.socket.sendall(''.join(lines))
+        except socket.error, e:
+            # Log Error
+            self.log.error("TSDBHandler: Failed sending data. %s.", e)
+            # Reconnect in the background
+            self._close()
+            self._keep(points)
+
+    def _keep(self, points):
+        """
+        Put unsent points back in front of the queue. Once TSDB can't be
+        reached, the oldest are trimmed when there are too many.
+        """
+        self.points[:0] = points
+        if self._is_failing() and len(self.points) >= (
+                self.batch_size * self.max_backlog_multiplier):
+            keep = self.batch_size * self.trim_backlog_multiplier
+            self.log.warn("TSDBHandler: Trimming backlog. Removing oldest %d "
+                          "and keeping newest %d points",
+                          len(self.points) - keep, keep)
+            self.points = self.points[-keep:]
+
+    def _is_failing(self):
+        """
+        Whether TSDB could not be reached, rather than a connect pending
+        """
+        if self.connection is not None:
+            return self.connection.is_failing()
+        return self.http_failing
+
+    def _number(self, value):
+        """
+        Keep integer values integers, OpenTSDB stores them differently
+        """
+        if '.' in value:
+            return float(value)
+        return int(value)
+
+    def _send_http(self, points):
+        """
+        Post points to /api/put as JSON. Returns False if TSDB can not be
+        reached, or fails with a 5xx response, for the points to be kept.
+        """
+        body = json.dumps([{'metric': name,
+                            'timestamp': timestamp,
+                            'value': self._number(value),
+                            'tags': dict(tags)}
+                           for name, timestamp, value, tags in points])
+        headers = {'Content-Type': 'application/json'}
+        if self.compression == 'gzip':
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            headers['Content-Encoding'] = 'gzip'
+
+        for attempt in (1, 2):
+            reused = self.http is not None
             try:
-                # Send data to socket
-                self.socket.sendall(data)
-                # Done
+                if self.http is None:
+                    self.http = httplib.HTTPConnection(self.host, self.port,
+                                                       timeout=self.timeout)
+                self.http.request('POST', '/api/put', body, headers)
+                response = self.http.getresponse()
+                content = response.read()
                 break
-            except socket.error, e:
+            except (httplib.HTTPException, socket.error), e:
+                if self.http is not None:
+                    self.http.close()
+                self.http = None
+                if reused:
+                    # TSDB closed the kept alive connection, retry once on
+                    # a new one
+                    continue
                 # Log Error
                 self.log.error("TSDBHandler: Failed sending data. %s.", e)
-                # Attempt to restablish connection
-                self._close()
-                # Decrement retry
-                retry -= 1
-                # try again
-                continue
+                self.http_failing = True
+                return False
+
+        self.http_failing = False
+        if response.status >= 500:
+            self.log.error("TSDBHandler: Failed sending data. HTTP %d %s.",
+                           response.status, content)
+            self.http_failing = True
+            return False
+        elif response.status >= 300:
+            # Retrying will not help
+            self.log.error("TSDBHandler: Data rejected, dropping it. HTTP "
+                           "%d %s.", response.status, content)
+        return True
 
     def _connect(self):
         """
-        Connect to the TSDB server
+        Pick up the socket of the connection. It connects in the
+        background, so this never blocks.
         """
-        # Create socket
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if socket is None:
-            # Log Error
-            self.log.error("TSDBHandler: Unable to create socket.")
-            # Close Socket
-            self._close()
-            return
-        # Set socket timeout
-        self.socket.settimeout(self.timeout)
-        # Connect to graphite server
-        try:
-            self.socket.connect((self.host, self.port))
-            # Log
-            self.log.debug("Established connection to TSDB server %s:%d",
-                           self.host, self.port)
-        except Exception, ex:
-            # Log Error
-            self.log.error("TSDBHandler: Failed to connect to %s:%i. %s",
-                           self.host, self.port, ex)
-            # Close Socket
-            self._close()
-            return
+        self.socket = self.connection.get_socket()
 
     def _close(self):
         """
-        Close the socket
+        Drop the socket, the connection will reconnect
         """
         if self.socket is not None:
-            self.socket.close()
+            self.connection.reset()
         self.socket = None
@@ -2,12 +2,68 @@
 
 """
 Output the collected values to a Zer0MQ pub/sub channel
+
+By default every metric is sent as its own message. With `mode = lines` the
+metrics queued up to a flush (the end of a collector run) or `batch` metrics
+are sent as one newline separated message, with `mode = multipart` as one
+multipart message with a frame per metric.
+
+Sends never block: once the `sndhwm` high water mark of a subscriber is
+reached, ZeroMQ silently drops the messages for it.
+
+With `encoding = binary` metrics are sent as struct packed records instead
+of text lines. Each message starts with a header (version, epoch). A path is
+sent once as a definition record (type 0, id, length, path) ahead of the
+first point record (type 1, id, timestamp, value as a double) using it. Ids
+never change while the handler runs, and all paths are defined again every
+`intern_refresh` seconds, so a subscriber that joins late or missed messages
+only loses the points of paths it has not seen defined yet.
+decode() unpacks such a message.
+
 """
 
 from Handler import Handler
+import random
+import struct
+import time
 
 import zmq
 
+# Binary encoding
+VERSION = 1
+HEADER = struct.Struct('!BI')
+DEFINE = struct.Struct('!BIH')
+POINT = struct.Struct('!BIId')
+DEFINE_RECORD = 0
+POINT_RECORD = 1
+
+
+def decode(data, paths):
+    """
+    Decode a binary message, or the joined frames of a multipart one, into a
+    list of (path, timestamp, value). paths maps ids to paths and is updated
+    with the definitions in the message, keep it between messages.
+    """
+    version, epoch = HEADER.unpack_from(data)
+    if paths.get('epoch') != epoch:
+        # The publisher restarted, its ids mean something else now
+        paths.clear()
+        paths['epoch'] = epoch
+    points = []
+    offset = HEADER.size
+    while offset < len(data):
+        if ord(data[offset]) == DEFINE_RECORD:
+            kind, path_id, length = DEFINE.unpack_from(data, offset)
+            offset += DEFINE.size
+            paths[path_id] = data[offset:offset + length]
+            offset += length
+        else:
+            kind, path_id, timestamp, value = POINT.unpack_from(data, offset)
+            offset += POINT.size
+            if path_id in paths:
+                points.append((paths[path_id], timestamp, value))
+    return points
+
 
 class zmqHandler (Handler):
     """
@@ -15,6 +71,11 @@ class zmqHandler (Handler):
       Sending data to a Zer0MQ pub channel
     """
 
+    # Modes
+    SINGLE = 'single'
+    LINES = 'lines'
+    MULTIPART = 'multipart'
+
     def __init__(self, config=None):
 
         """
@@ -28,9 +89,22 @@ class zmqHandler (Handler):
         self.context = None
 
         self.socket = None
+        self.metrics = []
+        self.paths = {}
+        self.defined = set()
+        self.intern_time = time.time()
+        self.epoch = random.randint(0, 0xffffffff)
 
         # Initialize Options
         self.port = int(self.config['port'])
+        self.mode = self.config.get('mode', self.SINGLE)
+        self.batch_size = int(self.config.get('batch', 1000))
+        self.sndhwm = int(self.config.get('sndhwm', 1000))
+        self.binary = self.config.get('encoding', 'text') == 'binary'
+        self.intern_refresh = float(self.config.get('intern_refresh', 60))
+
+        if self.mode not in (self.SINGLE, self.LINES, self.MULTIPART):
+            raise ValueError("zmqHandler: Unknown mode %r" % self.mode)
 
         # Create ZMQ pub socket and bind
         self._bind()
@@ -41,6 +115,11 @@ class zmqHandler (Handler):
         """
         self.context = zmq.Context()
         self.socket = self.context.socket(zmq.PUB)
+        if hasattr(zmq, 'SNDHWM'):
+            self.socket.setsockopt(zmq.SNDHWM, self.sndhwm)
+        else:
+            # ZeroMQ 2
+            self.socket.setsockopt(zmq.HWM, self.sndhwm)
         self.socket.bind("tcp://*:%i" % self.port)
 
     def __del__(self):
@@ -53,6 +132,74 @@ class zmqHandler (Handler):
         """
           Process a metric and send it to zmq pub socket
         """
-
-        # Send the data as ......
-        self.socket.send("%s" % str(metric))
+        if self.mode == self.SINGLE:
+            self._send([metric])
+            return
+        self.metrics.append(metric)
+        if len(self.metrics) >= self.batch_size:
+            self._send()
+
+    def process_batch(self, metrics):
+        """
+          Process a list of metrics, sending them as batches
+        """
+        if self.mode == self.SINGLE:
+            for metric in metrics:
+                self._send([metric])
+            return
+        self.metrics.extend(metrics)
+        if len(self.metrics) >= self.batch_size:
+            self._send()
+
+    def flush(self):
+        """Flush metrics in queue"""
+        self._send()
+
+    def _encode(self, metrics):
+        """
+          Return the records for metrics, text lines or binary records
+        """
+        if not self.binary:
+            return [str(metric) for metric in metrics]
+
+        if time.time() - self.intern_time >= self.intern_refresh:
+            # Define all paths again for subscribers that joined or missed
+            # messages since, keeping their ids
+            self.defined = set()
+            self.intern_time = time.time()
+
+        records = []
+        for metric in metrics:
+            path_id = self.paths.get(metric.path)
+            if path_id is None:
+                path_id = self.paths[metric.path] = len(self.paths)
+            if metric.path not in self.defined:
+                self.defined.add(metric.path)
+                records.append(DEFINE.pack(DEFINE_RECORD, path_id,
+                                           len(metric.path)) + metric.path)
+            records.append(POINT.pack(POINT_RECORD, path_id,
+                                      int(metric.timestamp),
+                                      float(metric.value)))
+        return records
+
+    def _send(self, metrics=None):
+        """
+          Send metrics, or the queued metrics, in one message without
+          blocking
+        """
+        if metrics is None:
+            metrics = self.metrics
+            self.metrics = []
+        if not metrics:
+            return
+
+        records = self._encode(metrics)
+        if self.mode == self.MULTIPART:
+            if self.binary:
+                records.insert(0, HEADER.pack(VERSION, self.epoch))
+            self.socket.send_multipart(records, zmq.NOBLOCK)
+        elif self.binary:
+            self.socket.send(HEADER.pack(VERSION, self.epoch)
+                             + ''.join(records), zmq.NOBLOCK)
+        else:
+            self.socket.send(''.join(records), zmq.NOBLOCK)
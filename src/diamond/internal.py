@@ -0,0 +1,172 @@
+# coding=utf-8
+
+"""
+Collectors that report on Diamond itself. They are set up by the Server and
+publish through the normal handler chain. Both are disabled unless enabled
+in their config section.
+"""
+
+from diamond.collector import Collector
+from diamond.stats import registry
+
+
+class SchedulerCollector(Collector):
+    """
+    Publishes worker pool and task statistics of the task scheduler under
+    diamond.scheduler.*
+    """
+
+    def __init__(self, config, handlers, scheduler):
+        """
+        Create a new instance of the SchedulerCollector class
+        """
+        Collector.__init__(self, config, handlers)
+        self.scheduler = scheduler
+        self.last_pool_stats = None
+        self.last_task_stats = {}
+
+    def get_default_config(self):
+        """
+        Returns the default collector settings
+        """
+        config = super(SchedulerCollector, self).get_default_config()
+        config.update({
+            'enabled':  False,
+            'path':     'diamond.scheduler',
+            'interval': 60,
+        })
+        return config
+
+    def collect(self):
+        """
+        Collect scheduler statistics
+        """
+        self.collect_tasks(self.scheduler.get_task_stats())
+        pool = self.scheduler.get_pool()
+        if pool is not None:
+            self.collect_pool(pool.get_stats())
+
+    def collect_tasks(self, stats):
+        """
+        Publish the overruns and skipped runs of every task since the last
+        run, along with the duration of its last run
+        """
+        metrics = []
+        overruns = 0
+        skipped = 0
+        for name, task_stats in sorted(stats.items()):
+            last = self.last_task_stats.get(name)
+            if last is not None:
+                task_overruns = task_stats['overruns'] - last['overruns']
+                task_skipped = task_stats['skipped'] - last['skipped']
+            else:
+                task_overruns = task_stats['overruns']
+                task_skipped = task_stats['skipped']
+            overruns += task_overruns
+            skipped += task_skipped
+
+            path = 'tasks.%s' % name.replace('.', '_')
+            metrics.append((path + '.overruns', task_overruns))
+            metrics.append((path + '.skipped', task_skipped))
+            metrics.append((path + '.duration_ms',
+                            task_stats['last_duration'] * 1000, 'GAUGE', 2))
+        self.last_task_stats = stats
+
+        metrics.append(('overruns', overruns))
+        metrics.append(('skipped', skipped))
+        self.publish_many(metrics)
+
+    def collect_pool(self, stats):
+        """
+        Publish worker pool size, saturation and queue wait time. Saturation
+        is the share of worker time spent running tasks since the last run.
+        """
+        metrics = [
+            ('pool.size', stats['size']),
+            ('pool.busy', stats['busy']),
+            ('pool.queued', stats['queued']),
+            ('pool.wait_max_ms', stats['wait_max'] * 1000, 'GAUGE', 2),
+        ]
+
+        last = self.last_pool_stats
+        if last is not None:
+            completed = stats['completed'] - last['completed']
+            wait = stats['wait_total'] - last['wait_total']
+            busy = stats['busy_time'] - last['busy_time']
+            elapsed = stats['uptime'] - last['uptime']
+            if completed > 0:
+                metrics.append(('pool.wait_avg_ms',
+                                wait / completed * 1000, 'GAUGE', 2))
+            else:
+                metrics.append(('pool.wait_avg_ms', 0))
+            if elapsed > 0:
+                metrics.append(('pool.saturation_percent',
+                                busy / (elapsed * stats['size']) * 100,
+                                'GAUGE', 2))
+            metrics.append(('pool.completed', completed))
+            metrics.append(('pool.rejected',
+                            stats['rejected'] - last['rejected']))
+        self.last_pool_stats = stats
+
+        self.publish_many(metrics)
+
+
+class SelfCollector(Collector):
+    """
+    Publishes the statistics Diamond keeps about itself under diamond.self.*:
+    metrics published, run durations and errors per collector, process and
+    flush latency, lock wait time and errors per handler, handler queue
+    depth and scheduler lag
+    """
+
+    def get_default_config(self):
+        """
+        Returns the default collector settings
+        """
+        config = super(SelfCollector, self).get_default_config()
+        config.update({
+            'enabled':  False,
+            'path':     'diamond.self',
+            'interval': 60,
+        })
+        return config
+
+    def collect(self):
+        """
+        Publish everything recorded since the last run
+        """
+        for handler in self.handlers:
+            if hasattr(handler, 'get_stats'):
+                # Handler behind a Dispatcher queue
+                stats = handler.get_stats()
+                prefix = 'handlers.%s.' % handler.name
+                registry.gauge(prefix + 'queue_depth', stats['queue_depth'])
+                registry.gauge(prefix + 'dropped', stats['dropped'])
+                registry.gauge(prefix + 'latency_last_ms',
+                               stats['latency_last'] * 1000)
+                registry.gauge(prefix + 'latency_max_ms',
+                               stats['latency_max'] * 1000)
+                registry.gauge(prefix + 'latency_avg_ms',
+                               stats['latency_avg'] * 1000)
+
+        counters, gauges, histograms = registry.collect()
+
+        metrics = []
+        for name, value in sorted(counters.items()):
+            metrics.append((name, value))
+        for name, value in sorted(gauges.items()):
+            if isinstance(value, float):
+                metrics.append((name, value, 'GAUGE', 3))
+            else:
+                metrics.append((name, value))
+        for name, histogram in sorted(histograms.items()):
+            metrics.append((name + '.count', histogram.count))
+            metrics.append((name + '.avg_ms',
+                            histogram.total / histogram.count * 1000,
+                            'GAUGE', 3))
+            metrics.append((name + '.max_ms', histogram.max * 1000,
+                            'GAUGE', 3))
+            for bucket, count in histogram.get_buckets():
+                metrics.append(('%s.%s' % (name, bucket), count))
+
+        self.publish_many(metrics)
@@ -8,10 +8,19 @@ from error import DiamondException
 
 class Metric(object):
 
+    # Metrics are created for every published point, so keep them compact
+    __slots__ = ['path', 'value', 'raw_value', 'timestamp', 'precision',
+                 'host', 'metric_type', 'interval', '_line', '_path_prefix',
+                 '_collector_path', '_metric_path']
+
     _METRIC_TYPES = ['COUNTER', 'GAUGE']
 
+    # Format strings by precision, shared by all metrics
+    _FORMATS = {}
+
     def __init__(self, path, value, raw_value=None, timestamp=None, precision=0,
-                 host=None, metric_type='COUNTER'):
+                 host=None, metric_type='COUNTER', path_prefix=None,
+                 collector_path=None, metric_path=None, interval=None):
         """
         Create new instance of the Metric class
 
@@ -21,6 +30,11 @@ class Metric(object):
             timestamp=[float|int]: the timestamp, in seconds since the epoch
             (as from time.time()) precision=int: the precision to apply.
             Generally the default (2) should work fine.
+            path_prefix, collector_path, metric_path=string: the components
+            of path around the host, when known. Otherwise they are parsed
+            from path on demand.
+            interval=int: seconds between the collector runs publishing the
+            metric, if known.
         """
 
         # Validate the path, value and metric_type submitted
@@ -58,21 +72,37 @@ class Metric(object):
         self.precision = precision
         self.host = host
         self.metric_type = metric_type
+        self.interval = interval
+        self._line = None
+        self._path_prefix = path_prefix
+        self._collector_path = collector_path
+        self._metric_path = metric_path
 
     def __repr__(self):
         """
         Return the Metric as a string
+
+        The line is rendered once and then reused by every handler, so a
+        metric should not be modified after it has been published.
         """
+        if self._line is not None:
+            return self._line
+
         if not isinstance(self.precision, (int, long)):
             log = logging.getLogger('diamond')
             log.warn('Metric %s does not have a valid precision', self.path)
             self.precision = 0
 
-        # Set the format string
-        fstring = "%%s %%0.%if %%i\n" % self.precision
+        # Get the format string
+        try:
+            fstring = self._FORMATS[self.precision]
+        except KeyError:
+            fstring = "%%s %%0.%if %%i\n" % self.precision
+            self._FORMATS[self.precision] = fstring
 
         # Return formated string
-        return fstring % (self.path, self.value, self.timestamp)
+        self._line = fstring % (self.path, self.value, self.timestamp)
+        return self._line
 
     @classmethod
     def parse(cls, string):
@@ -99,6 +129,9 @@ class Metric(object):
             servers.host.cpu.total.idle
             return "servers"
         """
+        if self._path_prefix is not None:
+            return self._path_prefix
+
         # If we don't have a host name, assume it's just the first part of the
         # metric path
         if self.host is None:
@@ -113,6 +146,9 @@ class Metric(object):
             servers.host.cpu.total.idle
             return "cpu"
         """
+        if self._collector_path is not None:
+            return self._collector_path
+
         # If we don't have a host name, assume it's just the third part of the
         # metric path
         if self.host is None:
@@ -129,6 +165,9 @@ class Metric(object):
             servers.host.cpu.total.idle
             return "total.idle"
         """
+        if self._metric_path is not None:
+            return self._metric_path
+
         # If we don't have a host name, assume it's just the fourth+ part of the
         # metric path
         if self.host is None:
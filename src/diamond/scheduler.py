@@ -4,13 +4,18 @@
 
 This task scheduler is designed to be used from inside your own program.
 You can schedule Python functions to be called at specific intervals or
-days. It uses the standard 'sched' module for the actual task scheduling,
-but provides much more:
+days. Pending tasks are kept in a heap ordered on a monotonic clock, so
+wall-clock steps (NTP, DST) don't shift the cadence of interval tasks, and
+the scheduler thread sleeps until the next task is due or the queue
+changes, without polling. It provides:
 
 * repeated tasks (at intervals, or on specific days)
 * error handling (exceptions in tasks don't kill the scheduler)
 * optional to run scheduler in its own thread or separate process
 * optional to run a task in its own thread or separate process
+* optional alignment of interval tasks to wall-clock boundaries
+* overrun policies for interval tasks that take longer than their interval
+* cancellation of tasks by name and introspection of the schedule
 
 If the threading module is available, you can use the various Threaded
 variants of the scheduler and associated tasks. If threading is not
@@ -21,6 +26,10 @@ There are three Scheduler classes:
 
     Scheduler    ThreadedScheduler    ForkedScheduler
 
+The ThreadedScheduler also owns a fixed size WorkerPool, so tasks can be run
+on a bounded set of threads (pooled processing) instead of on a new thread
+for every run.
+
 You usually add new tasks to a scheduler using the add_interval_task or
 add_daytime_task methods, with the appropriate processmethod argument
 to select sequential, threaded or forked processing. NOTE: it is impossible
@@ -33,19 +42,22 @@ and use schedule_task or schedule_task_abs:
     WeekdayTask     ThreadedWeekdayTask     ForkedWeekdayTask
     MonthdayTask    ThreadedMonthdayTask    ForkedMonthdayTask
 
+    PooledIntervalTask    PooledSingleTask
+    PooledWeekdayTask     PooledMonthdayTask
+
 Kronos is the Greek God of Time.
 
 Kronos scheduler (c) Irmen de Jong.
 This version has been extracted from the Turbogears source repository
-and slightly changed to be completely stand-alone again. Also some fixes
-have been made to make it work on Python 2.6 (sched module changes).
+and slightly changed to be completely stand-alone again. The 'sched' module
+based engine has since been replaced with a monotonic heap scheduler.
 The version in Turbogears is based on the original stand-alone Kronos.
 This is open-source software, released under the MIT Software License:
 http://www.opensource.org/licenses/mit-license.php
 
 """
 
-__version__ = "2.0"
+__version__ = "3.0"
 
 __all__ = [
     "DayTaskRescheduler",
@@ -67,79 +79,166 @@ __all__ = [
     "ThreadedTaskMixin",
     "ThreadedWeekdayTask",
     "WeekdayTask",
+    "PooledIntervalTask",
+    "PooledMonthdayTask",
+    "PooledSingleTask",
+    "PooledTaskMixin",
+    "PooledWeekdayTask",
+    "WorkerPool",
 ]
 
 import os
 import sys
-import sched
+import math
+import errno
+import heapq
 import time
+import select
 import logging
+import threading
 import traceback
 import weakref
+import Queue
+
+from diamond.stats import registry
+
+
+def _get_monotonic():
+    """Return a monotonic clock function, falling back to time.time."""
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    if not sys.platform.startswith('linux'):
+        return time.time
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long),
+                        ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'libc.so.6',
+                            use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+
+        def monotonic():
+            t = timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return t.tv_sec + t.tv_nsec * 1e-9
+
+        monotonic()
+        return monotonic
+    except (ImportError, OSError, AttributeError):
+        return time.time
+
+monotonic = _get_monotonic()
 
 
 class method:
     sequential = "sequential"
     forked = "forked"
     threaded = "threaded"
+    pooled = "pooled"
 
 
-class SchedulerNotRunning(Exception):
-    """Interrupt a running scheduler.
+class Wakeup:
+    """Lets the scheduler sleep until its next task is due, or until it is
+    woken up for a new first task.
 
-    This exception is used to break out of sched.sched.run when we
-    are not running.
+    Condition.wait with a timeout polls every 50ms on Python 2, so the
+    scheduler waits in select() on a pipe instead, which blocks until the
+    timeout or until a byte is written. A wakeup sent before the wait
+    starts is kept in the pipe and ends the next wait at once. Without
+    pipes that can be selected on (Windows) it falls back to an Event.
 
     """
-    pass
+
+    def __init__(self):
+        self.event = None
+        try:
+            import fcntl
+            self.read_fd, self.write_fd = os.pipe()
+            for fd in (self.read_fd, self.write_fd):
+                flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        except (ImportError, OSError):
+            self.event = threading.Event()
+
+    def wait(self, timeout=None):
+        """Sleep until woken up or timeout seconds have passed."""
+        if self.event is not None:
+            self.event.wait(timeout)
+            self.event.clear()
+            return
+        try:
+            select.select([self.read_fd], [], [], timeout)
+        except select.error, e:
+            # Interrupted by a signal, the caller checks its state again
+            if e.args[0] != errno.EINTR:
+                raise
+        try:
+            while os.read(self.read_fd, 4096):
+                pass
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def notify(self):
+        """Wake up the waiting thread, or the next one to wait."""
+        if self.event is not None:
+            self.event.set()
+            return
+        try:
+            os.write(self.write_fd, 'x')
+        except OSError, e:
+            # A full pipe holds plenty of wakeups already
+            if e.errno != errno.EAGAIN:
+                raise
 
 
 class Scheduler:
     """The Scheduler itself."""
 
+    # Longest time the scheduler sleeps without checking its queue, so a
+    # stop requested from a signal handler is always seen
+    MAX_WAIT = 60
+
     def __init__(self):
         self.running = True
         self.log = logging.getLogger('diamond')
-        self.sched = sched.scheduler(time.time, self.__delayfunc)
-
-    def __delayfunc(self, delay):
-        # This delay function is basically a time.sleep() that is
-        # divided up, so that we can check the self.running flag while
-        # delaying. There is an additional check in here to ensure that the
-        # top item of the queue hasn't changed
-        if delay < 10:
-            time.sleep(delay)
-        else:
-            toptime = self._getqueuetoptime()
-            endtime = time.time() + delay
-            period = 5
-            stoptime = endtime - period
-            while (self.running
-                    and stoptime > time.time()
-                    and self._getqueuetoptime() == toptime):
-                time.sleep(period)
-
-            if self.running and self._getqueuetoptime() == toptime:
-                now = time.time()
-                if endtime > now:
-                    time.sleep(endtime - now)
-
-        if not self.running:
-            raise SchedulerNotRunning()
+        # Heap of [monotonic time, sequence, task] entries. Cancelled
+        # entries stay in the heap with their task set to None.
+        self._queue = []
+        self._sequence = 0
+        self._pending = 0
+        # Known tasks by name
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._wakeup = Wakeup()
 
     def _acquire_lock(self):
-        pass
+        """Lock the task queue."""
+        self._lock.acquire()
 
     def _release_lock(self):
-        pass
+        """Release the lock on the task queue."""
+        self._lock.release()
 
     def add_interval_task(self, action, taskname, initialdelay, interval,
-                          processmethod, args, kw, abs=False):
+                          processmethod, args, kw, abs=False, align=False,
+                          concurrency=1, overrun=None, backoff_max=None):
         """Add a new Interval Task to the schedule.
 
-        A very short initialdelay or one of zero cannot be honored, you will
-        see a slight delay before the task is first executed. This is because
-        the scheduler needs to pick it up in its loop.
+        If align is set the task runs on the wall-clock multiples of its
+        interval instead of after initialdelay, so tasks with the same
+        interval fire at the same time on every host. For pooled tasks
+        concurrency limits how many runs may be queued or running at once.
+        overrun selects what happens when a run takes longer than the
+        interval, see IntervalTask.set_overrun_policy.
 
         """
         if initialdelay < 0 or interval < 1:
@@ -152,14 +251,23 @@ class Scheduler:
             TaskClass = ThreadedIntervalTask
         elif processmethod == method.forked:
             TaskClass = ForkedIntervalTask
+        elif processmethod == method.pooled:
+            TaskClass = PooledIntervalTask
         else:
             raise ValueError("Invalid processmethod")
         if not args:
             args = []
         if not kw:
             kw = {}
-        task = TaskClass(taskname, interval, action, args, kw, abs)
-        self.schedule_task(task, initialdelay)
+        task = TaskClass(taskname, interval, action, args, kw, abs, align)
+        if processmethod == method.pooled:
+            task.max_concurrency = concurrency
+        if overrun is not None:
+            task.set_overrun_policy(overrun, backoff_max)
+        if align:
+            self.schedule_task_aligned(task, interval)
+        else:
+            self.schedule_task(task, initialdelay)
         return task
 
     def add_single_task(self, action, taskname, initialdelay, processmethod,
@@ -174,6 +282,8 @@ class Scheduler:
             TaskClass = ThreadedSingleTask
         elif processmethod == method.forked:
             TaskClass = ForkedSingleTask
+        elif processmethod == method.pooled:
+            TaskClass = PooledSingleTask
         else:
             raise ValueError("Invalid processmethod")
         if not args:
@@ -203,6 +313,8 @@ class Scheduler:
                 TaskClass = ThreadedWeekdayTask
             elif processmethod == method.forked:
                 TaskClass = ForkedWeekdayTask
+            elif processmethod == method.pooled:
+                TaskClass = PooledWeekdayTask
             else:
                 raise ValueError("Invalid processmethod")
             task = TaskClass(taskname, weekdays, timeonday, action, args, kw)
@@ -215,6 +327,8 @@ class Scheduler:
                 TaskClass = ThreadedMonthdayTask
             elif processmethod == method.forked:
                 TaskClass = ForkedMonthdayTask
+            elif processmethod == method.pooled:
+                TaskClass = PooledMonthdayTask
             else:
                 raise ValueError("Invalid processmethod")
             task = TaskClass(taskname, monthdays, timeonday, action, args, kw)
@@ -228,17 +342,7 @@ class Scheduler:
         Low-level method for internal use.
 
         """
-        if self.running:
-            # lock the sched queue, if needed
-            self._acquire_lock()
-            try:
-                task.event = self.sched.enter(delay, 0, task,
-                                             (weakref.ref(self),))
-            finally:
-                self._release_lock()
-        else:
-            task.event = self.sched.enter(delay, 0, task,
-                                         (weakref.ref(self),))
+        self._push(task, monotonic() + delay)
 
     def schedule_task_abs(self, task, abstime):
         """Add a new task to the scheduler for the given absolute time value.
@@ -246,17 +350,41 @@ class Scheduler:
         Low-level method for internal use.
 
         """
-        if self.running:
-            # lock the sched queue, if needed
-            self._acquire_lock()
-            try:
-                task.event = self.sched.enterabs(abstime, 0, task,
-                                                (weakref.ref(self),))
-            finally:
-                self._release_lock()
-        else:
-            task.event = self.sched.enterabs(abstime, 0, task,
-                                            (weakref.ref(self),))
+        self._push(task, monotonic() + abstime - time.time())
+
+    def schedule_task_aligned(self, task, interval):
+        """Add a new task to the scheduler for the next wall-clock multiple
+        of interval.
+
+        Low-level method for internal use.
+
+        """
+        now = time.time()
+        abstime = (math.floor(now / interval) + 1) * interval
+        # Never fire twice for the same boundary, even if the wall clock
+        # was stepped back
+        if task.aligned_time is not None:
+            abstime = max(abstime, task.aligned_time + interval)
+        task.aligned_time = abstime
+        self._push(task, monotonic() + abstime - now)
+
+    def _push(self, task, when):
+        """Put a task on the heap to run at the given monotonic time."""
+        self._acquire_lock()
+        try:
+            if task.cancelled or not self.running:
+                return
+            self._sequence += 1
+            entry = [when, self._sequence, task]
+            heapq.heappush(self._queue, entry)
+            self._pending += 1
+            task.event = entry
+            self._tasks[task.name] = task
+            # Wake up the scheduler if this is now the first task
+            if self._queue[0] is entry:
+                self._wakeup.notify()
+        finally:
+            self._release_lock()
 
     def start(self):
         """Start the scheduler."""
@@ -264,47 +392,138 @@ class Scheduler:
 
     def stop(self):
         """Remove all pending tasks and stop the Scheduler."""
-        self.running = False
+        self._acquire_lock()
+        try:
+            self.running = False
+            self._wakeup.notify()
+        finally:
+            self._release_lock()
         # Pending tasks are removed in _run.
 
     def cancel(self, task):
         """Cancel given scheduled task."""
-        self.sched.cancel(task.event)
-
-    if sys.version_info >= (2, 6):
-        # code for sched module of python 2.6+
-        def _getqueuetoptime(self):
-            return self.sched._queue[0].time
+        self._acquire_lock()
+        try:
+            task.cancelled = True
+            entry = task.event
+            if entry is not None and entry[2] is task:
+                entry[2] = None
+                self._pending -= 1
+            task.event = None
+            if self._tasks.get(task.name) is task:
+                del self._tasks[task.name]
+        finally:
+            self._release_lock()
+
+    def cancel_task(self, taskname):
+        """Cancel the scheduled task with the given name."""
+        task = self.get_task(taskname)
+        if task is not None:
+            self.cancel(task)
+
+    def get_task(self, taskname):
+        """Return the task with the given name, or None."""
+        return self._tasks.get(taskname)
+
+    def pending(self):
+        """Return the number of tasks waiting to be run."""
+        return self._pending
+
+    def next_run(self, taskname):
+        """Return the wall-clock time the named task will run next, or None
+        if it isn't scheduled."""
+        self._acquire_lock()
+        try:
+            task = self._tasks.get(taskname)
+            if task is None or task.event is None:
+                return None
+            return time.time() + task.event[0] - monotonic()
+        finally:
+            self._release_lock()
+
+    def get_task_stats(self):
+        """Return a dict of run statistics for every known task, by name."""
+        stats = {}
+        for name in self._tasks.keys():
+            task = self._tasks.get(name)
+            if task is None:
+                continue
+            stats[name] = {
+                'next_run': self.next_run(name),
+                'last_run': task.last_run,
+                'last_duration': task.last_duration,
+                'last_lag': task.last_lag,
+                'runs': task.runs,
+                'overruns': task.overruns,
+                'skipped': task.skipped,
+            }
+        return stats
+
+    def get_pool(self):
+        """Return the worker pool for pooled tasks, None if there is none."""
+        return None
+
+    def _clearschedqueue(self):
+        self._acquire_lock()
+        try:
+            self._queue[:] = []
+            self._pending = 0
+        finally:
+            self._release_lock()
 
-        def _clearschedqueue(self):
-            self.sched._queue[:] = []
+    def _next_task(self):
+        """Wait for the next task to become due and take it off the heap.
 
-    else:
-        # code for sched module of python 2.5 and older
-        def _getqueuetoptime(self):
-            return self.sched.queue[0][0]
+        Returns None once the scheduler is stopped.
 
-        def _clearschedqueue(self):
-            self.sched.queue[:] = []
+        """
+        while True:
+            self._acquire_lock()
+            try:
+                if not self.running:
+                    return None
+                timeout = self.MAX_WAIT
+                while self._queue:
+                    when, sequence, task = self._queue[0]
+                    if task is None:
+                        # Cancelled
+                        heapq.heappop(self._queue)
+                        continue
+                    now = monotonic()
+                    if when > now:
+                        timeout = min(when - now, self.MAX_WAIT)
+                        break
+                    heapq.heappop(self._queue)
+                    self._pending -= 1
+                    task.event = None
+                    task.scheduled_at = when
+                    task.last_lag = now - when
+                    registry.timing('scheduler.lag', task.last_lag)
+                    return task
+            finally:
+                self._release_lock()
+            self._wakeup.wait(timeout)
 
     def _run(self):
         # Low-level run method to do the actual scheduling loop.
         while self.running:
             try:
-                self.sched.run()
-            except SchedulerNotRunning:
-                self._clearschedqueue()
+                task = self._next_task()
+                if task is not None:
+                    task(weakref.ref(self))
             except Exception, x:
                 self.log.error("ERROR DURING SCHEDULER EXECUTION %s \n %s", x,
                         "".join(traceback.format_exception(*sys.exc_info())))
-            # queue is empty; sleep a short while before checking again
-            if self.running:
-                time.sleep(5)
+        self._clearschedqueue()
 
 
 class Task(object):
     """Abstract base class of all scheduler tasks"""
 
+    # Set when a run came due while the previous one was still going and
+    # should follow it as soon as it is done
+    run_pending = False
+
     def __init__(self, name, action, args, kw):
         """This is an abstract class!"""
         self.name = name
@@ -312,6 +531,18 @@ class Task(object):
         self.args = args
         self.kw = kw
         self.log = logging.getLogger('diamond')
+        self.event = None
+        self.cancelled = False
+        self.aligned_time = None
+        # Monotonic time the current run was scheduled for
+        self.scheduled_at = None
+        # Run statistics
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_duration = 0.0
+        self.last_lag = 0.0
 
     def __call__(self, schedulerref):
         """Execute the task action in the scheduler's thread."""
@@ -328,7 +559,28 @@ class Task(object):
 
     def execute(self):
         """Execute the actual task."""
-        self.action(*self.args, **self.kw)
+        self.last_run = time.time()
+        start_time = monotonic()
+        try:
+            self.action(*self.args, **self.kw)
+        finally:
+            self.last_duration = monotonic() - start_time
+            self.runs += 1
+
+    def execute_pending(self):
+        """Execute the task, followed by any run that came due meanwhile."""
+        self.run_pending = True
+        while self.run_pending:
+            self.run_pending = False
+            try:
+                self.execute()
+            except Exception, x:
+                self.handle_exception(x)
+
+    def overlaps(self):
+        """Called when the task comes due while its previous run is still
+        going. Returns whether another run should be started anyway."""
+        return True
 
     def handle_exception(self, exc):
         """Handle any exception that occured during task execution."""
@@ -346,28 +598,92 @@ class SingleTask(Task):
 class IntervalTask(Task):
     """A repeated task that occurs at certain intervals (in seconds)."""
 
-    def __init__(self, name, interval, action, args=None, kw=None, abs=False):
+    # Overrun policies
+    SKIP = 'skip'
+    LATE = 'late'
+    BACKOFF = 'backoff'
+    OVERRUN_POLICIES = (SKIP, LATE, BACKOFF)
+
+    def __init__(self, name, interval, action, args=None, kw=None, abs=False,
+                 align=False):
         Task.__init__(self, name, action, args, kw)
         self.absolute = abs
+        self.align = align
         self.interval = interval
-        self.duration = 0
+        self.current_interval = interval
+        self.duration = 0.0
+        self.overrun_policy = self.SKIP
+        self.backoff_max = interval * 8
+
+    def set_overrun_policy(self, policy, backoff_max=None):
+        """Select what happens when a run takes longer than the interval.
+
+        skip     drop the runs that were missed and continue on the
+                 original cadence
+        late     run once more as soon as the overrunning run is done
+        backoff  double the interval after every overrun, up to backoff_max
+                 seconds, and return to the interval after a run that fits
+
+        """
+        policy = policy.lower().strip()
+        if policy not in self.OVERRUN_POLICIES:
+            raise ValueError("Invalid overrun policy: %s" % policy)
+        self.overrun_policy = policy
+        if backoff_max:
+            self.backoff_max = max(backoff_max, self.interval)
 
     def execute(self):
         """ Execute the actual task."""
-        start_time = time.time()
-        self.action(*self.args, **self.kw)
-        end_time = time.time()
-        self.duration = int(end_time - start_time)
+        try:
+            Task.execute(self)
+        finally:
+            self.duration = self.last_duration
+            if self.duration > self.interval:
+                self.overruns += 1
+                if (self.overrun_policy == self.BACKOFF
+                        and self.duration > self.current_interval):
+                    self.current_interval = min(self.current_interval * 2,
+                                                self.backoff_max)
+                    self.log.warn("Task %s took %.3fs, backing off to %ss.",
+                                  self.name, self.duration,
+                                  self.current_interval)
+            else:
+                self.current_interval = self.interval
+
+    def overlaps(self):
+        """The previous run is still going, apply the overrun policy."""
+        if self.overrun_policy == self.LATE:
+            self.run_pending = True
+        else:
+            self.skip(1)
+        return False
+
+    def skip(self, count):
+        """Count runs that were dropped because of an overrun."""
+        self.skipped += count
+        self.log.warn("Task %s overran its interval of %ss, skipped %d run(s).",
+                      self.name, self.interval, count)
 
     def reschedule(self, scheduler):
         """Reschedule this task according to its interval (in seconds)."""
-        if self.absolute and self.duration:
-            if self.duration < self.interval:
-                scheduler.schedule_task(self, self.interval - self.duration)
-            else:
+        if self.align:
+            scheduler.schedule_task_aligned(self, self.current_interval)
+        elif self.absolute and self.scheduled_at is not None:
+            # Keep the cadence of the time this run was scheduled for
+            now = monotonic()
+            due = self.scheduled_at + self.current_interval
+            if due > now:
+                scheduler.schedule_task(self, due - now)
+            elif self.overrun_policy == self.LATE:
                 scheduler.schedule_task(self, 0)
+            else:
+                # Carry on at the next slot, backed off or not
+                missed = int((now - due) / self.current_interval) + 1
+                self.skip(missed)
+                scheduler.schedule_task(
+                    self, due + missed * self.current_interval - now)
         else:
-            scheduler.schedule_task(self, self.interval)
+            scheduler.schedule_task(self, self.current_interval)
 
 
 class DayTaskRescheduler:
@@ -451,82 +767,270 @@ class MonthdayTask(DayTaskRescheduler, Task):
             self.action(*self.args, **self.kw)
 
 
-try:
-    import threading
+class ThreadedScheduler(Scheduler):
+    """A Scheduler that runs in its own thread."""
 
-    class ThreadedScheduler(Scheduler):
-        """A Scheduler that runs in its own thread."""
+    def __init__(self, pool_size=4):
+        Scheduler.__init__(self)
+        self.pool_size = pool_size
+        self.pool = None
 
-        def __init__(self):
-            Scheduler.__init__(self)
-            # we require a lock around the task queue
-            self._lock = threading.Lock()
+    def start(self):
+        """Splice off a thread in which the scheduler will run."""
+        self.thread = threading.Thread(target=self._run)
+        self.thread.setDaemon(True)
+        self.thread.start()
 
-        def start(self):
-            """Splice off a thread in which the scheduler will run."""
-            self.thread = threading.Thread(target=self._run)
-            self.thread.setDaemon(True)
-            self.thread.start()
+    def stop(self):
+        """Stop the scheduler and wait for the thread to finish."""
+        Scheduler.stop(self)
+        try:
+            self.thread.join()
+        except AttributeError:
+            pass
+        if self.pool is not None:
+            self.pool.stop()
+
+    def get_pool(self):
+        """Return the worker pool, starting it on first use."""
+        if self.pool is None:
+            self.pool = WorkerPool(self.pool_size)
+        return self.pool
+
+
+class WorkerPool:
+    """A fixed number of threads running the tasks submitted to it."""
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError("Pool size must be >0")
+        self.size = size
+        self.log = logging.getLogger('diamond')
+        self.queue = Queue.Queue()
+        self.lock = threading.Lock()
+        # Statistics
+        self.busy = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_last = 0.0
+        self.wait_max = 0.0
+        self.wait_total = 0.0
+        self.busy_time = 0.0
+        self.started = monotonic()
+        self.threads = []
+        for i in range(size):
+            thread = threading.Thread(target=self._work,
+                                      name='WorkerPool-%d' % i)
+            thread.setDaemon(True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, task):
+        """Queue a task run, unless the task already has as many runs queued
+        or running as its max_concurrency allows. Returns True if the run
+        was queued."""
+        self.lock.acquire()
+        try:
+            if task.active >= task.max_concurrency:
+                self.rejected += 1
+                return False
+            task.active += 1
+            self.submitted += 1
+        finally:
+            self.lock.release()
+        self.queue.put((task, monotonic()))
+        return True
 
-        def stop(self):
-            """Stop the scheduler and wait for the thread to finish."""
-            Scheduler.stop(self)
+    def stop(self):
+        """Stop the worker threads once they finish their current task."""
+        for thread in self.threads:
+            self.queue.put(None)
+
+    def get_stats(self):
+        """Return a dict of pool statistics. Times are in seconds."""
+        self.lock.acquire()
+        try:
+            if self.completed:
+                wait_avg = self.wait_total / self.completed
+            else:
+                wait_avg = 0.0
+            return {
+                'size': self.size,
+                'busy': self.busy,
+                'queued': self.queue.qsize(),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait_last': self.wait_last,
+                'wait_max': self.wait_max,
+                'wait_avg': wait_avg,
+                'wait_total': self.wait_total,
+                'busy_time': self.busy_time,
+                'uptime': monotonic() - self.started,
+            }
+        finally:
+            self.lock.release()
+
+    def _work(self):
+        # Worker thread loop
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            task, queued_at = item
+            start_time = monotonic()
+            self.lock.acquire()
             try:
-                self.thread.join()
-            except AttributeError:
-                pass
+                wait = start_time - queued_at
+                self.wait_last = wait
+                self.wait_total += wait
+                if wait > self.wait_max:
+                    self.wait_max = wait
+                self.busy += 1
+            finally:
+                self.lock.release()
+            try:
+                task.pooledcall()
+            finally:
+                self.lock.acquire()
+                try:
+                    task.active -= 1
+                    self.busy -= 1
+                    self.completed += 1
+                    self.busy_time += monotonic() - start_time
+                finally:
+                    self.lock.release()
 
-        def _acquire_lock(self):
-            """Lock the thread's task queue."""
-            self._lock.acquire()
 
-        def _release_lock(self):
-            """Release the lock on the thread's task queue."""
-            self._lock.release()
+class ThreadedTaskMixin:
+    """A mixin class to make a Task execute in a separate thread."""
 
-    class ThreadedTaskMixin:
-        """A mixin class to make a Task execute in a separate thread."""
+    # Set while a run is going
+    running = False
 
-        def __call__(self, schedulerref):
-            """Execute the task action in its own thread."""
+    # Guards running and run_pending of all threaded tasks
+    _run_lock = threading.Lock()
+
+    def __call__(self, schedulerref):
+        """Execute the task action in its own thread."""
+        self._run_lock.acquire()
+        try:
+            start = not self.running or self.overlaps()
+            if start:
+                self.running = True
+        finally:
+            self._run_lock.release()
+        if start:
             threading.Thread(target=self.threadedcall).start()
-            self.reschedule(schedulerref())
+        self.reschedule(schedulerref())
 
-        def threadedcall(self):
-            # This method is run within its own thread, so we have to
-            # do the execute() call and exception handling here.
-            try:
-                self.execute()
-            except Exception, x:
-                self.handle_exception(x)
+    def threadedcall(self):
+        # This method is run within its own thread, so we have to
+        # do the execute() call and exception handling here. A run that
+        # came due meanwhile is picked up under the same lock that ends
+        # the run, so it can't be missed.
+        try:
+            while True:
+                try:
+                    self.execute()
+                except Exception, x:
+                    self.handle_exception(x)
+                self._run_lock.acquire()
+                try:
+                    if not self.run_pending:
+                        self.running = False
+                        return
+                    self.run_pending = False
+                finally:
+                    self._run_lock.release()
+        except:
+            self.running = False
+            raise
+
+
+class ThreadedIntervalTask(ThreadedTaskMixin, IntervalTask):
+    """Interval Task that executes in its own thread."""
+
+    def __init__(self, name, interval, action, args=None, kw=None,
+                 abs=False, align=False):
+        # Force abs to be False, as in threaded mode we reschedule
+        # immediately.
+        super(ThreadedIntervalTask, self).__init__(name, interval, action,
+                                                   args=args, kw=kw,
+                                                   abs=False, align=align)
+
+
+class ThreadedSingleTask(ThreadedTaskMixin, SingleTask):
+    """Single Task that executes in its own thread."""
+    pass
 
-    class ThreadedIntervalTask(ThreadedTaskMixin, IntervalTask):
-        """Interval Task that executes in its own thread."""
 
-        def __init__(self, name, interval, action, args=None, kw=None,
-                     abs=False):
-            # Force abs to be False, as in threaded mode we reschedule
-            # immediately.
-            super(ThreadedIntervalTask, self).__init__(name, interval, action,
-                                                       args=args, kw=kw,
-                                                       abs=False)
+class ThreadedWeekdayTask(ThreadedTaskMixin, WeekdayTask):
+    """Weekday Task that executes in its own thread."""
+    pass
 
-    class ThreadedSingleTask(ThreadedTaskMixin, SingleTask):
-        """Single Task that executes in its own thread."""
-        pass
 
-    class ThreadedWeekdayTask(ThreadedTaskMixin, WeekdayTask):
-        """Weekday Task that executes in its own thread."""
-        pass
+class ThreadedMonthdayTask(ThreadedTaskMixin, MonthdayTask):
+    """Monthday Task that executes in its own thread."""
+    pass
 
-    class ThreadedMonthdayTask(ThreadedTaskMixin, MonthdayTask):
-        """Monthday Task that executes in its own thread."""
-        pass
 
-except ImportError:
-    # threading is not available
+class PooledTaskMixin:
+    """A mixin class to make a Task execute on the scheduler's worker pool."""
+
+    # Runs that may be queued or running at the same time
+    max_concurrency = 1
+    active = 0
+
+    def __call__(self, schedulerref):
+        """Hand the task action to the worker pool."""
+        scheduler = schedulerref()
+        pool = scheduler.get_pool()
+        if self.active >= self.max_concurrency and not self.overlaps():
+            # Left to the overrun policy
+            pass
+        elif pool is None:
+            # No pool available, run in the scheduler's thread
+            self.pooledcall()
+        elif not pool.submit(self):
+            self.log.warn("Task %s still has %d runs pending, skipping.",
+                          self.name, self.active)
+        self.reschedule(scheduler)
+
+    def pooledcall(self):
+        # This method is run within a pool thread, so we have to
+        # do the execute() call and exception handling here.
+        self.execute_pending()
+
+
+class PooledIntervalTask(PooledTaskMixin, IntervalTask):
+    """Interval Task that executes on the worker pool."""
+
+    def __init__(self, name, interval, action, args=None, kw=None,
+                 abs=False, align=False):
+        # Force abs to be False, as in pooled mode we reschedule
+        # immediately.
+        super(PooledIntervalTask, self).__init__(name, interval, action,
+                                                 args=args, kw=kw,
+                                                 abs=False, align=align)
+
+
+class PooledSingleTask(PooledTaskMixin, SingleTask):
+    """Single Task that executes on the worker pool."""
+    pass
+
+
+class PooledWeekdayTask(PooledTaskMixin, WeekdayTask):
+    """Weekday Task that executes on the worker pool."""
     pass
 
+
+class PooledMonthdayTask(PooledTaskMixin, MonthdayTask):
+    """Monthday Task that executes on the worker pool."""
+    pass
+
+
 if hasattr(os, "fork"):
     import signal
 
@@ -549,7 +1053,7 @@ if hasattr(os, "fork"):
                 # we are the parent
                 self.childpid = pid
                 # can no longer insert in the scheduler queue
-                del self.sched
+                del self._queue
 
         def stop(self):
             """Stop the scheduler and wait for the process to finish."""
@@ -557,7 +1061,10 @@ if hasattr(os, "fork"):
             os.waitpid(self.childpid, 0)
 
         def signalhandler(self, sig, stack):
-            Scheduler.stop(self)
+            # The handler interrupts the scheduler's own thread, which may
+            # hold the queue lock, so only flag the stop and wake it up
+            self.running = False
+            self._wakeup.notify()
 
     class ForkedTaskMixin:
         """A mixin class to make a Task execute in a separate process."""
@@ -580,12 +1087,12 @@ if hasattr(os, "fork"):
         """Interval Task that executes in its own process."""
 
         def __init__(self, name, interval, action, args=None, kw=None,
-                     abs=False):
+                     abs=False, align=False):
             # Force abs to be False, as in forked mode we reschedule
             # immediately.
             super(ForkedIntervalTask, self).__init__(name, interval, action,
                                                      args=args, kw=kw,
-                                                     abs=False)
+                                                     abs=False, align=align)
 
     class ForkedSingleTask(ForkedTaskMixin, SingleTask):
         """Single Task that executes in its own process."""
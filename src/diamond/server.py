@@ -17,7 +17,11 @@ sys.path.append(
 import diamond
 
 from diamond.collector import Collector
+from diamond.collector import str_to_bool
 from diamond.handler.Handler import Handler
+from diamond.handler.dispatcher import Dispatcher
+from diamond.internal import SchedulerCollector
+from diamond.internal import SelfCollector
 from diamond.scheduler import ThreadedScheduler
 from diamond.util import load_class_from_name
 
@@ -37,7 +41,11 @@ class Server(object):
         self.modules = {}
         self.tasks = {}
         # Initialize Scheduler
-        self.scheduler = ThreadedScheduler()
+        pool_size = 4
+        if 'server' in self.config:
+            pool_size = int(self.config['server'].get('collectors_pool_size',
+                                                      pool_size))
+        self.scheduler = ThreadedScheduler(pool_size)
 
     def load_config(self):
         """
@@ -104,7 +112,21 @@ class Server(object):
                     handler_config.merge(self.config['handlers'][cls.__name__])
 
                 # Initialize Handler class
-                self.handlers.append(cls(handler_config))
+                handler = cls(handler_config)
+
+                # Put a dispatch queue in front of the handler if configured
+                queue_size = int(handler_config.get('queue_size', 0))
+                if queue_size > 0:
+                    handler = Dispatcher(
+                        handler,
+                        queue_size,
+                        handler_config.get('queue_overflow',
+                                           Dispatcher.DROP_OLDEST),
+                        float(handler_config.get('queue_stop_timeout', 30)))
+                    self.log.debug("Queued Handler: %s (size %d, %s)", h,
+                                   queue_size, handler.policy)
+
+                self.handlers.append(handler)
 
             except ImportError:
                 # Log Error
@@ -285,6 +307,18 @@ class Server(object):
                     method = diamond.scheduler.method.threaded
                 elif c.config['method'] == 'Forked':
                     method = diamond.scheduler.method.forked
+                elif c.config['method'] == 'Pooled':
+                    method = diamond.scheduler.method.pooled
+
+            # Align runs to wall-clock multiples of the interval?
+            align = str_to_bool(c.config.get('align', False))
+
+            # Runs that may be queued or running at once in the pool
+            concurrency = int(c.config.get('max_concurrency', 1))
+
+            # What to do when a run takes longer than the interval
+            overrun = c.config.get('overrun_policy', 'skip')
+            backoff_max = float(c.config.get('overrun_backoff_max', 0))
 
             # Schedule Collector
             if interval_task:
@@ -295,7 +329,11 @@ class Server(object):
                                                         method,
                                                         args,
                                                         None,
-                                                        True)
+                                                        True,
+                                                        align,
+                                                        concurrency,
+                                                        overrun,
+                                                        backoff_max)
             else:
                 task = self.scheduler.add_single_task(func,
                                                       name,
@@ -338,6 +376,12 @@ class Server(object):
             # Schedule Collector
             self.schedule_collector(c)
 
+        # Setup internal Collectors
+        self.schedule_collector(SchedulerCollector(self.config,
+                                                   self.handlers,
+                                                   self.scheduler))
+        self.schedule_collector(SelfCollector(self.config, self.handlers))
+
         # Start main loop
         self.mainloop()
 
@@ -414,7 +458,7 @@ class Server(object):
                 time_since_reload = 0
 
             # Is the queue empty and we won't attempt to reload it? Exit
-            if not reload and len(self.scheduler.sched._queue) == 0:
+            if not reload and self.scheduler.pending() == 0:
                 self.running = False
 
         # Log
@@ -423,9 +467,28 @@ class Server(object):
         self.scheduler.stop()
         # Log
         self.log.info('Stopped task scheduler.')
+        # Send what is still queued for the handlers
+        self.stop_handlers()
         # Log
         self.log.debug("Exiting.")
 
+    def stop_handlers(self):
+        """
+        Drain the handler queues and stop their workers, then stop the
+        handlers that run threads of their own
+        """
+        for handler in self.handlers:
+            if isinstance(handler, Dispatcher):
+                self.log.debug("Draining queue of %s.", handler.name)
+                handler.stop()
+                handler = handler.handler
+            if hasattr(handler, 'stop'):
+                self.log.debug("Stopping %s.", handler.__class__.__name__)
+                try:
+                    handler.stop()
+                except Exception:
+                    self.log.error(traceback.format_exc())
+
     def stop(self):
         """
         Close all connections and terminate threads.
@@ -0,0 +1,117 @@
+# coding=utf-8
+
+"""
+Registry of statistics about Diamond itself. Collectors, handlers and the
+scheduler record into the module level `registry`, and the SelfCollector
+publishes what was recorded since its last run under diamond.self.*
+"""
+
+import bisect
+import threading
+
+
+class Histogram(object):
+    """
+    Distribution of durations, in seconds, over fixed buckets
+    """
+
+    # Upper bounds of the buckets, in seconds. Anything slower falls in a
+    # last, unbounded bucket.
+    BUCKETS = (0.001, 0.01, 0.1, 1, 10)
+
+    __slots__ = ['count', 'total', 'max', 'buckets']
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[bisect.bisect_left(self.BUCKETS, value)] += 1
+
+    def get_buckets(self):
+        """
+        Return (name, count) pairs for the buckets, named after their upper
+        bound in ms
+        """
+        names = ['le_%gms' % (bound * 1000) for bound in self.BUCKETS]
+        names.append('inf')
+        return zip(names, self.buckets)
+
+
+class Registry(object):
+    """
+    Counters, gauges and duration histograms by dotted name. Counters and
+    histograms cover the window since the last call to collect, gauges keep
+    their last value.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def incr(self, name, count=1):
+        """
+        Add count to a counter
+        """
+        self.lock.acquire()
+        try:
+            self.counters[name] = self.counters.get(name, 0) + count
+        finally:
+            self.lock.release()
+
+    def gauge(self, name, value):
+        """
+        Set a gauge
+        """
+        self.lock.acquire()
+        try:
+            self.gauges[name] = value
+        finally:
+            self.lock.release()
+
+    def timing(self, name, seconds):
+        """
+        Add a duration to a histogram
+        """
+        self.lock.acquire()
+        try:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+        finally:
+            self.lock.release()
+
+    def collect(self):
+        """
+        Return the (counters, gauges, histograms) recorded since the last
+        call and start a new window
+        """
+        self.lock.acquire()
+        try:
+            counters, self.counters = self.counters, {}
+            histograms, self.histograms = self.histograms, {}
+            gauges = dict(self.gauges)
+        finally:
+            self.lock.release()
+        return counters, gauges, histograms
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+        finally:
+            self.lock.release()
+
+
+registry = Registry()
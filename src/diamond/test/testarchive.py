@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import os
+import gzip
+import shutil
+import tempfile
+
+from diamond.archive import ArchiveWriter
+from diamond.archive import MAGIC
+from diamond.archive import read_archive
+from diamond.metric import Metric
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'archive.log')
+        self.metrics = [
+            Metric('servers.host1.cpu.total.idle', 10.5, timestamp=1234567,
+                   precision=1),
+            Metric('servers.host1.cpu.total.user', 3, timestamp=1234567),
+            Metric('servers.host1.cpu.total.idle', 11.25, timestamp=1234577,
+                   precision=2),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path):
+        return [(m.path, float(m.value), m.timestamp, m.precision)
+                for m in read_archive(path)]
+
+    def expected(self):
+        return [(m.path, float(m.value), m.timestamp, m.precision)
+                for m in self.metrics]
+
+    def test_buffered_until_flush(self):
+        writer = ArchiveWriter(self.path)
+        writer.write_many(self.metrics)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        writer.flush()
+        self.assertEqual(open(self.path).read(),
+                         ''.join([str(m) for m in self.metrics]))
+        writer.close()
+
+    def test_buffer_size(self):
+        writer = ArchiveWriter(self.path, buffer_size=1)
+        writer.write(self.metrics[0])
+        self.assertEqual(open(self.path).read(), str(self.metrics[0]))
+        writer.close()
+
+    def test_text_round_trip(self):
+        writer = ArchiveWriter(self.path)
+        writer.write_many(self.metrics)
+        writer.close()
+        self.assertEqual(self.read(self.path), self.expected())
+
+    def test_binary_round_trip(self):
+        writer = ArchiveWriter(self.path, binary=True, rotate='none')
+        writer.write_many(self.metrics[:2])
+        writer.flush()
+        writer.write(self.metrics[2])
+        writer.close()
+        data = open(self.path, 'rb').read()
+        self.assertTrue(data.startswith(MAGIC))
+        # The repeated path is only defined once
+        self.assertEqual(data.count('servers.host1.cpu.total.idle'), 1)
+        self.assertEqual(self.read(self.path), self.expected())
+
+    def test_rotate_on_size(self):
+        writer = ArchiveWriter(self.path, binary=True, rotate='none',
+                               max_bytes=1)
+        writer.write(self.metrics[0])
+        writer.flush()
+        writer.write(self.metrics[1])
+        writer.flush()
+        writer.close()
+        writer.wait()
+
+        rotated = [name for name in os.listdir(self.tmpdir)
+                   if name != 'archive.log']
+        self.assertEqual(len(rotated), 1)
+        self.assertTrue(rotated[0].endswith('.gz'))
+        rotated = os.path.join(self.tmpdir, rotated[0])
+        self.assertTrue(gzip.GzipFile(rotated).read().startswith(MAGIC))
+        self.assertEqual(self.read(rotated), self.expected()[:1])
+        # Path ids start over in the new file
+        self.assertEqual(self.read(self.path), self.expected()[1:2])
+
+    @patch('time.time')
+    def test_rotate_at_midnight(self, time):
+        time.return_value = 1000
+        writer = ArchiveWriter(self.path, compression='bz2')
+        writer.write(self.metrics[0])
+        writer.flush()
+        time.return_value = writer.rollover_at
+        writer.write(self.metrics[1])
+        writer.close()
+        writer.wait()
+
+        rotated = [name for name in os.listdir(self.tmpdir)
+                   if name != 'archive.log']
+        self.assertEqual(len(rotated), 1)
+        self.assertTrue(rotated[0].endswith('.bz2'))
+        self.assertEqual(self.read(os.path.join(self.tmpdir, rotated[0])),
+                         self.expected()[:1])
+        self.assertEqual(self.read(self.path), self.expected()[1:2])
+
+    def test_backup_count(self):
+        writer = ArchiveWriter(self.path, rotate='none', max_bytes=1,
+                               backup_count=2, compression=None)
+        for i in xrange(5):
+            writer.write(self.metrics[0])
+            writer.flush()
+        writer.close()
+        rotated = [name for name in os.listdir(self.tmpdir)
+                   if name != 'archive.log']
+        self.assertEqual(len(rotated), 2)
+
+    def test_reopen_binary(self):
+        writer = ArchiveWriter(self.path, binary=True)
+        writer.write(self.metrics[0])
+        writer.close()
+
+        # A binary file is never appended to, its path ids are gone
+        writer = ArchiveWriter(self.path, binary=True, compression=None)
+        writer.write(self.metrics[1])
+        writer.close()
+        rotated = [name for name in os.listdir(self.tmpdir)
+                   if name != 'archive.log']
+        self.assertEqual(len(rotated), 1)
+        self.assertEqual(self.read(self.path), self.expected()[1:2])
+
+    def test_reopen_text(self):
+        writer = ArchiveWriter(self.path)
+        writer.write(self.metrics[0])
+        writer.close()
+        writer = ArchiveWriter(self.path)
+        writer.write(self.metrics[1])
+        writer.close()
+        self.assertEqual(os.listdir(self.tmpdir), ['archive.log'])
+        self.assertEqual(self.read(self.path), self.expected()[:2])
+
+################################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -3,9 +3,11 @@
 ################################################################################
 
 from test import unittest
+from mock import Mock
 import configobj
 
 from diamond.collector import Collector
+from diamond.metric import Metric
 
 
 class BaseCollectorTest(unittest.TestCase):
@@ -20,3 +22,82 @@ class BaseCollectorTest(unittest.TestCase):
         }
         c = Collector(config, [])
         self.assertEquals('custom.localhost', c.get_hostname())
+
+    def test_publish_many(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+        }
+        handler = Mock()
+        c = Collector(config, [handler])
+
+        c.publish_many([('load', 1.5, 'GAUGE', 1),
+                        ('requests', 10, 'COUNTER')])
+
+        self.assertEqual(handler._process_batch.call_count, 1)
+        metrics = handler._process_batch.call_args[0][0]
+        self.assertEqual([m.path for m in metrics], [
+            'servers.custom.localhost.Collector.load',
+            'servers.custom.localhost.Collector.requests'])
+        self.assertEqual(metrics[0].value, 1.5)
+        self.assertEqual(metrics[0].precision, 1)
+        self.assertEqual(metrics[1].metric_type, 'COUNTER')
+        self.assertEqual(metrics[1].raw_value, 10)
+        # First sample of a counter has no derivative yet
+        self.assertEqual(metrics[1].value, 0)
+
+    def test_path_components(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+            'path_suffix': 'rack1',
+            'path': 'cpu',
+        }
+        handler = Mock()
+        c = Collector(config, [handler])
+
+        c.publish('total.idle', 1)
+
+        metric = handler._process.call_args[0][0]
+        self.assertEqual(metric.path,
+                         'servers.custom.localhost.rack1.cpu.total.idle')
+        self.assertEqual(metric.getPathPrefix(), 'servers')
+        self.assertEqual(metric.host, 'custom.localhost')
+        self.assertEqual(metric.getCollectorPath(), 'rack1')
+        self.assertEqual(metric.getMetricPath(), 'cpu.total.idle')
+        # The template is only built once
+        self.assertTrue(c.get_path_template() is c.get_path_template())
+
+    def test_path_components_as_parsed(self):
+        """
+        The components filled in from the template are those Metric would
+        parse from the path
+        """
+        for collector_config in (
+            {'hostname': 'host1', 'path_suffix': 'rack1', 'path': 'cpu'},
+            {'hostname': 'host1', 'path': 'haproxy.frontend'},
+            {'hostname': 'host1', 'path': 'cpu', 'path_prefix': 'a.b'},
+            {'hostname': 'host1', 'path': '.', 'path_suffix': 'rack1'},
+        ):
+            config = configobj.ConfigObj()
+            config['server'] = {}
+            config['server']['collectors_config_path'] = ''
+            config['collectors'] = {}
+            config['collectors']['default'] = collector_config
+            handler = Mock()
+            c = Collector(config, [handler])
+
+            c.publish('total.idle', 1)
+
+            metric = handler._process.call_args[0][0]
+            parsed = Metric(metric.path, 1, host='host1')
+            self.assertEqual(metric.getPathPrefix(), parsed.getPathPrefix())
+            self.assertEqual(metric.getCollectorPath(),
+                             parsed.getCollectorPath())
+            self.assertEqual(metric.getMetricPath(), parsed.getMetricPath())
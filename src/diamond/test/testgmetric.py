@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+from xdrlib import Packer
+from xdrlib import Unpacker
+
+from diamond.gmetric import Gmetric
+from diamond.gmetric import gmetric_write
+from diamond.gmetric import pack_string
+
+
+class TestGmetric(unittest.TestCase):
+
+    def test_pack_string(self):
+        for value in ('', '1', '12', '123', '1234', '12345'):
+            packer = Packer()
+            packer.pack_string(value)
+            self.assertEqual(pack_string(value), packer.get_buffer())
+
+    def test_write(self):
+        meta, data = gmetric_write('cpu.idle', 12.5, 'double', '', 'both',
+                                   60, 0, 'cpu', 'host1')
+        unpacker = Unpacker(data)
+        self.assertEqual(unpacker.unpack_int(), 133)
+        self.assertEqual(unpacker.unpack_string(), 'host1')
+        self.assertEqual(unpacker.unpack_string(), 'cpu.idle')
+        self.assertEqual(unpacker.unpack_int(), 0)
+        self.assertEqual(unpacker.unpack_string(), '%s')
+        self.assertEqual(unpacker.unpack_string(), '12.5')
+        unpacker.done()
+
+    @patch('socket.socket')
+    def test_metadata_cache(self, socket):
+        sendto = socket.return_value.sendto
+        g = Gmetric('gmond', 8649, 'udp', 'host1')
+        meta, data = gmetric_write('cpu.idle', 1, 'double', '', 'both', 60, 0,
+                                   '', 'host1')
+
+        g.send('cpu.idle', 1, 'double', '', 'both', 60, 0)
+        self.assertEqual([c[0][0] for c in sendto.call_args_list],
+                         [meta, data])
+
+        # Only the data until tmax has passed
+        sendto.reset_mock()
+        g.send('cpu.idle', 2, 'double', '', 'both', 60, 0)
+        self.assertEqual(sendto.call_count, 1)
+
+        g.metadata['cpu.idle'][3] -= 60
+        g.send('cpu.idle', 3, 'double', '', 'both', 60, 0)
+        self.assertEqual(sendto.call_count, 3)
+
+        # or the metadata changes
+        g.send('cpu.idle', 4, 'double', 'percent', 'both', 60, 0)
+        self.assertEqual(sendto.call_count, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
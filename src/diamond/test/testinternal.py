@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import CollectorTestCase
+from test import get_collector_config
+from test import unittest
+from mock import Mock
+from mock import patch
+
+from diamond.collector import Collector
+from diamond.internal import SchedulerCollector
+from diamond.internal import SelfCollector
+from diamond.stats import registry
+
+
+class TestSchedulerCollector(CollectorTestCase):
+
+    def setUp(self):
+        config = get_collector_config('SchedulerCollector', {})
+        self.scheduler = Mock()
+        self.scheduler.get_task_stats.return_value = {}
+        self.collector = SchedulerCollector(config, None, self.scheduler)
+
+    def pool_stats(self, **kwargs):
+        stats = {
+            'size': 4,
+            'busy': 1,
+            'queued': 0,
+            'completed': 0,
+            'rejected': 0,
+            'wait_max': 0.0,
+            'wait_total': 0.0,
+            'busy_time': 0.0,
+            'uptime': 0.0,
+        }
+        stats.update(kwargs)
+        return stats
+
+    @patch.object(Collector, 'publish_many')
+    def test_pool_metrics(self, publish_mock):
+        pool = self.scheduler.get_pool.return_value
+        pool.get_stats.return_value = self.pool_stats()
+        self.collector.collect()
+        publish_mock.reset_mock()
+
+        pool.get_stats.return_value = self.pool_stats(completed=10,
+                                                      rejected=1,
+                                                      wait_max=0.5,
+                                                      wait_total=2.0,
+                                                      busy_time=120.0,
+                                                      uptime=60.0)
+        self.collector.collect()
+
+        self.assertPublishedMany(publish_mock, {
+            'pool.size': 4,
+            'pool.wait_max_ms': 500,
+            'pool.wait_avg_ms': 200,
+            'pool.saturation_percent': 50,
+            'pool.completed': 10,
+            'pool.rejected': 1,
+        })
+
+    @patch.object(Collector, 'publish_many')
+    def test_no_pool(self, publish_mock):
+        self.scheduler.get_pool.return_value = None
+        self.collector.collect()
+        names = [c[0][0] for c in self.getPublishedCalls(publish_mock)]
+        self.assertFalse('pool.size' in names)
+
+    @patch.object(Collector, 'publish_many')
+    def test_task_metrics(self, publish_mock):
+        self.scheduler.get_pool.return_value = None
+        self.scheduler.get_task_stats.return_value = {
+            'CPUCollector': {'overruns': 2, 'skipped': 3,
+                             'last_duration': 0.25},
+        }
+        self.collector.collect()
+        publish_mock.reset_mock()
+
+        self.scheduler.get_task_stats.return_value = {
+            'CPUCollector': {'overruns': 3, 'skipped': 5,
+                             'last_duration': 1.5},
+        }
+        self.collector.collect()
+
+        self.assertPublishedMany(publish_mock, {
+            'tasks.CPUCollector.overruns': 1,
+            'tasks.CPUCollector.skipped': 2,
+            'tasks.CPUCollector.duration_ms': 1500,
+            'overruns': 1,
+            'skipped': 2,
+        })
+
+
+class TestSelfCollector(CollectorTestCase):
+
+    def setUp(self):
+        config = get_collector_config('SelfCollector', {})
+        self.dispatcher = Mock()
+        self.dispatcher.name = 'GraphiteHandler'
+        self.dispatcher.get_stats.return_value = {'queue_depth': 7,
+                                                  'dropped': 2,
+                                                  'latency_last': 0.002,
+                                                  'latency_max': 0.004,
+                                                  'latency_avg': 0.003}
+        self.collector = SelfCollector(config, [self.dispatcher])
+        registry.clear()
+
+    @patch.object(Collector, 'publish_many')
+    def test_publishes_registry(self, publish_mock):
+        registry.incr('collectors.CPUCollector.metrics', 12)
+        registry.timing('collectors.CPUCollector.duration', 0.25)
+        registry.timing('collectors.CPUCollector.duration', 0.75)
+
+        self.collector.collect()
+
+        self.assertPublishedMany(publish_mock, {
+            'collectors.CPUCollector.metrics': 12,
+            'collectors.CPUCollector.duration.count': 2,
+            'collectors.CPUCollector.duration.avg_ms': 500,
+            'collectors.CPUCollector.duration.max_ms': 750,
+            'collectors.CPUCollector.duration.le_1000ms': 2,
+            'handlers.GraphiteHandler.queue_depth': 7,
+            'handlers.GraphiteHandler.dropped': 2,
+            'handlers.GraphiteHandler.latency_last_ms': 2,
+            'handlers.GraphiteHandler.latency_max_ms': 4,
+            'handlers.GraphiteHandler.latency_avg_ms': 3,
+        })
+
+if __name__ == "__main__":
+    unittest.main()
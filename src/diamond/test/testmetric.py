@@ -83,3 +83,25 @@ class TestMetric(unittest.TestCase):
 
         message = 'Actual %s, expected %s' % (actual_value, expected_value)
         self.assertEqual(actual_value, expected_value, message)
+
+    def testPathComponents(self):
+        metric = Metric('servers.host.cpu.total.idle', 0, host='host',
+                        path_prefix='servers', collector_path='cpu',
+                        metric_path='total.idle')
+
+        self.assertEqual(metric.getPathPrefix(), 'servers')
+        self.assertEqual(metric.getCollectorPath(), 'cpu')
+        self.assertEqual(metric.getMetricPath(), 'total.idle')
+
+    def testRender(self):
+        metric = Metric('servers.host.cpu.total.idle', 1.23456,
+                        timestamp=1234567, precision=2)
+
+        self.assertEqual(str(metric), 'servers.host.cpu.total.idle 1.23 '
+                                      + '1234567\n')
+        # Rendering again returns the cached line
+        self.assertTrue(str(metric) is str(metric))
+
+    def testNoInstanceDict(self):
+        metric = Metric('servers.host.cpu.total.idle', 0)
+        self.assertFalse(hasattr(metric, '__dict__'))
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+
+from diamond.handler.Handler import Handler
+from diamond.stats import Histogram
+from diamond.stats import Registry
+from diamond.stats import registry
+
+
+class FailingHandler(Handler):
+
+    def process(self, metric):
+        raise ValueError(metric)
+
+
+class TestStats(unittest.TestCase):
+
+    def test_histogram_buckets(self):
+        histogram = Histogram()
+        for value in (0.0005, 0.001, 0.05, 30):
+            histogram.add(value)
+
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.max, 30)
+        self.assertEqual(dict(histogram.get_buckets()), {
+            'le_1ms': 2,
+            'le_10ms': 0,
+            'le_100ms': 1,
+            'le_1000ms': 0,
+            'le_10000ms': 0,
+            'inf': 1,
+        })
+
+    def test_collect_starts_new_window(self):
+        stats = Registry()
+        stats.incr('collectors.CPUCollector.metrics', 5)
+        stats.gauge('handlers.GraphiteHandler.queue_depth', 3)
+        stats.timing('scheduler.lag', 0.2)
+
+        counters, gauges, histograms = stats.collect()
+        self.assertEqual(counters, {'collectors.CPUCollector.metrics': 5})
+        self.assertEqual(histograms['scheduler.lag'].count, 1)
+
+        counters, gauges, histograms = stats.collect()
+        self.assertEqual(counters, {})
+        self.assertEqual(histograms, {})
+        self.assertEqual(gauges, {'handlers.GraphiteHandler.queue_depth': 3})
+
+    def test_handler_records_errors_and_latency(self):
+        registry.clear()
+        handler = FailingHandler()
+        handler._process('metric')
+        handler._process_batch(['metric1', 'metric2'])
+
+        # Only errors are recorded straight away
+        counters, gauges, histograms = registry.collect()
+        self.assertEqual(counters, {'handlers.FailingHandler.errors': 2})
+        self.assertEqual(histograms, {})
+
+        handler._flush()
+        counters, gauges, histograms = registry.collect()
+        self.assertEqual(counters['handlers.FailingHandler.metrics'], 3)
+        self.assertEqual(histograms['handlers.FailingHandler.process'].count,
+                         1)
+        self.assertEqual(
+            histograms['handlers.FailingHandler.lock_wait'].count, 1)
+        self.assertEqual(histograms['handlers.FailingHandler.flush'].count,
+                         1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import patch
+
+import threading
+import time
+
+from diamond import scheduler
+from diamond.scheduler import IntervalTask
+from diamond.scheduler import PooledSingleTask
+from diamond.scheduler import SingleTask
+from diamond.scheduler import Task
+from diamond.scheduler import ThreadedIntervalTask
+from diamond.scheduler import ThreadedScheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = ThreadedScheduler()
+        self.ran = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def action(self, name, last=False):
+        self.ran.append(name)
+        if last:
+            self.done.set()
+
+    def test_runs_in_time_order(self):
+        self.scheduler.add_single_task(self.action, 'b', 0.2,
+                                       scheduler.method.sequential,
+                                       ['b', True], None)
+        self.scheduler.add_single_task(self.action, 'a', 0.1,
+                                       scheduler.method.sequential,
+                                       ['a'], None)
+        self.assertEqual(self.scheduler.pending(), 2)
+
+        self.scheduler.start()
+        self.done.wait(5)
+
+        self.assertEqual(self.ran, ['a', 'b'])
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_wakes_up_for_new_first_task(self):
+        self.scheduler.add_single_task(self.action, 'late', 3600,
+                                       scheduler.method.sequential,
+                                       ['late'], None)
+        self.scheduler.start()
+        self.scheduler.add_single_task(self.action, 'early', 0,
+                                       scheduler.method.sequential,
+                                       ['early', True], None)
+        self.done.wait(5)
+
+        self.assertEqual(self.ran, ['early'])
+
+    def test_cancel_task_by_name(self):
+        self.scheduler.add_single_task(self.action, 'cancelled', 0.1,
+                                       scheduler.method.sequential,
+                                       ['cancelled'], None)
+        self.scheduler.add_single_task(self.action, 'kept', 0.2,
+                                       scheduler.method.sequential,
+                                       ['kept', True], None)
+        self.scheduler.cancel_task('cancelled')
+        self.assertEqual(self.scheduler.pending(), 1)
+        self.assertEqual(self.scheduler.get_task('cancelled'), None)
+
+        self.scheduler.start()
+        self.done.wait(5)
+
+        self.assertEqual(self.ran, ['kept'])
+
+    def test_next_run(self):
+        before = time.time()
+        self.scheduler.add_interval_task(self.action, 'task', 30, 60,
+                                         scheduler.method.sequential,
+                                         ['task'], None)
+        next_run = self.scheduler.next_run('task')
+
+        self.assertTrue(before + 29 < next_run < time.time() + 31)
+        self.assertEqual(self.scheduler.next_run('unknown'), None)
+
+    @patch('time.time')
+    def test_aligned_task(self, time_mock):
+        time_mock.return_value = 1000.5
+        task = self.scheduler.add_interval_task(self.action, 'task', 1, 60,
+                                                scheduler.method.sequential,
+                                                ['task'], None, align=True)
+        self.assertEqual(task.aligned_time, 1020)
+
+        # Waking up a little early must not run the same boundary twice
+        time_mock.return_value = 1019.9
+        self.scheduler.schedule_task_aligned(task, 60)
+        self.assertEqual(task.aligned_time, 1080)
+
+    def test_task_stats(self):
+        task = IntervalTask('task', 60, self.action, ['task'], {})
+        task.execute()
+
+        self.assertEqual(task.runs, 1)
+        self.assertEqual(task.overruns, 0)
+        self.assertTrue(task.last_duration >= 0)
+        self.assertTrue(task.last_run is not None)
+
+    def slow_task(self, policy, duration):
+        task = IntervalTask('task', 10, self.action, ['task'], {}, True)
+        task.set_overrun_policy(policy, 30)
+        task.scheduled_at = 100.0
+        task.last_duration = duration
+        return task
+
+    @patch('diamond.scheduler.monotonic')
+    def test_overrun_skip(self, monotonic_mock):
+        task = self.slow_task(IntervalTask.SKIP, 25.5)
+        monotonic_mock.return_value = 125.5
+        self.scheduler.schedule_task = Mock()
+        task.reschedule(self.scheduler)
+
+        # 110 and 120 were missed, carry on at 130
+        self.assertEqual(task.skipped, 2)
+        self.scheduler.schedule_task.assert_called_with(task, 4.5)
+
+    @patch('diamond.scheduler.monotonic')
+    def test_overrun_late(self, monotonic_mock):
+        task = self.slow_task(IntervalTask.LATE, 25.5)
+        monotonic_mock.return_value = 125.5
+        self.scheduler.schedule_task = Mock()
+        task.reschedule(self.scheduler)
+
+        self.assertEqual(task.skipped, 0)
+        self.scheduler.schedule_task.assert_called_with(task, 0)
+
+    @patch('diamond.scheduler.monotonic')
+    def test_overrun_backoff_next_slot(self, monotonic_mock):
+        task = self.slow_task(IntervalTask.BACKOFF, 25.5)
+        task.current_interval = 20
+        monotonic_mock.return_value = 125.5
+        self.scheduler.schedule_task = Mock()
+        task.reschedule(self.scheduler)
+
+        # Never straight away, 120 was missed, carry on at 140
+        self.assertEqual(task.skipped, 1)
+        self.scheduler.schedule_task.assert_called_with(task, 14.5)
+
+    def test_wakeup(self):
+        wakeup = scheduler.Wakeup()
+        start = time.time()
+        wakeup.wait(0.05)
+        self.assertTrue(time.time() - start >= 0.04)
+
+        # A wakeup sent ahead of the wait ends it at once, only once
+        wakeup.notify()
+        wakeup.notify()
+        start = time.time()
+        wakeup.wait(5)
+        self.assertTrue(time.time() - start < 1)
+        start = time.time()
+        wakeup.wait(0.05)
+        self.assertTrue(time.time() - start >= 0.04)
+
+    def test_forked_signalhandler(self):
+        if not hasattr(scheduler, 'ForkedScheduler'):
+            return
+        forked = scheduler.ForkedScheduler()
+        # Signals arrive while the scheduler may hold its queue lock
+        forked._acquire_lock()
+        try:
+            forked.signalhandler(None, None)
+        finally:
+            forked._release_lock()
+        self.assertFalse(forked.running)
+        self.assertEqual(forked._next_task(), None)
+
+    def test_threaded_late_run_not_lost(self):
+        runs = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def action():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+
+        task = ThreadedIntervalTask('task', 10, action, [], {})
+        task.set_overrun_policy(IntervalTask.LATE)
+        self.scheduler.schedule_task = Mock()
+        schedulerref = lambda: self.scheduler
+
+        task(schedulerref)
+        started.wait(5)
+        task(schedulerref)
+        release.set()
+        for i in xrange(500):
+            if not task.running:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(runs), 2)
+        self.assertFalse(task.running)
+
+    def test_overrun_backoff(self):
+        task = IntervalTask('task', 10, self.action, ['task'], {})
+        task.set_overrun_policy(IntervalTask.BACKOFF, 30)
+        intervals = []
+        for duration in (10.5, 25, 25, 5):
+            task.last_duration = duration
+            with patch.object(Task, 'execute'):
+                task.execute()
+            intervals.append(task.current_interval)
+
+        self.assertEqual(intervals, [20, 30, 30, 10])
+        self.assertEqual(task.overruns, 3)
+
+    def test_invalid_overrun_policy(self):
+        task = IntervalTask('task', 10, self.action, ['task'], {})
+        self.assertRaises(ValueError, task.set_overrun_policy, 'sometimes')
+
+    def test_threaded_overlap(self):
+        release = threading.Event()
+        task = ThreadedIntervalTask('task', 10, release.wait, [5], {})
+        self.scheduler.schedule_task = Mock()
+        schedulerref = lambda: self.scheduler
+
+        task(schedulerref)
+        task(schedulerref)
+        self.assertEqual(task.skipped, 1)
+
+        task.set_overrun_policy(IntervalTask.LATE)
+        task(schedulerref)
+        self.assertTrue(task.run_pending)
+        release.set()
+
+    def test_cancelled_task_is_not_rescheduled(self):
+        task = SingleTask('task', self.action, ['task'], {})
+        self.scheduler.schedule_task(task, 10)
+        self.scheduler.cancel(task)
+        self.scheduler.schedule_task(task, 10)
+
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_pooled_tasks(self):
+        self.scheduler = ThreadedScheduler(2)
+        self.scheduler.add_single_task(self.action, 'pooled', 0,
+                                       scheduler.method.pooled,
+                                       ['pooled', True], None)
+        self.scheduler.start()
+        self.done.wait(5)
+
+        self.assertEqual(self.ran, ['pooled'])
+        stats = self.scheduler.get_pool().get_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['submitted'], 1)
+
+    def test_pool_concurrency_limit(self):
+        pool = ThreadedScheduler(1).get_pool()
+        release = threading.Event()
+        task = PooledSingleTask('task', release.wait, [5], {})
+
+        self.assertTrue(pool.submit(task))
+        self.assertFalse(pool.submit(task))
+        self.assertEqual(pool.get_stats()['rejected'], 1)
+
+        release.set()
+        pool.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
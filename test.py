@@ -130,14 +130,29 @@ class CollectorTestCase(unittest.TestCase):
     def assertUnpublished(self, mock, key, value, expected_value=0):
         return self.assertPublished(mock, key, value, expected_value)
 
+    def getPublishedCalls(self, mock):
+        """
+        Return the (args, kwargs) of each published metric, unpacking the
+        lists of metric tuples passed to publish_many
+        """
+        calls = []
+        for args, kwargs in mock.call_args_list:
+            if len(args) > 0 and isinstance(args[0], list):
+                calls.extend([(tuple(metric), {}) for metric in args[0]])
+            else:
+                calls.append((args, kwargs))
+        return calls
+
     def assertPublished(self, mock, key, value, expected_value=1):
         if type(mock) is list:
             for m in mock:
-                calls = (filter(lambda x: x[0][0] == key, m.call_args_list))
+                calls = (filter(lambda x: x[0][0] == key,
+                                self.getPublishedCalls(m)))
                 if len(calls) > 0:
                     break
         else:
-            calls = filter(lambda x: x[0][0] == key, mock.call_args_list)
+            calls = filter(lambda x: x[0][0] == key,
+                           self.getPublishedCalls(mock))
 
         actual_value = len(calls)
         message = '%s: actual number of calls %d, expected %d' % (